@@ -4,15 +4,30 @@ import plotly.express as px
 import pandas as pd
 from datetime import datetime, timedelta
 import time
+import atexit
 import hashlib
 import re
-from db import SessionLocal, User, Product, Price, Review, Alert
+from db import SessionLocal, User, Product, Price, Review, Alert, SentimentDaily, ProductTopic, ArchivedReviewFingerprint
 from sqlalchemy import func
 import numpy as np
 from sqlalchemy.exc import IntegrityError
 import requests
 from bs4 import BeautifulSoup
-from services.predictor import PricePredictor
+from services.model_registry import registry
+from services.retention import load_price_history
+from services.analytics import shared_engine
+from services.search import search_reviews, paginate_product_search, product_match_ids
+from repository import paginate_products, paginate_reviews, latest_prices, products_by_id
+from services.price_series import series_frame
+from services.write_buffer import write_buffer
+from query_budget import QueryBudget
+from services.hot_cache import get_latest_state
+from services.price_cube import price_cube
+from services.sentiment_aggregates import overall_summary, top_rated_products
+from services.review_topics import product_topics
+
+# Every query issued during this rerun counts against one budget
+rerun_budget = QueryBudget('streamlit_rerun', max_queries=150).start()
 
 # Page config
 st.set_page_config(
@@ -166,6 +181,13 @@ if 'show_register' not in st.session_state:
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 
+@st.cache_resource
+def get_analytics_engine():
+    """One DuckDB engine per server process, shared by every session, rerun and the predictor"""
+    engine = shared_engine()
+    atexit.register(engine.close)
+    return engine
+
 # Utility functions
 def hash_password(password):
     """Hash password using SHA-256"""
@@ -204,6 +226,26 @@ def validate_product_url(url):
     else:
         return False, None
 
+def get_page_cursor(state_key):
+    """Cursor of the page currently shown for a paginated list"""
+    stack = st.session_state.setdefault(f'{state_key}_cursors', [None])
+    return stack[-1]
+
+def render_page_controls(state_key, next_cursor):
+    """Previous/Next buttons that walk a stack of keyset cursors"""
+    stack = st.session_state.setdefault(f'{state_key}_cursors', [None])
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if len(stack) > 1 and st.button("⬅️ Previous", key=f"{state_key}_prev"):
+            stack.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(stack)}")
+    with col_next:
+        if next_cursor and st.button("Next ➡️", key=f"{state_key}_next"):
+            stack.append(next_cursor)
+            st.rerun()
+
 def extract_product_info(url, platform):
     """Extract basic product information from URL"""
     try:
@@ -387,6 +429,9 @@ elif st.session_state['authentication_status']:
             st.session_state.clear()
             st.rerun()
     
+    # Columnar engine for aggregate queries over hot + archived history
+    analytics = get_analytics_engine()
+    
     # Main content with tabs
     st.markdown("<h1 class='main-header'>💻 LaptopLens - Price Tracking & Analyzing System</h1>", unsafe_allow_html=True)
     
@@ -450,22 +495,16 @@ elif st.session_state['authentication_status']:
         st.subheader("📊 Price Distribution Across Platforms")
         
         # Get price data by platform
-        price_data = db.query(
-            Product.platform,
-            func.avg(Price.price).label('avg_price'),
-            func.min(Price.price).label('min_price'),
-            func.max(Price.price).label('max_price'),
-            func.count(Price.id).label('count')
-        ).join(Price).group_by(Product.platform).all()
-        
-        if price_data:
-            df_platforms = pd.DataFrame([{
-                'Platform': p.platform.title() if p.platform else 'Unknown',
-                'Average Price': p.avg_price or 0,
-                'Min Price': p.min_price or 0,
-                'Max Price': p.max_price or 0,
-                'Products': p.count or 0
-            } for p in price_data])
+        price_data = analytics.platform_price_distribution()
+        
+        if not price_data.empty:
+            df_platforms = pd.DataFrame({
+                'Platform': price_data['platform'].fillna('unknown').str.title(),
+                'Average Price': price_data['avg_price'].fillna(0),
+                'Min Price': price_data['min_price'].fillna(0),
+                'Max Price': price_data['max_price'].fillna(0),
+                'Products': price_data['count'].fillna(0)
+            })
             
             # Create bar chart
             fig = px.bar(
@@ -488,21 +527,25 @@ elif st.session_state['authentication_status']:
         # Top Deals
         st.subheader("🏷️ Top Deals Today")
         
-        top_deals = db.query(Product, Price).join(Price).filter(
-            Price.discount_percentage > 0
-        ).order_by(Price.discount_percentage.desc()).limit(5).all()
+        # Current discounts come from the in-process latest-state cache
+        latest_state = get_latest_state(db)
+        top_deals = latest_state.rows(latest_state.top_discounts(5))
+        deal_products = products_by_id(db, [deal['product_id'] for deal in top_deals])
+        # Another process may have deleted a product this cache still holds
+        top_deals = [deal for deal in top_deals if deal['product_id'] in deal_products]
         
         if top_deals:
-            for product, price in top_deals:
+            for deal in top_deals:
+                product = deal_products[deal['product_id']]
                 col1, col2, col3 = st.columns([3, 1, 1])
                 with col1:
                     st.write(f"**{product.name}**")
                     st.write(f"Platform: {product.platform.title() if product.platform else 'Unknown'}")
                 with col2:
-                    st.write(f"~~₹{price.price:,.0f}~~")
-                    st.write(f"**₹{price.discount_price:,.0f}**")
+                    st.write(f"~~₹{deal['price']:,.0f}~~")
+                    st.write(f"**₹{(deal['discount_price'] or deal['price']):,.0f}**")
                 with col3:
-                    st.write(f"🔥 **-{price.discount_percentage:.0f}%**")
+                    st.write(f"🔥 **-{deal['discount_percentage']:.0f}%**")
                 st.divider()
         else:
             st.info("No deals available at the moment")
@@ -562,14 +605,13 @@ elif st.session_state['authentication_status']:
                                         
                                         # Add initial price if extracted
                                         if 'price' in product_info:
-                                            initial_price = Price(
-                                                product_id=new_product.id,
-                                                price=product_info['price'],
-                                                currency='INR',
-                                                scraped_at=datetime.utcnow()
-                                            )
-                                            db.add(initial_price)
-                                            db.commit()
+                                            write_buffer.submit(Price, {
+                                                'product_id': new_product.id,
+                                                'price': product_info['price'],
+                                                'currency': 'INR',
+                                                'in_stock': True,
+                                                'scraped_at': datetime.utcnow()
+                                            }).result(timeout=10)
                                         
                                         st.success(f"✅ Successfully added: {product_info.get('name', 'Product')}")
                                     else:
@@ -640,14 +682,13 @@ elif st.session_state['authentication_status']:
                             db.commit()
                             
                             # Add initial price
-                            initial_price_entry = Price(
-                                product_id=new_product.id,
-                                price=float(initial_price),
-                                currency='INR',
-                                scraped_at=datetime.utcnow()
-                            )
-                            db.add(initial_price_entry)
-                            db.commit()
+                            write_buffer.submit(Price, {
+                                'product_id': new_product.id,
+                                'price': float(initial_price),
+                                'currency': 'INR',
+                                'in_stock': True,
+                                'scraped_at': datetime.utcnow()
+                            }).result(timeout=10)
                             
                             st.success(f"✅ Successfully added: {name}")
                             time.sleep(1)
@@ -733,26 +774,29 @@ elif st.session_state['authentication_status']:
         with col2:
             filter_platform = st.selectbox("Platform", ["All", "Amazon", "Flipkart"])
         with col3:
-            sort_by = st.selectbox("Sort by", ["Recently Added", "Name", "Price"])
-        
-        # Query products
-        query = db.query(Product)
-        
-        if search:
-            query = query.filter(
-                (Product.name.contains(search)) | 
-                (Product.brand.contains(search))
+            sort_options = ["Recently Added", "Name", "Price"]
+            sort_by = st.selectbox("Sort by", ["Relevance"] + sort_options if search else sort_options)
+        
+        # Query one page of products
+        products_state_key = f"products_{search}_{filter_platform}_{sort_by}"
+        platform_filter = filter_platform.lower() if filter_platform != "All" else None
+        if search and sort_by == "Relevance":
+            # Full-text matches on name, brand and model, paged in rank order
+            products_page = paginate_product_search(
+                db, search, cursor=get_page_cursor(products_state_key), limit=20, platform=platform_filter
             )
-        
-        if filter_platform != "All":
-            query = query.filter(Product.platform == filter_platform.lower())
-        
-        if sort_by == "Recently Added":
-            query = query.order_by(Product.created_at.desc())
-        elif sort_by == "Name":
-            query = query.order_by(Product.name)
-        
-        products = query.all()
+        else:
+            products_page = paginate_products(
+                db,
+                cursor=get_page_cursor(products_state_key),
+                limit=20,
+                sort='name' if sort_by == "Name" else 'created_at',
+                platform=platform_filter,
+                product_ids=product_match_ids(search) if search else None
+            )
+        products = products_page['items']
+        # One windowed query for the whole page instead of one per card
+        page_latest_prices = latest_prices(db, [p.id for p in products])
         
         if products:
             # Display products in a grid
@@ -769,9 +813,7 @@ elif st.session_state['authentication_status']:
                     
                     with col2:
                         # Get latest price
-                        latest_price = db.query(Price).filter(
-                            Price.product_id == product.id
-                        ).order_by(Price.scraped_at.desc()).first()
+                        latest_price = page_latest_prices.get(product.id)
                         
                         if latest_price:
                             st.metric("Current Price", f"₹{latest_price.price:,.0f}")
@@ -788,15 +830,22 @@ elif st.session_state['authentication_status']:
                             # Delete associated data first
                             db.query(Price).filter(Price.product_id == product.id).delete()
                             db.query(Review).filter(Review.product_id == product.id).delete()
+                            db.query(ArchivedReviewFingerprint).filter(ArchivedReviewFingerprint.product_id == product.id).delete()
+                            db.query(SentimentDaily).filter(SentimentDaily.product_id == product.id).delete()
+                            db.query(ProductTopic).filter(ProductTopic.product_id == product.id).delete()
                             db.query(Alert).filter(Alert.product_id == product.id).delete()
                             # Delete product
+                            removed_id = product.id
                             db.delete(product)
                             db.commit()
+                            get_latest_state(db).evict([removed_id])
                             st.success("Product removed!")
                             time.sleep(1)
                             st.rerun()
                     
                     st.markdown('</div>', unsafe_allow_html=True)
+            
+            render_page_controls(products_state_key, products_page['next_cursor'])
         else:
             st.info("No products found. Start tracking by adding products above!")
         
@@ -808,7 +857,7 @@ elif st.session_state['authentication_status']:
         st.header("📈 Price Analysis & AI Predictions")
         
         # Initialize predictor
-        predictor = PricePredictor()
+        predictor = registry.get('price_predictor')
         
         # Model training section
         with st.expander("  ML Model Status", expanded=False):
@@ -855,18 +904,24 @@ elif st.session_state['authentication_status']:
                 with col3:
                     st.write(f"**Platform:** {product.platform.title()}")
                 
-                # Get price history
-                price_history = db.query(Price).filter(
-                    Price.product_id == product.id
-                ).order_by(Price.scraped_at.desc()).limit(90).all()
+                # Get the latest 90 prices from the compact monthly series in one read;
+                # only fall back to the archive-backed history when that is short
+                price_history = series_frame(db, [product.id], limit=90).sort_values(
+                    'scraped_at', ascending=False
+                )
+                
+                if len(price_history) < 90:
+                    price_history = load_price_history(db, product_ids=[product.id]).sort_values(
+                        'scraped_at', ascending=False
+                    ).head(90)
                 
                 if len(price_history) > 5:
                     # Historical price chart
-                    df_history = pd.DataFrame([{
-                        'Date': p.scraped_at,
-                        'Price': p.price,
-                        'Discount Price': p.discount_price
-                    } for p in price_history])
+                    df_history = price_history.rename(columns={
+                        'scraped_at': 'Date',
+                        'price': 'Price',
+                        'discount_price': 'Discount Price'
+                    })[['Date', 'Price', 'Discount Price']].reset_index(drop=True)
                     
                     # Price statistics
                     col1, col2, col3, col4 = st.columns(4)
@@ -886,6 +941,24 @@ elif st.session_state['authentication_status']:
                     with col4:
                         st.metric("Highest Price", f"₹{max_price:,.0f}")
                     
+                    # Cross-product view sliced straight from the memory-mapped price cube
+                    if price_cube.exists():
+                        with st.expander("🔗 Price Movement vs Same-Brand Products", expanded=False):
+                            peers = [p.id for p in products if p.brand == product.brand and p.id != product.id][:9]
+                            if peers:
+                                corr = price_cube.correlation(
+                                    [product.id] + peers, start=datetime.now() - timedelta(days=90)
+                                )
+                                peer_names = {p.id: p.name[:40] for p in products}
+                                peer_corr = corr[product.id].drop(product.id).dropna().sort_values(ascending=False)
+                                if not peer_corr.empty:
+                                    st.caption("Correlation of daily price changes over the last 90 days")
+                                    st.bar_chart(peer_corr.rename(index=peer_names))
+                                else:
+                                    st.info("Not enough overlapping price history yet")
+                            else:
+                                st.info("No other tracked products from this brand yet")
+                    
                     # Prediction section
                     st.subheader("🔮 AI-Powered Price Predictions")
                     
@@ -1146,11 +1219,13 @@ elif st.session_state['authentication_status']:
         # Overall sentiment metrics
         col1, col2, col3, col4 = st.columns(4)
         
-        # Get sentiment statistics
-        total_reviews = db.query(Review).count()
-        positive_reviews = db.query(Review).filter(Review.sentiment == 'positive').count()
-        negative_reviews = db.query(Review).filter(Review.sentiment == 'negative').count()
-        neutral_reviews = db.query(Review).filter(Review.sentiment == 'neutral').count()
+        # Sentiment statistics from the per-product daily aggregates
+        sentiment_summary = overall_summary(db)
+        distribution = sentiment_summary.get('sentiment_distribution', {})
+        total_reviews = sentiment_summary.get('total_reviews', 0)
+        positive_reviews = distribution.get('very_positive', 0) + distribution.get('positive', 0)
+        negative_reviews = distribution.get('very_negative', 0) + distribution.get('negative', 0)
+        neutral_reviews = distribution.get('neutral', 0)
         
         with col1:
             st.metric("Total Reviews", f"{total_reviews:,}")
@@ -1160,7 +1235,7 @@ elif st.session_state['authentication_status']:
             st.metric("Positive", f"{positive_pct:.1f}%", delta="+2.3%")
         
         with col3:
-            avg_rating = db.query(func.avg(Review.rating)).scalar() or 0
+            avg_rating = sentiment_summary.get('average_rating', 0)
             st.metric("Avg Rating", f"{avg_rating:.1f}/5.0")
         
         with col4:
@@ -1215,13 +1290,7 @@ elif st.session_state['authentication_status']:
                 st.subheader("🏆 Top Rated Products")
                 
                 # Get top rated products
-                top_products = db.query(
-                    Product.name,
-                    func.avg(Review.rating).label('avg_rating'),
-                    func.count(Review.id).label('review_count')
-                ).join(Review).group_by(Product.id).order_by(
-                    func.avg(Review.rating).desc()
-                ).limit(5).all()
+                top_products = top_rated_products(db, limit=5)
                 
                 if top_products:
                     for idx, product in enumerate(top_products, 1):
@@ -1229,10 +1298,35 @@ elif st.session_state['authentication_status']:
                         st.write(f"⭐ {product.avg_rating:.1f}/5.0 ({product.review_count} reviews)")
                         st.divider()
         
+        # What reviews talk about, per product
+        st.subheader("🧩 Review Topics")
+        topic_products = db.query(Product.id, Product.name).order_by(Product.name).all()
+        if topic_products:
+            topic_product = st.selectbox(
+                "Product", topic_products, format_func=lambda p: p.name, key="topic_product"
+            )
+            topics = product_topics(db, topic_product.id, limit=6)
+            if topics:
+                df_topics = pd.DataFrame(topics)
+                df_topics['Share'] = df_topics['share'] * 100
+                df_topics['Negative'] = df_topics['negative_share'] * 100
+                fig = px.bar(
+                    df_topics, x='Share', y='terms', orientation='h',
+                    color='Negative', color_continuous_scale='RdYlGn_r',
+                    labels={'terms': 'Topic', 'Share': 'Share of reviews (%)', 'Negative': 'Negative %'},
+                    hover_data={'reviews': True}
+                )
+                fig.update_layout(height=320, yaxis={'categoryorder': 'total ascending'})
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No topics yet; they are built as reviews are scored.")
+        
         # Recent reviews section
         st.subheader("🔄 Recent Customer Reviews")
         
         # Filter options
+        review_search = st.text_input("🔍 Search reviews...", placeholder="e.g. battery, overheating, display")
+        
         col1, col2, col3 = st.columns(3)
         
         with col1:
@@ -1244,24 +1338,25 @@ elif st.session_state['authentication_status']:
         with col3:
             sort_order = st.selectbox("Sort by", ["Most Recent", "Highest Rated", "Lowest Rated"])
         
-        # Query reviews
-        query = db.query(Review, Product).join(Product)
-        
-        if filter_sentiment != "All":
-            query = query.filter(Review.sentiment == filter_sentiment.lower())
-        
-        if filter_rating != "All":
-            rating_value = int(filter_rating[0])
-            query = query.filter(Review.rating == rating_value)
-        
-        if sort_order == "Most Recent":
-            query = query.order_by(Review.scraped_at.desc())
-        elif sort_order == "Highest Rated":
-            query = query.order_by(Review.rating.desc())
-        else:
-            query = query.order_by(Review.rating.asc())
-        
-        recent_reviews = query.limit(10).all()
+        # Query one page of reviews
+        review_snippets = {}
+        matched_review_ids = None
+        if review_search:
+            matches = search_reviews(db, review_search, limit=200)
+            review_snippets = {m['id']: m['snippet'] for m in matches}
+            matched_review_ids = list(review_snippets.keys())
+        
+        reviews_state_key = f"reviews_{review_search}_{filter_sentiment}_{filter_rating}_{sort_order}"
+        reviews_page = paginate_reviews(
+            db,
+            cursor=get_page_cursor(reviews_state_key),
+            limit=10,
+            sort={'Most Recent': 'recent', 'Highest Rated': 'rating_desc'}.get(sort_order, 'rating_asc'),
+            sentiment=filter_sentiment.lower() if filter_sentiment != "All" else None,
+            rating=int(filter_rating[0]) if filter_rating != "All" else None,
+            review_ids=matched_review_ids
+        )
+        recent_reviews = reviews_page['items']
         
         if recent_reviews:
             for review, product in recent_reviews:
@@ -1279,12 +1374,14 @@ elif st.session_state['authentication_status']:
                             'negative': '😞'
                         }.get(review.sentiment, '🤔')
                         
-                        st.write(f"{rating_stars} {review.rating}/5 | {sentiment_emoji} {review.sentiment.title()}")
+                        st.write(f"{rating_stars} {review.rating}/5 | {sentiment_emoji} {(review.sentiment or 'pending').title()}")
                         
                         if review.title:
                             st.write(f"**{review.title}**")
                         
-                        if review.content:
+                        if review.id in review_snippets:
+                            st.markdown(review_snippets[review.id])
+                        elif review.content:
                             st.write(f"_{review.content[:300]}{'...' if len(review.content) > 300 else ''}_")
                     
                     with col2:
@@ -1292,6 +1389,8 @@ elif st.session_state['authentication_status']:
                         st.caption(f"{review.review_date.strftime('%Y-%m-%d') if review.review_date else 'N/A'}")
                     
                     st.divider()
+            
+            render_page_controls(reviews_state_key, reviews_page['next_cursor'])
         else:
             st.info("No reviews available matching your filters.")
         
@@ -1506,17 +1605,20 @@ elif st.session_state['authentication_status']:
                                 response = "⚠️ The ML model needs to be trained first. Please go to the Price Analysis tab to train the model."
                         
                         elif "best deals" in query.lower() or "deals" in query.lower():
-                            deals = db.query(Product, Price).join(Price).filter(
-                                Price.discount_percentage > 10
-                            ).order_by(Price.discount_percentage.desc()).limit(5).all()
+                            latest_state = get_latest_state(db)
+                            deals = latest_state.rows(latest_state.top_discounts(5, min_discount=10))
+                            deal_products = products_by_id(db, [deal['product_id'] for deal in deals])
+                            deals = [deal for deal in deals if deal['product_id'] in deal_products]
                             
                             response = "🏷️ **Top Deals Right Now:**\n\n"
-                            for idx, (product, price) in enumerate(deals, 1):
+                            for idx, deal in enumerate(deals, 1):
+                                product = deal_products[deal['product_id']]
+                                discount_price = deal['discount_price'] or deal['price']
                                 response += f"{idx}. **{product.name}**\n"
                                 response += f"   - Platform: {product.platform.title()}\n"
-                                response += f"   - Discount: **{price.discount_percentage:.0f}% OFF**\n"
-                                response += f"   - Price: ~~₹{price.price:,.0f}~~ → **₹{price.discount_price:,.0f}**\n"
-                                response += f"   - You save: ₹{(price.price - price.discount_price):,.0f}\n\n"
+                                response += f"   - Discount: **{deal['discount_percentage']:.0f}% OFF**\n"
+                                response += f"   - Price: ~~₹{deal['price']:,.0f}~~ → **₹{discount_price:,.0f}**\n"
+                                response += f"   - You save: ₹{(deal['price'] - discount_price):,.0f}\n\n"
                         
                         elif "price drop" in query.lower() or "drop in price" in query.lower():
                             if predictor.is_trained:
@@ -1543,7 +1645,7 @@ elif st.session_state['authentication_status']:
                             # Get market statistics
                             avg_price = db.query(func.avg(Price.price)).scalar() or 0
                             total_products = db.query(Product).count()
-                            total_deals = db.query(Price).filter(Price.discount_percentage > 0).count()
+                            total_deals = int(get_latest_state(db).filter(min_discount=0).size)
                             
                             response = "📊 **Laptop Market Analysis:**\n\n"
                             response += f"• **Products Tracked:** {total_products}\n"
@@ -1551,25 +1653,23 @@ elif st.session_state['authentication_status']:
                             response += f"• **Active Deals:** {total_deals}\n\n"
                             
                             # Platform comparison
-                            platform_stats = db.query(
-                                Product.platform,
-                                func.avg(Price.price).label('avg_price'),
-                                func.count(Product.id).label('count')
-                            ).join(Price).group_by(Product.platform).all()
+                            platform_stats = analytics.platform_price_distribution()
                             
                             response += "**Platform Comparison:**\n"
-                            for stat in platform_stats:
-                                response += f"• {stat.platform.title()}: Avg ₹{stat.avg_price:,.0f} ({stat.count} products)\n"
+                            for stat in platform_stats.itertuples():
+                                response += f"• {stat.platform.title()}: Avg ₹{stat.avg_price:,.0f} ({stat.products} products)\n"
                         
                         elif "recommend" in query.lower() and "60000" in query:
-                            budget_laptops = db.query(Product, Price).join(Price).filter(
-                                Price.price <= 60000
-                            ).order_by(Price.price).all()
+                            latest_state = get_latest_state(db)
+                            budget_laptops = latest_state.rows(latest_state.cheapest(5, max_price=60000))
+                            budget_products = products_by_id(db, [row['product_id'] for row in budget_laptops])
+                            budget_laptops = [row for row in budget_laptops if row['product_id'] in budget_products]
                             
                             response = "🏆 **Best Laptops Under ₹60,000:**\n\n"
-                            for idx, (product, price) in enumerate(budget_laptops[:5], 1):
+                            for idx, row in enumerate(budget_laptops, 1):
+                                product = budget_products[row['product_id']]
                                 response += f"{idx}. **{product.name}**\n"
-                                response += f"   - Price: **₹{price.price:,.0f}**\n"
+                                response += f"   - Price: **₹{row['price']:,.0f}**\n"
                                 response += f"   - Brand: {product.brand}\n"
                                 response += f"   - Platform: {product.platform.title()}\n\n"
                         
@@ -1644,15 +1744,17 @@ elif st.session_state['authentication_status']:
                         if numbers:
                             budget = int(numbers[0].replace(',', ''))
                         
-                        budget_laptops = db.query(Product, Price).join(Price).filter(
-                            Price.price <= budget
-                        ).order_by(Price.price).limit(5).all()
+                        latest_state = get_latest_state(db)
+                        budget_laptops = latest_state.rows(latest_state.cheapest(5, max_price=budget))
+                        budget_products = products_by_id(db, [row['product_id'] for row in budget_laptops])
+                        budget_laptops = [row for row in budget_laptops if row['product_id'] in budget_products]
                         
                         if budget_laptops:
                             response = f"💰 **Best Laptops Under ₹{budget:,}:**\n\n"
-                            for idx, (product, price) in enumerate(budget_laptops, 1):
+                            for idx, row in enumerate(budget_laptops, 1):
+                                product = budget_products[row['product_id']]
                                 response += f"**{idx}. {product.name}**\n"
-                                response += f"   💵 Price: **₹{price.price:,.0f}** on {product.platform.title()}\n"
+                                response += f"   💵 Price: **₹{row['price']:,.0f}** on {product.platform.title()}\n"
                                 
                                 if predictor.is_trained:
                                     pred = predictor.predict_price(product.id, 7)
@@ -1671,19 +1773,33 @@ elif st.session_state['authentication_status']:
                         if len(mentioned_brands) >= 2:
                             response = f"📊 **Comparison: {' vs '.join(mentioned_brands)}**\n\n"
                             
+                            brand_stats = analytics.brand_stats(mentioned_brands).set_index('brand')
+                            
                             for brand in mentioned_brands:
-                                brand_data = db.query(
-                                    func.avg(Price.price).label('avg_price'),
-                                    func.min(Price.price).label('min_price'),
-                                    func.max(Price.price).label('max_price'),
-                                    func.count(Product.id).label('count')
-                                ).join(Product).filter(Product.brand == brand).first()
+                                if brand not in brand_stats.index:
+                                    continue
+                                brand_data = brand_stats.loc[brand]
                                 
-                                if brand_data and brand_data.avg_price:
+                                if brand_data.avg_price:
                                     response += f"**🏢 {brand}:**\n"
-                                    response += f"   📦 Products tracked: {brand_data.count}\n"
+                                    response += f"   📦 Products tracked: {brand_data.products}\n"
                                     response += f"   💵 Average price: **₹{brand_data.avg_price:,.0f}**\n"
-                                    response += f"   📊 Price range: ₹{brand_data.min_price:,.0f} - ₹{brand_data.max_price:,.0f}\n\n"
+                                    response += f"   📊 Price range: ₹{brand_data.min_price:,.0f} - ₹{brand_data.max_price:,.0f}\n"
+                                    # Typical specs straight from the typed Feature columns
+                                    specs = []
+                                    if pd.notna(brand_data.avg_ram_gb):
+                                        specs.append(f"{brand_data.avg_ram_gb:.0f} GB RAM")
+                                    if pd.notna(brand_data.avg_storage_gb):
+                                        specs.append(f"{brand_data.avg_storage_gb:,.0f} GB storage")
+                                    if pd.notna(brand_data.avg_cpu_tier):
+                                        specs.append(f"CPU tier {brand_data.avg_cpu_tier:.1f}/9")
+                                    if pd.notna(brand_data.avg_screen_inches):
+                                        specs.append(f"{brand_data.avg_screen_inches:.1f}\" screen")
+                                    if pd.notna(brand_data.dedicated_gpu_share):
+                                        specs.append(f"{brand_data.dedicated_gpu_share:.0%} with a dedicated GPU")
+                                    if specs:
+                                        response += f"   ⚙️ Typical specs: {', '.join(specs)}\n"
+                                    response += "\n"
                         else:
                             response = "Please specify at least two brands or products to compare."
                     
@@ -1711,17 +1827,18 @@ elif st.session_state['authentication_status']:
                         # General response with current stats
                         total_products = db.query(Product).count()
                         avg_price = db.query(func.avg(Price.price)).scalar() or 0
-                        best_deal = db.query(Product, Price).join(Price).filter(
-                            Price.discount_percentage > 0
-                        ).order_by(Price.discount_percentage.desc()).first()
+                        latest_state = get_latest_state(db)
+                        best_deal_ids = latest_state.top_discounts(1)
                         
                         response = f"📊 **Current Market Overview:**\n\n"
                         response += f"• Tracking **{total_products} laptop models**\n"
                         response += f"• Average price: **₹{avg_price:,.0f}**\n"
                         
-                        if best_deal:
-                            product, price = best_deal
-                            response += f"• Best deal: **{product.name}** - {price.discount_percentage:.0f}% OFF!\n\n"
+                        if best_deal_ids.size:
+                            best_deal = latest_state.rows(best_deal_ids)[0]
+                            product = db.get(Product, best_deal['product_id'])
+                            if product:
+                                response += f"• Best deal: **{product.name}** - {best_deal['discount_percentage']:.0f}% OFF!\n\n"
                         
                         response += "💡 **I can help you with:**\n"
                         response += "• 🔮 Price predictions for specific laptops\n"
@@ -2009,7 +2126,7 @@ elif st.session_state['authentication_status']:
         st.header("🔮 Batch Price Predictions")
         st.markdown("Analyze and predict prices for multiple products simultaneously")
         
-        predictor = PricePredictor()
+        predictor = registry.get('price_predictor')
         db = SessionLocal()
         
         # Check if model is trained
@@ -2066,10 +2183,12 @@ elif st.session_state['authentication_status']:
                         # Detailed results table
                         st.subheader("📋 Prediction Summary")
                         
+                        result_products = products_by_id(db, list(results.keys()))
+                        
                         table_data = []
                         for product_id, result in results.items():
                             if 'error' not in result:
-                                product = db.query(Product).filter(Product.id == product_id).first()
+                                product = result_products[product_id]
                                 table_data.append({
                                     'Product': product.name[:40] + '...' if len(product.name) > 40 else product.name,
                                     'Current Price': f"₹{result['current_price']:,.0f}",
@@ -2161,7 +2280,7 @@ elif st.session_state['authentication_status']:
                             drops.sort(key=lambda x: x[1]['summary']['expected_change_pct'])
                             
                             for i, (product_id, result) in enumerate(drops[:5]):
-                                product = db.query(Product).filter(Product.id == product_id).first()
+                                product = result_products[product_id]
                                 
                                 st.markdown(f"""
                                 <div style='background-color: #d4edda; padding: 10px; border-radius: 8px; margin: 5px 0;'>
@@ -2180,7 +2299,7 @@ elif st.session_state['authentication_status']:
                             increases.sort(key=lambda x: x[1]['summary']['expected_change_pct'], reverse=True)
                             
                             for i, (product_id, result) in enumerate(increases[:5]):
-                                product = db.query(Product).filter(Product.id == product_id).first()
+                                product = result_products[product_id]
                                 
                                 st.markdown(f"""
                                 <div style='background-color: #fff3cd; padding: 10px; border-radius: 8px; margin: 5px 0;'>
@@ -2192,6 +2311,8 @@ elif st.session_state['authentication_status']:
         
         db.close()
 
+rerun_budget.stop()
+
 # Add footer
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,89 @@
+"""
+Async data access functions for the FastAPI service
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import Product, Price, Review, Alert
+from repository import apply_keyset, build_page, snapshot_statement, snapshot_diff_statement, annotate_diff
+
+def to_dict(row) -> Dict:
+    """Convert an ORM row to a plain dict of its column values"""
+    return {c.name: getattr(row, c.name) for c in row.__table__.columns}
+
+# ---------------- Products ----------------
+async def list_products(session: AsyncSession, platform: Optional[str] = None,
+                        brand: Optional[str] = None, cursor: Optional[str] = None,
+                        limit: int = 50) -> Dict:
+    """One page of tracked products, newest first"""
+    stmt = select(Product)
+    if platform:
+        stmt = stmt.where(Product.platform == platform)
+    if brand:
+        stmt = stmt.where(Product.brand == brand)
+    stmt = apply_keyset(stmt, Product.created_at, Product.id, cursor, limit)
+    result = await session.execute(stmt)
+    return build_page(list(result.scalars()), limit, 'created_at')
+
+async def get_product(session: AsyncSession, product_id: int) -> Optional[Product]:
+    """Get a single product by id"""
+    return await session.get(Product, product_id)
+
+# ---------------- Prices ----------------
+async def get_price_history(session: AsyncSession, product_id: int, cursor: Optional[str] = None,
+                            limit: int = 90) -> Dict:
+    """One page of a product's prices, newest first"""
+    stmt = select(Price).where(Price.product_id == product_id)
+    stmt = apply_keyset(stmt, Price.scraped_at, Price.id, cursor, limit)
+    result = await session.execute(stmt)
+    return build_page(list(result.scalars()), limit, 'scraped_at')
+
+async def get_latest_price(session: AsyncSession, product_id: int) -> Optional[Price]:
+    """Latest recorded price for a product"""
+    page = await get_price_history(session, product_id, limit=1)
+    return page['items'][0] if page['items'] else None
+
+async def market_snapshot(session: AsyncSession, at: datetime, platform: Optional[str] = None) -> List[Dict]:
+    """Every product's price, discount and stock as of a timestamp"""
+    result = await session.execute(snapshot_statement(at, platform=platform))
+    return [dict(row._mapping) for row in result]
+
+async def market_diff(session: AsyncSession, before: datetime, after: datetime,
+                      platform: Optional[str] = None) -> List[Dict]:
+    """Per-product changes between two timestamps"""
+    result = await session.execute(snapshot_diff_statement(before, after, platform=platform))
+    return annotate_diff([dict(row._mapping) for row in result])
+
+# ---------------- Reviews ----------------
+async def list_reviews(session: AsyncSession, product_id: Optional[int] = None,
+                       sentiment: Optional[str] = None, cursor: Optional[str] = None,
+                       limit: int = 20) -> Dict:
+    """One page of the most recently scraped reviews, optionally for one product or sentiment"""
+    stmt = select(Review)
+    if product_id is not None:
+        stmt = stmt.where(Review.product_id == product_id)
+    if sentiment:
+        stmt = stmt.where(Review.sentiment == sentiment)
+    stmt = apply_keyset(stmt, Review.scraped_at, Review.id, cursor, limit)
+    result = await session.execute(stmt)
+    return build_page(list(result.scalars()), limit, 'scraped_at')
+
+# ---------------- Alerts ----------------
+async def list_alerts(session: AsyncSession, sent: Optional[bool] = None, limit: int = 50) -> List[Alert]:
+    """Alerts, newest first"""
+    stmt = select(Alert)
+    if sent is not None:
+        stmt = stmt.where(Alert.sent == sent)
+    stmt = stmt.order_by(Alert.created_at.desc()).limit(limit)
+    result = await session.execute(stmt)
+    return list(result.scalars())
+
+async def mark_alert_sent(session: AsyncSession, alert_id: int) -> bool:
+    """Mark an alert as sent; returns False if it does not exist"""
+    result = await session.execute(
+        update(Alert).where(Alert.id == alert_id).values(sent=True)
+    )
+    await session.commit()
+    return result.rowcount > 0
@@ -17,6 +17,67 @@ class Config:
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/tracker.db")
     
+    # Retention settings
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./data/archive")
+    RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "180"))  # keep this many days hot in SQLite
+    ARCHIVE_INTERVAL_HOURS = 24
+    
+    # Query budgets (see query_budget.py)
+    QUERY_BUDGET_DEFAULT = 50  # statements per request / job
+    QUERY_BUDGET_MAX_REPEATS = 10  # same statement shape this often looks like N+1
+    QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "False").lower() == "true"
+    
+    # Query timing (see query_stats.py)
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+    EXPLAIN_TOP_QUERIES = int(os.getenv("EXPLAIN_TOP_QUERIES", "0"))  # plans captured in reports
+    
+    # Latest-state hot cache (see services/hot_cache.py)
+    HOT_CACHE_MAX_AGE_SECONDS = 30  # readers refresh from new price rows after this
+    
+    # Product x day price cube (see services/price_cube.py)
+    CUBE_DIR = os.getenv("CUBE_DIR", "./data/cube")
+    
+    # Write-behind group commit (see services/write_buffer.py)
+    WRITE_BUFFER_MAX_BATCH = 500  # rows per transaction
+    WRITE_BUFFER_MAX_DELAY_MS = 200  # longest a queued row waits for its group
+    WRITE_BUFFER_FLUSH_TIMEOUT_SECONDS = 60  # jobs stop waiting on the writer after this
+    
+    # Sentiment inference (see services/sentiment.py)
+    SENTIMENT_MODEL = "nlptown/bert-base-multilingual-uncased-sentiment"
+    SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "32"))  # reviews per forward pass
+    SENTIMENT_MAX_TOKENS = 512  # BERT max length
+    SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "torch")  # torch | onnx (int8, CPU)
+    ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./models/sentiment_onnx")
+    ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 = half the cores
+    SENTIMENT_CASCADE = os.getenv("SENTIMENT_CASCADE", "False").lower() == "true"  # lexicon first, BERT when unsure
+    SENTIMENT_CASCADE_THRESHOLD = float(os.getenv("SENTIMENT_CASCADE_THRESHOLD", "0.5"))  # |polarity| the lexicon must reach
+    SENTIMENT_CACHE_SIZE = 50000  # in-memory LRU entries in front of the sentiment_cache table
+    
+    # Pending-review scoring (see services/sentiment_worker.py)
+    SENTIMENT_WORKER_BATCH_SIZE = int(os.getenv("SENTIMENT_WORKER_BATCH_SIZE", "256"))  # reviews claimed at once
+    SENTIMENT_CLAIM_TIMEOUT_SECONDS = 600  # claims older than this are handed to another worker
+    SENTIMENT_MAX_ATTEMPTS = 3
+    SENTIMENT_INLINE_WORKER = os.getenv("SENTIMENT_INLINE_WORKER", "True").lower() == "true"  # drain from the API scheduler
+    SENTIMENT_WORKER_INTERVAL_SECONDS = 60
+    SENTIMENT_WORKER_MAX_BATCHES = 8  # per scheduler run; standalone workers drain the rest
+    
+    # Sentiment shift alerts (see services/sentiment_shift.py); windows are in reviews
+    SENTIMENT_SHIFT_FAST_WINDOW = 20
+    SENTIMENT_SHIFT_SLOW_WINDOW = 200
+    SENTIMENT_SHIFT_MIN_REVIEWS = 50  # per product (and after each alert) before alerting
+    SENTIMENT_SHIFT_Z = 3.0  # standard errors the recent mean must move
+    SENTIMENT_SHIFT_MIN_POSITIVE_DELTA = 0.15  # and at least this much positive share
+    SENTIMENT_SHIFT_MIN_SCORE_DELTA = 0.2  # or this much mean score
+    SENTIMENT_SHIFT_COOLDOWN_HOURS = 24
+    
+    # Review topics (see services/review_topics.py)
+    TOPIC_COUNT = 12
+    TOPIC_HASH_FEATURES = 2 ** 16
+    TOPIC_BATCH_SIZE = 1000  # reviews per incremental update step
+    TOPIC_MODEL_PATH = os.getenv("TOPIC_MODEL_PATH", "models/review_topics.pkl")
+    TOPIC_UPDATE_INTERVAL_HOURS = 1
+    TOPIC_MAX_BATCHES = 8  # per scheduler run; the next run picks up where this one stopped
+    
     # API Keys
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
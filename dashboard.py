@@ -84,6 +84,18 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# ---------------- Sentiment Cache ----------------
+# Standalone CSV app: reruns reuse polarity through Streamlit's cache, no database involved
+@st.cache_data(max_entries=50000, show_spinner=False)
+def textblob_sentiment(text):
+    p = TextBlob(str(text)).sentiment.polarity
+    if p > 0.1:
+        return {"sentiment": "positive", "score": p}
+    elif p < -0.1:
+        return {"sentiment": "negative", "score": p}
+    else:
+        return {"sentiment": "neutral", "score": p}
+
 # ---------------- Competitor Analyzer ----------------
 class CompetitorAnalyzer:
     def __init__(self):
@@ -141,31 +153,40 @@ class CompetitorAnalyzer:
 
     # ---------- Analysis Helpers ----------
     def analyze_sentiment(self, text):
-        a = TextBlob(str(text))
-        p = a.sentiment.polarity
-        if p > 0.1:
-            return "positive", p
-        elif p < -0.1:
-            return "negative", p
-        else:
-            return "neutral", p
+        return self.analyze_sentiments([text])[0]
+
+    def analyze_sentiments(self, texts):
+        # Polarity of texts seen on earlier reruns comes from Streamlit's cache
+        results = [textblob_sentiment(" ".join(str(t).split())) for t in texts]
+        return [(r["sentiment"], r["score"]) for r in results]
 
     def get_sentiment_analysis(self, product_name):
         df = self.reviews_df[
             self.reviews_df["product_name"] == product_name].copy()
         if df.empty:
             return None
-        sentiments = []
-        for r in df["review_text"]:
-            s, sc = self.analyze_sentiment(r)
-            sentiments.append({"sentiment": s, "score": sc})
-        s_df = pd.DataFrame(sentiments)
+        df = self._with_sentiment(df)
         return {
             "total_reviews": len(df),
-            "sentiment_distribution": s_df["sentiment"].value_counts().to_dict(),
-            "average_sentiment_score": s_df["score"].mean(),
+            "sentiment_distribution": df["sentiment"].value_counts().to_dict(),
+            "average_sentiment_score": df["sentiment_score"].mean(),
             "reviews_data": df
         }
+
+    def _with_sentiment(self, df):
+        """Use the sentiment columns ingestion.py precomputed; only unscored rows hit the model"""
+        if "sentiment" not in df.columns:
+            df["sentiment"] = None
+            df["sentiment_score"] = np.nan
+        precomputed = df["sentiment"].notna()
+        if "sentiment_model" in df.columns:
+            precomputed &= df["sentiment_model"] == "textblob"
+        missing = ~precomputed
+        if missing.any():
+            scored = self.analyze_sentiments(df.loc[missing, "review_text"].tolist())
+            df.loc[missing, "sentiment"] = [sent for sent, _ in scored]
+            df.loc[missing, "sentiment_score"] = [sc for _, sc in scored]
+        return df
     
 # ---------------- Dashboard Sections ----------------
 def product_analysis(analyzer, product_name):
@@ -195,7 +216,7 @@ def product_analysis(analyzer, product_name):
                       f"{sdata['average_sentiment_score']:.2f}")
         st.markdown("### Recent Reviews")
         for _, r in sdata["reviews_data"].head(5).iterrows():
-            sent, sc = analyzer.analyze_sentiment(r["review_text"])
+            sent, sc = r["sentiment"], r["sentiment_score"]
             with st.expander(f"{r['userid']} - Rating: {r['rating']}"):
                 st.write(r["review_text"])
                 st.write(f"Sentiment: **{sent}** (score {sc:.2f})")
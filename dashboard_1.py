@@ -37,6 +37,26 @@ def load_bert_model():
 
 tokenizer, bert_model = load_bert_model()
 
+# Standalone CSV app: reruns reuse scores through Streamlit's cache, no database involved
+@st.cache_data(max_entries=50000, show_spinner=False)
+def bert_sentiment(text):
+    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=128)
+    with torch.no_grad():
+        outputs = bert_model(**inputs)
+        probs = torch.nn.functional.softmax(outputs.logits, dim=1)
+        pred = torch.argmax(probs, dim=1).item()
+        score = probs[0][pred].item()
+
+    # Map 5-star model into 5 categories
+    star_labels = {
+        0: "very negative",  # 1 star
+        1: "negative",       # 2 stars
+        2: "neutral",        # 3 stars
+        3: "positive",       # 4 stars
+        4: "very positive"   # 5 stars
+    }
+    return {"sentiment": star_labels[pred], "score": score, "rating": pred + 1}
+
 # ---------------- Competitor Analyzer ----------------
 class CompetitorAnalyzer:
     def __init__(self):
@@ -44,41 +64,42 @@ class CompetitorAnalyzer:
         self.reviews_df = None
 
     def analyze_sentiment(self, text):
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=128)
-        with torch.no_grad():
-            outputs = bert_model(**inputs)
-            probs = torch.nn.functional.softmax(outputs.logits, dim=1)
-            pred = torch.argmax(probs, dim=1).item()
-            score = probs[0][pred].item()
-
-        # Map 5-star model into 5 categories
-        star_labels = {
-            0: "very negative",  # 1 star
-            1: "negative",       # 2 stars
-            2: "neutral",        # 3 stars
-            3: "positive",       # 4 stars
-            4: "very positive"   # 5 stars
-        }
-        return star_labels[pred], score
+        return self.analyze_sentiments([text])[0]
+
+    def analyze_sentiments(self, texts):
+        # Reviews scored on an earlier rerun come from Streamlit's cache
+        results = [bert_sentiment(" ".join(str(t).split())) for t in texts]
+        return [(r["sentiment"], r["score"]) for r in results]
 
     def get_sentiment_analysis(self, product_name):
         df = self.reviews_df[self.reviews_df["product_name"] == product_name].copy()
         if df.empty:
             return None
 
-        sentiments = []
-        for r in df["review_text"]:
-            s, sc = self.analyze_sentiment(r)
-            sentiments.append({"sentiment": s, "score": sc})
-
-        s_df = pd.DataFrame(sentiments)
+        df = self._with_sentiment(df)
         return {
             "total_reviews": len(df),
-            "sentiment_distribution": s_df["sentiment"].value_counts().to_dict(),
-            "average_sentiment_score": s_df["score"].mean(),
+            "sentiment_distribution": df["sentiment"].value_counts().to_dict(),
+            "average_sentiment_score": df["sentiment_score"].mean(),
             "reviews_data": df
         }
 
+    def _with_sentiment(self, df):
+        """Use the sentiment columns ingestion.py precomputed; only unscored rows hit the model"""
+        if "sentiment" not in df.columns:
+            df["sentiment"] = None
+            df["sentiment_score"] = np.nan
+        precomputed = df["sentiment"].notna()
+        if "sentiment_model" in df.columns:
+            precomputed &= df["sentiment_model"] == "bert"
+            df.loc[precomputed, "sentiment"] = df.loc[precomputed, "sentiment"].str.replace("_", " ")
+        missing = ~precomputed
+        if missing.any():
+            scored = self.analyze_sentiments(df.loc[missing, "review_text"].tolist())
+            df.loc[missing, "sentiment"] = [sent for sent, _ in scored]
+            df.loc[missing, "sentiment_score"] = [sc for _, sc in scored]
+        return df
+
 
 # ---------------- Dashboard Sections ----------------
 def product_analysis(analyzer, product_name):
@@ -106,7 +127,7 @@ def product_analysis(analyzer, product_name):
             st.metric("Avg Sentiment Score", f"{sdata['average_sentiment_score']:.2f}")
         st.markdown("### Recent Reviews")
         for _, r in sdata["reviews_data"].head(5).iterrows():
-            sent, sc = analyzer.analyze_sentiment(r["review_text"])
+            sent, sc = r["sentiment"], r["sentiment_score"]
             with st.expander(f"{r['userid']} - Rating: {r['rating']}"):
                 st.write(r["review_text"])
                 st.write(f"Sentiment: **{sent}** (score {sc:.2f})")
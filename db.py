@@ -1,14 +1,16 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, Text, Boolean, ForeignKey, Index, LargeBinary, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from query_stats import install_query_stats
 
 load_dotenv()
 
 Base = declarative_base()
 engine = create_engine(os.getenv("DATABASE_URL", "sqlite:///./data/tracker.db"))
+install_query_stats(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 class User(Base):
@@ -37,6 +39,10 @@ class Product(Base):
     prices = relationship("Price", back_populates="product")
     reviews = relationship("Review", back_populates="product")
     features = relationship("Feature", back_populates="product")
+    
+    __table_args__ = (
+        Index('ix_products_created_at_id', 'created_at', 'id'),
+    )
 
 class Price(Base):
     __tablename__ = "prices"
@@ -51,6 +57,10 @@ class Price(Base):
     scraped_at = Column(DateTime, default=datetime.utcnow)
     
     product = relationship("Product", back_populates="prices")
+    
+    __table_args__ = (
+        Index('ix_prices_product_scraped_at_id', 'product_id', 'scraped_at', 'id'),
+    )
 
 class Review(Base):
     __tablename__ = "reviews"
@@ -64,8 +74,24 @@ class Review(Base):
     sentiment_score = Column(Float)
     review_date = Column(DateTime)
     scraped_at = Column(DateTime, default=datetime.utcnow)
+    fingerprint = Column(String(40))  # sha1 of normalized title + content
+    
+    # Out-of-band scoring by services.sentiment_worker: pending -> processing -> done / failed
+    # (NULL for rows stored with their sentiment already set)
+    sentiment_status = Column(String)
+    sentiment_worker = Column(String)  # claim token of the worker scoring the row
+    sentiment_claimed_at = Column(DateTime)
+    sentiment_attempts = Column(Integer, default=0)
+    topic = Column(Integer)  # review_topics.id assigned by services.review_topics
     
     product = relationship("Product", back_populates="reviews")
+    
+    __table_args__ = (
+        Index('ux_reviews_product_fingerprint', 'product_id', 'fingerprint', unique=True),
+        Index('ix_reviews_sentiment_status_id', 'sentiment_status', 'id'),
+        Index('ix_reviews_scraped_at_id', 'scraped_at', 'id'),
+        Index('ix_reviews_rating_id', 'rating', 'id'),
+    )
 
 class Feature(Base):
     __tablename__ = "features"
@@ -80,8 +106,127 @@ class Feature(Base):
     battery = Column(String)
     weight = Column(String)
     
+    # Typed specs parsed once at ingest by services.spec_normalizer
+    ram_gb = Column(Float)
+    storage_gb = Column(Float)
+    is_ssd = Column(Boolean)
+    cpu_vendor = Column(String)  # intel, amd, apple, qualcomm
+    cpu_tier = Column(Integer)  # 1 (entry) .. 9 (flagship), e.g. i5 / Ryzen 5 -> 5
+    screen_inches = Column(Float)
+    gpu_class = Column(String)  # integrated, entry, mid, high
+    
     product = relationship("Product", back_populates="features")
 
+class ArchivedReviewFingerprint(Base):
+    """Fingerprints of reviews moved to the Parquet archive, kept hot so re-scrapes stay deduplicated"""
+    __tablename__ = "archived_review_fingerprints"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    fingerprint = Column(String(40), nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ux_archived_review_fingerprints_product_fingerprint', 'product_id', 'fingerprint', unique=True),
+    )
+
+class PriceSeries(Base):
+    """One product's prices for one month, delta + varint encoded by services.price_series"""
+    __tablename__ = "price_series"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    month = Column(String(7), nullable=False)  # YYYY-MM
+    points = Column(Integer, nullable=False)
+    first_at = Column(DateTime)
+    last_at = Column(DateTime)
+    last_price_id = Column(Integer, nullable=False)  # newest prices.id folded into the blob
+    payload = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ux_price_series_product_month', 'product_id', 'month', unique=True),
+    )
+
+class SentimentCacheEntry(Base):
+    """Sentiment of one cleaned review text under one model, see services.sentiment_cache"""
+    __tablename__ = "sentiment_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    model_id = Column(String, nullable=False)
+    text_hash = Column(String(40), nullable=False)  # sha1 of the cleaned text
+    label = Column(String, nullable=False)
+    score = Column(Float)
+    rating = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ux_sentiment_cache_model_hash', 'model_id', 'text_hash', unique=True),
+    )
+
+class SentimentDaily(Base):
+    """Scored-review totals per product and day, maintained by services.sentiment_aggregates"""
+    __tablename__ = "sentiment_daily"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    day = Column(Date, nullable=False)  # day the reviews were scraped
+    very_positive = Column(Integer, default=0)
+    positive = Column(Integer, default=0)
+    neutral = Column(Integer, default=0)
+    negative = Column(Integer, default=0)
+    very_negative = Column(Integer, default=0)
+    reviews = Column(Integer, default=0)
+    rating_sum = Column(Float, default=0)
+    rated = Column(Integer, default=0)  # reviews with a star rating
+    score_sum = Column(Float, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ux_sentiment_daily_product_day', 'product_id', 'day', unique=True),
+    )
+
+class SentimentShiftState(Base):
+    """Online (exponentially weighted) sentiment statistics per product, see services.sentiment_shift"""
+    __tablename__ = "sentiment_shift_state"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, unique=True)
+    observations = Column(Integer, default=0)
+    fast_positive = Column(Float)  # recent positive share
+    slow_positive = Column(Float)  # baseline positive share
+    slow_positive_var = Column(Float)
+    fast_score = Column(Float)  # recent mean signed score (-1 .. 1)
+    slow_score = Column(Float)
+    slow_score_var = Column(Float)
+    last_alert_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ReviewTopic(Base):
+    """Top terms of one review topic, refreshed by services.review_topics"""
+    __tablename__ = "review_topics"
+    
+    id = Column(Integer, primary_key=True)  # cluster number
+    top_terms = Column(Text)  # comma-separated, strongest first
+    reviews = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ProductTopic(Base):
+    """Reviews per product and topic, with their sentiment split"""
+    __tablename__ = "product_topics"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    topic = Column(Integer, nullable=False)
+    reviews = Column(Integer, default=0)
+    positive = Column(Integer, default=0)
+    negative = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ux_product_topics_product_topic', 'product_id', 'topic', unique=True),
+    )
+
 class Alert(Base):
     __tablename__ = "alerts"
     
@@ -92,4 +237,71 @@ class Alert(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     sent = Column(Boolean, default=False)
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+Base.metadata.create_all(bind=engine)
+
+def upgrade_schema():
+    """Add columns and indexes introduced after a table was first created (create_all only creates tables)
+
+    Run explicitly (`python db.py`, seed_db.py or API startup) rather than on import.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+# Full-text search over products and reviews (SQLite FTS5 external content tables
+# kept in sync by triggers)
+FTS_TABLES = {
+    'products_fts': ('products', ['name', 'brand', 'model'], 'bm25(10.0, 5.0, 2.0)'),
+    'reviews_fts': ('reviews', ['title', 'content'], 'bm25(2.0, 1.0)'),
+}
+
+def _create_search_index(bind=None):
+    """Create FTS5 tables and sync triggers, populating them on first creation"""
+    bind = bind or engine
+    if bind.dialect.name != 'sqlite':
+        return
+    
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for fts_table, (source, columns, rank) in FTS_TABLES.items():
+            if inspector.has_table(fts_table):
+                continue
+            
+            cols = ', '.join(columns)
+            new_vals = ', '.join(f"new.{c}" for c in columns)
+            old_vals = ', '.join(f"old.{c}" for c in columns)
+            
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {fts_table} USING fts5({cols}, content='{source}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {source} BEGIN "
+                f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {source} BEGIN "
+                f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER {fts_table}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+                f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+                f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+            ))
+            conn.execute(text(f"INSERT INTO {fts_table}({fts_table}, rank) VALUES ('rank', '{rank}')"))
+            conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+_create_search_index()
+
+if __name__ == "__main__":
+    upgrade_schema()
+    print("✅ Database schema is up to date")
@@ -0,0 +1,32 @@
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from typing import AsyncIterator
+import os
+from dotenv import load_dotenv
+from query_stats import install_query_stats
+
+load_dotenv()
+
+def _async_url(url: str) -> str:
+    """Map a sync database URL onto its async driver"""
+    if url.startswith("sqlite://"):
+        # Covers file URLs (sqlite:///path) and the in-memory sqlite://
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+async_engine = create_async_engine(
+    _async_url(os.getenv("DATABASE_URL", "sqlite:///./data/tracker.db"))
+)
+install_query_stats(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency yielding an async session"""
+    async with AsyncSessionLocal() as session:
+        yield session
@@ -14,6 +14,9 @@ REVIEWS_FILE = "My_docs/review.csv"
 MOBILE_FILE = "My_docs/mobile.csv"
 OUTPUT_REVIEWS = "cleaned_reviews.csv"
 OUTPUT_MOBILE = "cleaned_mobile.csv"
+SENTIMENT_MODEL = os.getenv("INGEST_SENTIMENT_MODEL", "textblob")  # textblob | bert
+SENTIMENT_BATCH_SIZE = 256
+REVIEW_KEY = ['productid', 'userid', 'review']
 os.makedirs("data", exist_ok=True)
 
 # ---------------- FUNCTIONS ----------------
@@ -66,6 +69,58 @@ def clean_reviews(df):
     df = df.drop_duplicates(subset=['productid', 'userid', 'review'])
     return df
 
+def score_textblob(texts):
+    """Polarity labels with the thresholds dashboard.py uses"""
+    results = []
+    for text in texts:
+        p = TextBlob(str(text)).sentiment.polarity
+        label = "positive" if p > 0.1 else "negative" if p < -0.1 else "neutral"
+        results.append((label, p))
+    return results
+
+def score_bert(texts):
+    """Star-rating labels from the shared BERT analyzer (batched and cached)"""
+    from services.model_registry import registry
+    results = registry.get('sentiment').analyze_batch(list(texts))
+    # Failed reviews stay unscored (None, NaN) so the next run retries them
+    return [(None, float('nan')) if 'error' in r else (r['sentiment'], r['score']) for r in results]
+
+def add_sentiment(df, previous=None):
+    """Add sentiment / sentiment_score / sentiment_model, scoring only reviews not already scored"""
+    df = df.copy()
+    df['sentiment'] = None
+    df['sentiment_score'] = float('nan')
+    df['sentiment_model'] = None
+
+    # Reuse scores from the last run for reviews that are unchanged and scored by the same model
+    if previous is not None and {'sentiment', 'sentiment_score', 'sentiment_model'} <= set(previous.columns):
+        previous = previous[(previous['sentiment_model'] == SENTIMENT_MODEL) & previous['sentiment'].notna()]
+        # Compare keys as strings; the CSV round trip may have re-typed ids
+        previous = previous.assign(**{c: previous[c].astype(str) for c in REVIEW_KEY})
+        previous = previous.drop_duplicates(subset=REVIEW_KEY).set_index(REVIEW_KEY)
+        keys = pd.MultiIndex.from_frame(df[REVIEW_KEY].astype(str))
+        known = keys.isin(previous.index)
+        for column in ('sentiment', 'sentiment_score', 'sentiment_model'):
+            df.loc[known, column] = previous.loc[keys[known], column].values
+
+    if SENTIMENT_MODEL == 'textblob' and TextBlob is None:
+        print("TextBlob not installed; skipping sentiment scoring")
+        return df
+    scorer = score_bert if SENTIMENT_MODEL == 'bert' else score_textblob
+
+    todo = df.index[df['sentiment'].isna()]
+    print(f"Scoring sentiment for {len(todo)} new reviews ({len(df) - len(todo)} reused) with {SENTIMENT_MODEL}")
+    for start in range(0, len(todo), SENTIMENT_BATCH_SIZE):
+        batch = todo[start:start + SENTIMENT_BATCH_SIZE]
+        scored = scorer(df.loc[batch, 'review'].tolist())
+        df.loc[batch, 'sentiment'] = [label for label, _ in scored]
+        df.loc[batch, 'sentiment_score'] = [score for _, score in scored]
+        df.loc[batch, 'sentiment_model'] = [SENTIMENT_MODEL if label is not None else None for label, _ in scored]
+    failed = int(df.loc[todo, 'sentiment'].isna().sum())
+    if failed:
+        print(f"Sentiment scoring failed for {failed} reviews; left unscored for the next run")
+    return df
+
 def clean_mobile(df):
     """Clean mobile/product DataFrame"""
     df['mobilename'] = df['mobilename'].astype(str).str.strip()
@@ -106,7 +161,13 @@ def main():
 
         df_reviews_clean = clean_reviews(df_reviews)
         print(f"Cleaned reviews: {len(df_reviews_clean)} rows")
-        df_reviews_clean.to_csv(os.path.join("data", OUTPUT_REVIEWS), index=False, encoding="utf-8-sig")
+
+        output_path = os.path.join("data", OUTPUT_REVIEWS)
+        previous = None
+        if os.path.exists(output_path):
+            previous = pd.read_csv(output_path, encoding="utf-8-sig")
+        df_reviews_clean = add_sentiment(df_reviews_clean, previous)
+        df_reviews_clean.to_csv(output_path, index=False, encoding="utf-8-sig")
         print(f"✅ Cleaned reviews saved: data/{OUTPUT_REVIEWS}")
     else:
         print(f"Reviews file not found: {REVIEWS_FILE}")
@@ -1,11 +1,32 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 import uvicorn
-from datetime import datetime
+import time
+from datetime import date, datetime, timedelta, timezone
 import logging
 from services.aggregator import DataAggregator
 from services.alerts import AlertService
-from db import SessionLocal
+from services.retention import RetentionService
+from config import config
+from db import SessionLocal, engine, upgrade_schema
+from db_async import get_async_db, async_engine
+import async_repository as repo
+from repository import is_archived, archived_snapshot, archived_snapshot_diff
+from query_budget import QueryBudget, query_budget
+from query_stats import query_stats
+from services.hot_cache import get_latest_state
+from services.price_cube import price_cube
+from services.price_series import sync_series
+from services.write_buffer import write_buffer
+from services.sentiment_cache import sentiment_cache
+from services.model_registry import registry, resident_memory_mb, process_uptime_seconds
+from services.sentiment_worker import SentimentWorker, queue_depth
+from services.sentiment_aggregates import ensure_built
+from services.review_topics import update_topics, product_topics
+import numpy as np
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,13 +35,21 @@ logger = logging.getLogger(__name__)
 app = FastAPI(title="Competitor Tracker API")
 scheduler = BackgroundScheduler()
 
-# Initialize services
+# Initialize services (models are loaded lazily through the registry)
 aggregator = DataAggregator()
 alert_service = AlertService()
+retention_service = RetentionService()
 
 @app.on_event("startup")
 async def startup_event():
     """Start the scheduler when the app starts"""
+    upgrade_schema()
+    db = SessionLocal()
+    try:
+        ensure_built(db)
+    finally:
+        db.close()
+    
     scheduler.add_job(
         scrape_all_products,
         'interval',
@@ -39,13 +68,57 @@ async def startup_event():
         replace_existing=True
     )
     
+    scheduler.add_job(
+        archive_cold_data,
+        'interval',
+        hours=config.ARCHIVE_INTERVAL_HOURS,
+        id='archive_cold_data',
+        name='Archive cold history to Parquet',
+        replace_existing=True
+    )
+    
+    if config.SENTIMENT_INLINE_WORKER:
+        scheduler.add_job(
+            score_pending_reviews,
+            'interval',
+            seconds=config.SENTIMENT_WORKER_INTERVAL_SECONDS,
+            id='score_pending_reviews',
+            name='Score pending review sentiment',
+            replace_existing=True
+        )
+    
+    scheduler.add_job(
+        update_review_topics,
+        'interval',
+        hours=config.TOPIC_UPDATE_INTERVAL_HOURS,
+        id='update_review_topics',
+        name='Fold new reviews into the topic model',
+        replace_existing=True
+    )
+    
     scheduler.start()
     logger.info("Scheduler started")
+    
+    # Ready to serve before any model is loaded; warm them up off the request path
+    # Measured from process start so interpreter boot and imports are included;
+    # falls back to time since the registry was created where /proc is unavailable
+    uptime = process_uptime_seconds()
+    app.state.startup_seconds = uptime if uptime is not None else round(time.perf_counter() - registry.created_at, 2)
+    logger.info(f"API ready in {app.state.startup_seconds}s, RSS {resident_memory_mb()}MB")
+    registry.warmup()
+
+@app.middleware("http")
+async def enforce_query_budget(request: Request, call_next):
+    """Count the statements each API request issues"""
+    with QueryBudget(f"{request.method} {request.url.path}"):
+        return await call_next(request)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Shutdown the scheduler when the app stops"""
     scheduler.shutdown()
+    write_buffer.close()
+    await async_engine.dispose()
     logger.info("Scheduler stopped")
 
 @app.get("/")
@@ -70,18 +143,193 @@ async def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/debug/query-stats")
+async def get_query_stats(limit: int = 20, sort_by: str = "total_ms", explain_top: Optional[int] = None):
+    """Slowest statement shapes with latency histograms and optional query plans"""
+    if sort_by not in ("total_ms", "max_ms", "mean_ms", "count"):
+        raise HTTPException(status_code=400, detail="sort_by must be total_ms, max_ms, mean_ms or count")
+    # EXPLAIN runs on the sync engine
+    return await run_in_threadpool(
+        query_stats.report, limit=limit, sort_by=sort_by, explain_bind=engine, explain_top=explain_top
+    )
+
+@app.get("/debug/write-buffer")
+async def get_write_buffer_stats():
+    """Group-commit throughput and flush / acknowledgement latency"""
+    return write_buffer.stats()
+
+@app.get("/debug/sentiment-cache")
+async def get_sentiment_cache_stats():
+    """Hit rate of the sentiment cache (memory LRU and database)"""
+    return sentiment_cache.stats()
+
+@app.get("/debug/models")
+async def get_model_stats():
+    """Cold-start time plus per-model load time and resident memory before / after loading"""
+    return {"startup_seconds": getattr(app.state, "startup_seconds", None), **registry.report()}
+
+def _with_session(work, *args, **kwargs):
+    """Run sync repository code on its own session; call through run_in_threadpool from async routes"""
+    db = SessionLocal()
+    try:
+        return work(db, *args, **kwargs)
+    finally:
+        db.close()
+
+@app.get("/debug/sentiment-queue")
+async def get_sentiment_queue():
+    """Reviews waiting for, being given, or failing sentiment scoring"""
+    return await run_in_threadpool(_with_session, queue_depth)
+
+@app.get("/debug/hot-cache")
+async def get_hot_cache_stats():
+    """Memory footprint of the latest-state cache"""
+    return await run_in_threadpool(_with_session, lambda db: get_latest_state(db).memory_report())
+
+def _parse_ids(product_ids: str):
+    try:
+        return [int(i) for i in product_ids.split(',') if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="product_ids must be comma-separated integers")
+
+@app.get("/analytics/price-cube")
+async def get_price_cube(product_ids: str, field: str = "close", start: Optional[date] = None,
+                         end: Optional[date] = None):
+    """Daily close price, min discount or in-stock series for several products"""
+    if field not in ("close", "min_discount", "in_stock"):
+        raise HTTPException(status_code=400, detail="field must be close, min_discount or in_stock")
+    if not price_cube.exists():
+        raise HTTPException(status_code=404, detail="Price cube not built yet")
+    ids = _parse_ids(product_ids)
+    # FastAPI validates start / end as YYYY-MM-DD and answers 422 otherwise
+    block = price_cube.slice(field, ids, start, end)
+    dates = price_cube.dates(start, end)[:block.shape[1]]
+    return {
+        "dates": [d.strftime('%Y-%m-%d') for d in dates],
+        "series": {
+            str(pid): [None if np.isnan(v) else float(v) for v in row]
+            for pid, row in zip(ids, block)
+        }
+    }
+
+@app.get("/analytics/price-correlation")
+async def get_price_correlation(product_ids: str, days: int = 90):
+    """Correlation of daily price returns between products"""
+    if not price_cube.exists():
+        raise HTTPException(status_code=404, detail="Price cube not built yet")
+    corr = price_cube.correlation(_parse_ids(product_ids), start=datetime.utcnow() - timedelta(days=days))
+    return {
+        str(pid): {str(other): (None if np.isnan(v) else float(v)) for other, v in row.items()}
+        for pid, row in corr.iterrows()
+    }
+
+@app.get("/products")
+async def list_products(platform: Optional[str] = None, brand: Optional[str] = None,
+                        cursor: Optional[str] = None, limit: int = 50,
+                        db: AsyncSession = Depends(get_async_db)):
+    """List tracked products, one keyset page at a time"""
+    page = await repo.list_products(db, platform=platform, brand=brand, cursor=cursor, limit=limit)
+    return {"items": [repo.to_dict(p) for p in page['items']], "next_cursor": page['next_cursor']}
+
+@app.get("/products/{product_id}")
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get a product with its latest price"""
+    product = await repo.get_product(db, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    latest_price = await repo.get_latest_price(db, product_id)
+    return {
+        **repo.to_dict(product),
+        "latest_price": repo.to_dict(latest_price) if latest_price else None
+    }
+
+@app.get("/products/{product_id}/topics")
+async def get_product_topics(product_id: int, limit: int = 5):
+    """What a product's reviews talk about, with each topic's share and negative share"""
+    return await run_in_threadpool(_with_session, product_topics, product_id, limit=min(limit, 20))
+
+@app.get("/products/{product_id}/prices")
+async def get_price_history(product_id: int, cursor: Optional[str] = None, limit: int = 90,
+                            db: AsyncSession = Depends(get_async_db)):
+    """Get price history for a product, newest first"""
+    page = await repo.get_price_history(db, product_id, cursor=cursor, limit=limit)
+    return {"items": [repo.to_dict(p) for p in page['items']], "next_cursor": page['next_cursor']}
+
+@app.get("/products/{product_id}/reviews")
+async def get_reviews(product_id: int, sentiment: Optional[str] = None, cursor: Optional[str] = None,
+                      limit: int = 20, db: AsyncSession = Depends(get_async_db)):
+    """Get reviews for a product, newest first"""
+    page = await repo.list_reviews(db, product_id=product_id, sentiment=sentiment, cursor=cursor, limit=limit)
+    return {"items": [repo.to_dict(r) for r in page['items']], "next_cursor": page['next_cursor']}
+
+def _utc_naive(value: datetime) -> datetime:
+    """Timestamps are stored as naive UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+async def _from_archive(query, *args, **kwargs):
+    """Run an as-of query past the retention horizon on the analytics engine"""
+    try:
+        return await run_in_threadpool(query, *args, **kwargs)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Timestamps older than {config.RETENTION_DAYS} days are archived and the archive "
+                   f"cannot be queried here: {str(e)}"
+        )
+
+@app.get("/market/snapshot")
+async def get_market_snapshot(at: datetime, platform: Optional[str] = None,
+                              db: AsyncSession = Depends(get_async_db)):
+    """Each product's effective price, discount and stock at a point in time"""
+    at = _utc_naive(at)
+    if is_archived(at):
+        return await _from_archive(archived_snapshot, at, platform=platform)
+    return await repo.market_snapshot(db, at, platform=platform)
+
+@app.get("/market/diff")
+async def get_market_diff(before: datetime, after: datetime, platform: Optional[str] = None,
+                          db: AsyncSession = Depends(get_async_db)):
+    """Per-product price, discount and stock changes between two points in time"""
+    before, after = _utc_naive(before), _utc_naive(after)
+    if after <= before:
+        raise HTTPException(status_code=400, detail="after must be later than before")
+    if is_archived(before):
+        return await _from_archive(archived_snapshot_diff, before, after, platform=platform)
+    return await repo.market_diff(db, before, after, platform=platform)
+
+@app.get("/alerts")
+async def list_alerts(sent: Optional[bool] = None, limit: int = 50, db: AsyncSession = Depends(get_async_db)):
+    """List alerts"""
+    alerts = await repo.list_alerts(db, sent=sent, limit=limit)
+    return [repo.to_dict(a) for a in alerts]
+
+@app.post("/alerts/{alert_id}/sent")
+async def mark_alert_sent(alert_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Mark an alert as sent"""
+    if not await repo.mark_alert_sent(db, alert_id):
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return {"message": f"Alert {alert_id} marked as sent"}
+
+# Reads are set-based and writes go through the write buffer, so the statement
+# count stays flat as products are added
+@query_budget('scrape_all_products', max_queries=60)
 def scrape_all_products():
     """Background task to scrape all products"""
     logger.info("Starting scheduled scraping...")
     db = SessionLocal()
     try:
-        aggregator.run_aggregation(db)
-        logger.info("Scraping completed successfully")
+        stats = aggregator.run_aggregation(db)
+        logger.info(f"Scraping completed successfully: {stats}")
+        price_cube.update(db)
+        sync_series(db)
     except Exception as e:
         logger.error(f"Error during scraping: {str(e)}")
     finally:
         db.close()
 
+@query_budget('check_alerts')
 def check_alerts():
     """Background task to check and send alerts"""
     logger.info("Checking for alerts...")
@@ -94,5 +342,47 @@ def check_alerts():
     finally:
         db.close()
 
+# A run drains at most SENTIMENT_WORKER_MAX_BATCHES batches, each a fixed set of claim
+# and bulk-update statements, so the run fits in 100 statements and no shape repeats past 10
+@query_budget('score_pending_reviews', max_queries=100)
+def score_pending_reviews():
+    """Background task to score pending review sentiment (standalone workers can run alongside)"""
+    try:
+        worker = SentimentWorker()
+        if worker.drain(max_batches=config.SENTIMENT_WORKER_MAX_BATCHES):
+            logger.info(f"Sentiment scoring completed: {worker.stats()}")
+    except Exception as e:
+        logger.error(f"Error scoring reviews: {str(e)}")
+
+# A run folds in at most TOPIC_MAX_BATCHES batches of reviews with a few statements
+# each, so the run fits in 40 statements and no shape repeats past 10
+@query_budget('update_review_topics', max_queries=40)
+def update_review_topics():
+    """Background task to fold new reviews into the topic model"""
+    db = SessionLocal()
+    try:
+        result = update_topics(db, max_batches=config.TOPIC_MAX_BATCHES)
+        logger.info(f"Topic update completed: {result}")
+    except Exception as e:
+        logger.error(f"Error updating review topics: {str(e)}")
+    finally:
+        db.close()
+
+# Archiving runs in fixed-size batches; series compaction is set-based
+@query_budget('archive_cold_data', max_queries=100)
+def archive_cold_data():
+    """Background task to move cold history into the Parquet archive"""
+    logger.info("Archiving cold history...")
+    db = SessionLocal()
+    try:
+        # Compact first so archived months stay readable from the series blobs
+        sync_series(db)
+        result = retention_service.archive_cold_data(db)
+        logger.info(f"Archive completed: {result['prices_archived']} prices, {result['reviews_archived']} reviews")
+    except Exception as e:
+        logger.error(f"Error archiving history: {str(e)}")
+    finally:
+        db.close()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+Per-unit-of-work query budgets with N+1 detection
+
+Every statement executed through any SQLAlchemy engine is attributed to the
+budgets active in the current context (a Streamlit rerun, an API request or a
+scheduled job). When a budget closes it checks the statement count and the
+most repeated statement shape; violations are logged, or raised when strict
+mode is on (QUERY_BUDGET_STRICT=true, or automatically under pytest).
+"""
+
+import os
+import re
+import time
+import logging
+import functools
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import config
+
+logger = logging.getLogger(__name__)
+
+_active_budgets: ContextVar[Tuple['QueryBudget', ...]] = ContextVar('active_query_budgets', default=())
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:\?|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a block breaks its query budget"""
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse literals, IN-lists and whitespace so repeated queries share one shape"""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def _strict_default() -> bool:
+    return config.QUERY_BUDGET_STRICT or 'PYTEST_CURRENT_TEST' in os.environ
+
+
+class QueryBudget:
+    """Count statements, DB time and repeated shapes for one unit of work
+
+    Use as a context manager or decorator, or call start()/stop() around a
+    script body that cannot be indented (the Streamlit app).
+    """
+
+    def __init__(self, name: str, max_queries: Optional[int] = None,
+                 max_repeats: Optional[int] = None, strict: Optional[bool] = None):
+        self.name = name
+        self.max_queries = config.QUERY_BUDGET_DEFAULT if max_queries is None else max_queries
+        # max_repeats=0 disables N+1 detection for inherently per-row jobs
+        self.max_repeats = config.QUERY_BUDGET_MAX_REPEATS if max_repeats is None else max_repeats
+        self.strict = _strict_default() if strict is None else strict
+        self.statements = 0
+        self.db_time = 0.0
+        self.shapes: Counter = Counter()
+        self._token = None
+
+    def record(self, statement: str, elapsed: float):
+        self.statements += 1
+        self.db_time += elapsed
+        self.shapes[normalize_statement(statement)] += 1
+
+    def start(self) -> 'QueryBudget':
+        # A rerun interrupted by st.stop()/st.rerun() never reaches stop();
+        # drop its stale budget rather than charging this run to it as well
+        active = tuple(b for b in _active_budgets.get() if b.name != self.name)
+        self._token = _active_budgets.set(active + (self,))
+        return self
+
+    def stop(self) -> Dict:
+        if self._token is not None:
+            _active_budgets.reset(self._token)
+            self._token = None
+        return self.check()
+
+    def violations(self):
+        problems = []
+        if self.max_queries and self.statements > self.max_queries:
+            problems.append(f"{self.statements} statements (budget {self.max_queries})")
+        if self.max_repeats and self.shapes:
+            shape, count = self.shapes.most_common(1)[0]
+            if count > self.max_repeats:
+                problems.append(f"possible N+1: {count}x {shape[:200]}")
+        return problems
+
+    def summary(self) -> Dict:
+        return {
+            'name': self.name,
+            'statements': self.statements,
+            'db_time_ms': round(self.db_time * 1000, 2),
+            'distinct_shapes': len(self.shapes),
+            'top_repeats': self.shapes.most_common(3)
+        }
+
+    def check(self) -> Dict:
+        summary = self.summary()
+        problems = self.violations()
+        if problems:
+            message = f"Query budget exceeded in {self.name}: " + "; ".join(problems)
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        else:
+            logger.debug(
+                f"{self.name}: {summary['statements']} statements, "
+                f"{summary['db_time_ms']}ms in DB"
+            )
+        return summary
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # Don't mask the original error with a budget complaint
+            if self._token is not None:
+                _active_budgets.reset(self._token)
+                self._token = None
+            return False
+        self.stop()
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with QueryBudget(self.name, self.max_queries, self.max_repeats, self.strict):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def query_budget(name: str, max_queries: Optional[int] = None,
+                 max_repeats: Optional[int] = None, strict: Optional[bool] = None) -> QueryBudget:
+    """Decorator/context manager shorthand for QueryBudget"""
+    return QueryBudget(name, max_queries, max_repeats, strict)
+
+
+# Listening on the Engine class covers the sync engine and the async engine's
+# underlying sync engine; greenlets used by asyncio sessions share the caller's context
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_budget_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_budget_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    for budget in _active_budgets.get():
+        budget.record(statement, elapsed)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # after_cursor_execute never fires for a failed statement; drop its start time
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_budget_start'):
+        connection.info['query_budget_start'].pop()
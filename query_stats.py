@@ -0,0 +1,156 @@
+"""
+Engine-level query timing: latency histograms per normalized statement and a slow-query log
+"""
+
+import time
+import logging
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import config
+from query_budget import normalize_statement
+
+logger = logging.getLogger(__name__)
+
+# Upper bucket edges in milliseconds; the last bucket is open-ended
+BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Describe bound parameters by type (and batch size) without logging their values"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = parameters[0] if parameters else ()
+        return f"{len(parameters)} x {parameter_shape(first)}"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(type(v).__name__ for v in parameters) + ')'
+    return type(parameters).__name__
+
+
+class StatementStats:
+    """Latency histogram and worst sample for one statement shape"""
+
+    def __init__(self, shape: str):
+        self.shape = shape
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.worst_statement = None
+        self.worst_parameters = None
+
+    def add(self, elapsed_ms: float, statement: str, parameters):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.buckets[bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+        if elapsed_ms >= self.max_ms:
+            self.max_ms = elapsed_ms
+            self.worst_statement = statement
+            self.worst_parameters = parameters
+
+    def percentile(self, fraction: float) -> float:
+        """Bucket upper edge containing the given fraction of samples"""
+        target = fraction * self.count
+        running = 0
+        for index, count in enumerate(self.buckets):
+            running += count
+            if running >= target and count:
+                return BUCKETS_MS[index] if index < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict:
+        return {
+            'statement': self.shape,
+            'count': self.count,
+            'total_ms': round(self.total_ms, 2),
+            'mean_ms': round(self.total_ms / self.count, 2) if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': round(self.max_ms, 2),
+            'histogram': dict(zip([f"<={edge}ms" for edge in BUCKETS_MS] + ['>5000ms'], self.buckets))
+        }
+
+
+class QueryStats:
+    """Process-wide statement timings collected from every instrumented engine"""
+
+    def __init__(self, slow_query_ms: Optional[float] = None):
+        self.slow_query_ms = config.SLOW_QUERY_MS if slow_query_ms is None else slow_query_ms
+        self._stats: Dict[str, StatementStats] = {}
+        self._lock = threading.Lock()
+        self._engines = set()
+
+    def install(self, engine: Engine):
+        """Attach timing hooks to an engine (pass async_engine.sync_engine for async engines)"""
+        if engine in self._engines:
+            return
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        self._engines.add(engine)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_stats_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_stats_start', None)
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        shape = normalize_statement(statement)
+
+        with self._lock:
+            stats = self._stats.get(shape)
+            if stats is None:
+                stats = self._stats[shape] = StatementStats(shape)
+            stats.add(elapsed_ms, statement, parameters)
+
+        if elapsed_ms >= self.slow_query_ms:
+            logger.warning(
+                f"Slow query ({elapsed_ms:.1f}ms): {shape[:500]} "
+                f"params={parameter_shape(parameters, executemany)}"
+            )
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def explain(self, bind: Engine, statement: str, parameters) -> List[str]:
+        """Query plan for a captured statement; only read-only statements are explained"""
+        if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return []
+        prefix = 'EXPLAIN QUERY PLAN ' if bind.dialect.name == 'sqlite' else 'EXPLAIN '
+        try:
+            with bind.connect() as conn:
+                rows = conn.exec_driver_sql(prefix + statement, parameters).all()
+            return [' | '.join(str(value) for value in row) for row in rows]
+        except Exception as e:
+            logger.debug(f"Could not explain statement: {str(e)}")
+            return [f"unavailable: {str(e)}"]
+
+    def report(self, limit: int = 20, sort_by: str = 'total_ms',
+               explain_bind: Optional[Engine] = None, explain_top: Optional[int] = None) -> List[Dict]:
+        """Statement shapes ranked by total (or max/mean) time, optionally with plans for the worst"""
+        with self._lock:
+            ranked = sorted(self._stats.values(), key=lambda s: s.to_dict()[sort_by], reverse=True)[:limit]
+            samples = [(s.to_dict(), s.worst_statement, s.worst_parameters) for s in ranked]
+
+        if explain_top is None:
+            explain_top = config.EXPLAIN_TOP_QUERIES
+        result = []
+        for index, (entry, statement, parameters) in enumerate(samples):
+            if explain_bind is not None and index < explain_top and statement:
+                entry['plan'] = self.explain(explain_bind, statement, parameters)
+            result.append(entry)
+        return result
+
+
+query_stats = QueryStats()
+
+
+def install_query_stats(engine: Engine):
+    """Instrument an engine with the process-wide collector"""
+    query_stats.install(engine)
@@ -0,0 +1,273 @@
+"""
+Set-based data access helpers shared by the dashboard, API and services
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_, func, select
+from sqlalchemy.orm import Session, aliased
+from db import Product, Price, Review, Feature
+from config import config
+
+# ---------------- Keyset pagination ----------------
+def encode_cursor(value, row_id: int) -> str:
+    """Opaque cursor for the last row of a page"""
+    payload = {'id': row_id}
+    if isinstance(value, datetime):
+        payload['dt'] = value.isoformat()
+    else:
+        payload['v'] = value
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[object, int]:
+    """Inverse of encode_cursor"""
+    payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    value = datetime.fromisoformat(payload['dt']) if 'dt' in payload else payload.get('v')
+    return value, payload['id']
+
+def apply_keyset(stmt, sort_column, id_column, cursor: Optional[str] = None,
+                 limit: int = 20, descending: bool = True):
+    """Seek past the cursor on (sort_column, id) instead of using OFFSET
+
+    NULL sort values always come last, in either direction, ordered by id, so
+    a cursor sitting on a NULL (or before the NULL tail) still reaches every row.
+    Works on both ORM queries and select() statements. The caller fetches the
+    result and passes it to build_page, which trims the extra lookahead row.
+    """
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        id_after = id_column < last_id if descending else id_column > last_id
+        if value is None:
+            stmt = stmt.where(and_(sort_column.is_(None), id_after))
+        else:
+            stmt = stmt.where(or_(
+                sort_column < value if descending else sort_column > value,
+                and_(sort_column == value, id_after),
+                sort_column.is_(None)
+            ))
+
+    if descending:
+        stmt = stmt.order_by(sort_column.desc().nulls_last(), id_column.desc())
+    else:
+        stmt = stmt.order_by(sort_column.asc().nulls_last(), id_column.asc())
+
+    # One extra row tells us whether another page exists
+    return stmt.limit(limit + 1)
+
+def build_page(rows: List, limit: int, sort_attr: str, entity_index: Optional[int] = None) -> Dict:
+    """Trim the lookahead row and compute the next cursor"""
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = None
+    if has_more and items:
+        last = items[-1] if entity_index is None else items[-1][entity_index]
+        next_cursor = encode_cursor(getattr(last, sort_attr), last.id)
+    return {'items': items, 'next_cursor': next_cursor}
+
+PRODUCT_SORTS = {
+    'created_at': (Product.created_at, True),
+    'name': (Product.name, False),
+}
+
+REVIEW_SORTS = {
+    'recent': (Review.scraped_at, True),
+    'rating_desc': (Review.rating, True),
+    'rating_asc': (Review.rating, False),
+}
+
+def paginate_products(db: Session, cursor: Optional[str] = None, limit: int = 20,
+                      sort: str = 'created_at', platform: Optional[str] = None,
+                      product_ids: Optional[List[int]] = None) -> Dict:
+    """One page of products, seeking on (created_at, id) or (name, id)"""
+    sort_column, descending = PRODUCT_SORTS[sort]
+    query = db.query(Product)
+    if platform:
+        query = query.filter(Product.platform == platform)
+    if product_ids is not None:
+        query = query.filter(Product.id.in_(product_ids))
+
+    query = apply_keyset(query, sort_column, Product.id, cursor, limit, descending)
+    return build_page(query.all(), limit, sort_column.key)
+
+def paginate_price_history(db: Session, product_id: int, cursor: Optional[str] = None,
+                           limit: int = 90) -> Dict:
+    """One page of a product's prices, newest first, seeking on (scraped_at, id)"""
+    query = db.query(Price).filter(Price.product_id == product_id)
+    query = apply_keyset(query, Price.scraped_at, Price.id, cursor, limit)
+    return build_page(query.all(), limit, 'scraped_at')
+
+def paginate_reviews(db: Session, cursor: Optional[str] = None, limit: int = 10,
+                     sort: str = 'recent', product_id: Optional[int] = None,
+                     sentiment: Optional[str] = None, rating: Optional[int] = None,
+                     review_ids: Optional[List[int]] = None) -> Dict:
+    """One page of (Review, Product) rows, seeking on (scraped_at, id) or (rating, id)"""
+    sort_column, descending = REVIEW_SORTS[sort]
+    query = db.query(Review, Product).join(Product)
+    if product_id is not None:
+        query = query.filter(Review.product_id == product_id)
+    if sentiment:
+        query = query.filter(Review.sentiment == sentiment)
+    if rating is not None:
+        query = query.filter(Review.rating == rating)
+    if review_ids is not None:
+        query = query.filter(Review.id.in_(review_ids))
+
+    query = apply_keyset(query, sort_column, Review.id, cursor, limit, descending)
+    return build_page(query.all(), limit, sort_column.key, entity_index=0)
+
+# ---------------- Batch lookups ----------------
+def products_by_id(db: Session, product_ids: List[int]) -> Dict[int, Product]:
+    """Products keyed by id in one IN-list query"""
+    if not product_ids:
+        return {}
+    return {p.id: p for p in db.query(Product).filter(Product.id.in_(product_ids))}
+
+def latest_prices(db: Session, product_ids: Optional[List[int]] = None) -> Dict[int, Price]:
+    """Latest Price row per product in one windowed query"""
+    if product_ids is not None and not product_ids:
+        return {}
+
+    ranked = db.query(
+        Price.id.label('id'),
+        func.row_number().over(
+            partition_by=Price.product_id,
+            order_by=(Price.scraped_at.desc(), Price.id.desc())
+        ).label('rn')
+    )
+    if product_ids is not None:
+        ranked = ranked.filter(Price.product_id.in_(product_ids))
+    ranked = ranked.subquery()
+
+    rows = db.query(Price).join(ranked, Price.id == ranked.c.id).filter(ranked.c.rn == 1)
+    return {p.product_id: p for p in rows}
+
+def price_series(db: Session, product_ids: List[int], since: Optional[datetime] = None,
+                 limit_per_product: Optional[int] = None) -> Dict[int, List[Price]]:
+    """Price rows per product, newest first, optionally capped per product"""
+    series = {product_id: [] for product_id in product_ids}
+    if not product_ids:
+        return series
+
+    query = db.query(Price).filter(Price.product_id.in_(product_ids))
+    if since is not None:
+        query = query.filter(Price.scraped_at >= since)
+
+    if limit_per_product is not None:
+        ranked = db.query(
+            Price.id.label('id'),
+            func.row_number().over(
+                partition_by=Price.product_id,
+                order_by=(Price.scraped_at.desc(), Price.id.desc())
+            ).label('rn')
+        ).filter(Price.product_id.in_(product_ids))
+        if since is not None:
+            ranked = ranked.filter(Price.scraped_at >= since)
+        ranked = ranked.subquery()
+        query = query.join(ranked, Price.id == ranked.c.id).filter(ranked.c.rn <= limit_per_product)
+
+    for price in query.order_by(Price.product_id, Price.scraped_at.desc(), Price.id.desc()):
+        series[price.product_id].append(price)
+    return series
+
+def features_for(db: Session, product_ids: List[int]) -> Dict[int, Feature]:
+    """Feature row per product in one IN-list query"""
+    if not product_ids:
+        return {}
+    return {f.product_id: f for f in db.query(Feature).filter(Feature.product_id.in_(product_ids))}
+
+# ---------------- As-of snapshots ----------------
+def is_archived(at: datetime) -> bool:
+    """True when `at` is past the retention horizon, so its prices may only exist in the archive"""
+    return at < datetime.utcnow() - timedelta(days=config.RETENTION_DAYS)
+
+def archived_snapshot(at: datetime, product_ids: Optional[List[int]] = None,
+                      platform: Optional[str] = None) -> List[Dict]:
+    """snapshot_as_of answered by the analytics engine over hot + archived prices"""
+    from services.analytics import shared_engine
+    engine = shared_engine()
+    return engine.records(engine.snapshot(at, product_ids, platform))
+
+def archived_snapshot_diff(before: datetime, after: datetime, product_ids: Optional[List[int]] = None,
+                           platform: Optional[str] = None) -> List[Dict]:
+    """snapshot_diff answered by the analytics engine over hot + archived prices"""
+    from services.analytics import shared_engine
+    engine = shared_engine()
+    return annotate_diff(engine.records(engine.snapshot_diff(before, after, product_ids, platform)))
+
+def _price_id_as_of(at: datetime):
+    """Correlated seek for a product's last price at or before `at`
+
+    Walks ix_prices_product_scraped_at_id backwards from (product_id, at), so
+    each product costs one index probe however many price rows exist.
+    """
+    candidate = aliased(Price)
+    return select(candidate.id).where(
+        candidate.product_id == Product.id,
+        candidate.scraped_at <= at
+    ).order_by(
+        candidate.scraped_at.desc(), candidate.id.desc()
+    ).limit(1).correlate(Product).scalar_subquery()
+
+def _filter_products(stmt, product_ids: Optional[List[int]], platform: Optional[str]):
+    if product_ids is not None:
+        stmt = stmt.where(Product.id.in_(product_ids))
+    if platform:
+        stmt = stmt.where(Product.platform == platform)
+    return stmt
+
+def snapshot_statement(at: datetime, product_ids: Optional[List[int]] = None,
+                       platform: Optional[str] = None):
+    """Every product's effective price, discount and stock at `at`, as one statement"""
+    snap = aliased(Price)
+    stmt = select(
+        Product.id.label('product_id'), Product.name, Product.brand, Product.platform,
+        snap.price, snap.discount_price, snap.discount_percentage, snap.in_stock,
+        snap.scraped_at
+    ).join(snap, snap.id == _price_id_as_of(at))
+    return _filter_products(stmt, product_ids, platform).order_by(Product.id)
+
+def snapshot_diff_statement(before: datetime, after: datetime, product_ids: Optional[List[int]] = None,
+                            platform: Optional[str] = None):
+    """Each product's state at two timestamps side by side, as one statement"""
+    old = aliased(Price)
+    new = aliased(Price)
+    stmt = select(
+        Product.id.label('product_id'), Product.name, Product.brand, Product.platform,
+        old.price.label('price_before'), new.price.label('price_after'),
+        old.discount_percentage.label('discount_before'), new.discount_percentage.label('discount_after'),
+        old.in_stock.label('in_stock_before'), new.in_stock.label('in_stock_after')
+    ).select_from(Product).outerjoin(
+        old, old.id == _price_id_as_of(before)
+    ).outerjoin(
+        new, new.id == _price_id_as_of(after)
+    ).where(or_(old.id.isnot(None), new.id.isnot(None)))
+    return _filter_products(stmt, product_ids, platform).order_by(Product.id)
+
+def annotate_diff(rows: List[Dict]) -> List[Dict]:
+    """Add absolute / percentage price change and stock flips to diff rows"""
+    for row in rows:
+        before, after = row['price_before'], row['price_after']
+        row['change'] = after - before if before is not None and after is not None else None
+        row['change_pct'] = (row['change'] / before * 100) if row['change'] is not None and before else None
+        row['stock_changed'] = (
+            row['in_stock_before'] is not None and row['in_stock_after'] is not None
+            and row['in_stock_before'] != row['in_stock_after']
+        )
+    return rows
+
+def snapshot_as_of(db: Session, at: datetime, product_ids: Optional[List[int]] = None,
+                   platform: Optional[str] = None) -> List[Dict]:
+    """Market snapshot at `at`, read from the archive when `at` is past the retention horizon"""
+    if is_archived(at):
+        return archived_snapshot(at, product_ids, platform)
+    return [dict(row._mapping) for row in db.execute(snapshot_statement(at, product_ids, platform))]
+
+def snapshot_diff(db: Session, before: datetime, after: datetime, product_ids: Optional[List[int]] = None,
+                  platform: Optional[str] = None) -> List[Dict]:
+    """Per-product price, discount and stock change between two timestamps"""
+    if is_archived(before):
+        return archived_snapshot_diff(before, after, product_ids, platform)
+    rows = db.execute(snapshot_diff_statement(before, after, product_ids, platform))
+    return annotate_diff([dict(row._mapping) for row in rows])
@@ -1,12 +1,16 @@
 import random
 from datetime import datetime, timedelta
-from db import SessionLocal, Base, engine, Product, Price, Review, Feature, Alert, User
+from db import SessionLocal, Base, engine, Product, Price, Review, Feature, Alert, User, upgrade_schema
 from sqlalchemy import create_engine
 import numpy as np
+from services.spec_normalizer import apply_normalized_specs
+from services.review_dedup import review_fingerprint
+from services.sentiment_aggregates import rebuild
 import hashlib
 
 # Create tables if they don't exist
 Base.metadata.create_all(bind=engine)
+upgrade_schema()
 
 # Sample laptop data with realistic Indian market products
 SAMPLE_LAPTOPS = [
@@ -223,6 +227,7 @@ def seed_database():
                 battery=features_data['battery'],
                 weight=features_data['weight']
             )
+            apply_normalized_specs(features)
             db.add(features)
             
             # Add price history (15 data points)
@@ -263,11 +268,13 @@ def seed_database():
                     sentiment = 'negative'
                     sentiment_score = random.uniform(0.1, 0.3)
                 
+                content = review_template['content'] + f" (Review #{i+1} for {product.brand})"
                 review = Review(
                     product_id=product.id,
                     rating=review_template['rating'],
                     title=review_template['title'],
-                    content=review_template['content'] + f" (Review #{i+1} for {product.brand})",
+                    content=content,
+                    fingerprint=review_fingerprint(review_template['title'], content),
                     sentiment=sentiment,
                     sentiment_score=sentiment_score,
                     review_date=review_date,
@@ -358,6 +365,9 @@ def seed_database():
         # Commit all changes
         db.commit()
         
+        # Seeded reviews carry their sentiment already; recompute the daily totals from them
+        rebuild(db)
+        
         # Print summary
         print("\n✅ Database seeded successfully!")
         print(f"📦 Products: {len(SAMPLE_LAPTOPS)}")
@@ -1,12 +1,18 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
 from datetime import datetime
+from concurrent.futures import Future
 from sqlalchemy.orm import Session
-from db import Product, Price, Review, Feature
+from db import SessionLocal, Product, Price, Review, Feature
+from config import config
 from scrapers.amazon_scraper import AmazonScraper
 from scrapers.flipkart_scraper import FlipkartScraper
-from services.sentiment import SentimentAnalyzer
 from services.alerts import AlertService
+from services.spec_normalizer import apply_normalized_specs
+from services.review_dedup import split_new_reviews
+from repository import features_for
+from services.hot_cache import get_latest_state
+from services.write_buffer import write_buffer
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +22,20 @@ class DataAggregator:
             'amazon': AmazonScraper(),
             'flipkart': FlipkartScraper(),
         }
-        self.sentiment_analyzer = SentimentAnalyzer()
         self.alert_service = AlertService()
     
-    def run_aggregation(self, db: Session):
+    def run_aggregation(self, db: Session) -> Dict:
         """Main aggregation pipeline"""
         products = db.query(Product).all()
+        stats = {'prices_stored': 0, 'reviews_stored': 0, 'duplicate_reviews_skipped': 0,
+                 'alerts_queued': 0, 'write_failures': 0}
+        writes = []  # (stat, Future) pairs resolved once the write buffer has flushed
+        
+        # Previous prices come from the hot cache; feature rows are loaded up front
+        product_ids = [product.id for product in products]
+        latest_state = get_latest_state(db, max_age_seconds=0)
+        existing_features = features_for(db, product_ids)
+        scraped_reviews = {}
         
         for product in products:
             try:
@@ -36,18 +50,25 @@ class DataAggregator:
                 
                 if product_data:
                     # Store price data
-                    self._store_price_data(db, product, product_data)
+                    writes.append(('prices_stored', self._store_price_data(db, product, product_data)))
                     
                     # Store features
-                    self._store_features(db, product, product_data.get('features', {}))
+                    self._store_features(
+                        db, product, product_data.get('features', {}), existing_features.get(product.id)
+                    )
                     
-                    # Scrape and analyze reviews
+                    # Scrape reviews; they are deduplicated in one batch after the loop
                     reviews = scraper.scrape_reviews(product.url)
                     if reviews:
-                        self._store_reviews(db, product, reviews)
+                        scraped_reviews[product.id] = reviews
                     
                     # Check for alerts
-                    self._check_product_alerts(db, product, product_data)
+                    previous = latest_state.get(product.id)
+                    alert = self._check_product_alerts(
+                        db, product, product_data, previous['price'] if previous else None
+                    )
+                    if alert is not None:
+                        writes.append(('alerts_queued', alert))
                     
                 logger.info(f"Successfully scraped product: {product.name}")
                 
@@ -55,7 +76,29 @@ class DataAggregator:
                 logger.error(f"Error scraping product {product.name}: {str(e)}")
                 continue
         
+        # Unseen reviews are stored for the sentiment worker
+        split = split_new_reviews(db, scraped_reviews)
+        stats['duplicate_reviews_skipped'] = split['duplicates']
+        writes.append(('reviews_stored', self._store_reviews(split['new'])))
         db.commit()
+        # Prices, reviews and alerts were queued on the write buffer; wait until they are durable
+        if not write_buffer.flush(timeout=config.WRITE_BUFFER_FLUSH_TIMEOUT_SECONDS):
+            logger.error(f"Write buffer did not flush within {config.WRITE_BUFFER_FLUSH_TIMEOUT_SECONDS}s")
+        for stat, future in writes:
+            if not future.done():
+                stats['write_failures'] += 1
+                continue
+            try:
+                stats[stat] += future.result()
+            except Exception as e:
+                stats['write_failures'] += 1
+                logger.error(f"Buffered write for {stat} failed: {str(e)}")
+        latest_state.refresh(db)
+        logger.info(
+            f"Stored {stats['prices_stored']} prices and {stats['reviews_stored']} new reviews, "
+            f"skipped {stats['duplicate_reviews_skipped']} duplicates, {stats['write_failures']} failed writes"
+        )
+        return stats
     
     def scrape_single_product(self, product_id: int):
         """Scrape a single product"""
@@ -67,39 +110,36 @@ class DataAggregator:
                 if scraper:
                     product_data = scraper.scrape_product(product.url)
                     if product_data:
-                        self._store_price_data(db, product, product_data)
-                        db.commit()
+                        self._store_price_data(db, product, product_data).result()
         except Exception as e:
             logger.error(f"Error scraping single product: {str(e)}")
         finally:
             db.close()
     
-    def _store_price_data(self, db: Session, product: Product, data: Dict):
-        """Store price information"""
-        price = Price(
-            product_id=product.id,
-            price=data.get('price'),
-            discount_price=data.get('discount_price'),
-            discount_percentage=self._calculate_discount_percentage(
+    def _store_price_data(self, db: Session, product: Product, data: Dict) -> Future:
+        """Queue price information on the shared write buffer"""
+        return write_buffer.submit(Price, {
+            'product_id': product.id,
+            'price': data.get('price'),
+            'discount_price': data.get('discount_price'),
+            'discount_percentage': self._calculate_discount_percentage(
                 data.get('price'),
                 data.get('discount_price')
             ),
-            in_stock=data.get('in_stock', True),
-            scraped_at=datetime.utcnow()
-        )
-        db.add(price)
+            'currency': 'INR',
+            'in_stock': data.get('in_stock', True),
+            'scraped_at': datetime.utcnow()
+        })
     
-    def _store_features(self, db: Session, product: Product, features: Dict):
+    def _store_features(self, db: Session, product: Product, features: Dict,
+                        existing_feature: Optional[Feature] = None):
         """Store or update product features"""
-        existing_feature = db.query(Feature).filter(
-            Feature.product_id == product.id
-        ).first()
-        
         if existing_feature:
             # Update existing features
             for key, value in features.items():
                 if hasattr(existing_feature, key):
                     setattr(existing_feature, key, value)
+            apply_normalized_specs(existing_feature)
         else:
             # Create new feature record
             feature = Feature(
@@ -112,27 +152,31 @@ class DataAggregator:
                 battery=features.get('battery'),
                 weight=features.get('weight')
             )
+            apply_normalized_specs(feature)
             db.add(feature)
     
-    def _store_reviews(self, db: Session, product: Product, reviews: List[Dict]):
-        """Store reviews with sentiment analysis"""
-        for review_data in reviews:
-            # Analyze sentiment
-            sentiment_result = self.sentiment_analyzer.analyze_review(
-                review_data.get('content', '')
-            )
-            
-            review = Review(
-                product_id=product.id,
-                rating=review_data.get('rating'),
-                title=review_data.get('title'),
-                content=review_data.get('content'),
-                sentiment=sentiment_result['sentiment'],
-                sentiment_score=sentiment_result['score'],
-                review_date=review_data.get('date', datetime.utcnow()),
-                scraped_at=datetime.utcnow()
-            )
-            db.add(review)
+    def _store_reviews(self, new_reviews: Dict[int, List[Dict]]) -> Future:
+        """Queue a cycle's unseen reviews for insert; sentiment is scored later by services.sentiment_worker
+
+        The Future resolves to the number of reviews actually inserted.
+        """
+        rows = []
+        for product_id, reviews in new_reviews.items():
+            for review_data in reviews:
+                rows.append({
+                    'product_id': product_id,
+                    'rating': review_data.get('rating'),
+                    'title': review_data.get('title'),
+                    'content': review_data.get('content'),
+                    'sentiment_status': 'pending',
+                    'review_date': review_data.get('date', datetime.utcnow()),
+                    'scraped_at': datetime.utcnow(),
+                    'fingerprint': review_data['fingerprint']
+                })
+        
+        # The buffer inserts reviews with on-conflict-do-nothing on (product_id, fingerprint),
+        # which guards against a concurrent writer storing the same review
+        return write_buffer.submit_many(Review, rows)
     
     def _calculate_discount_percentage(self, original_price, discount_price):
         """Calculate discount percentage"""
@@ -140,19 +184,16 @@ class DataAggregator:
             return ((original_price - discount_price) / original_price) * 100
         return 0
     
-    def _check_product_alerts(self, db: Session, product: Product, data: Dict):
-        """Check if any alert conditions are met"""
-        # Price drop alert
-        last_price = db.query(Price).filter(
-            Price.product_id == product.id
-        ).order_by(Price.scraped_at.desc()).first()
-        
+    def _check_product_alerts(self, db: Session, product: Product, data: Dict,
+                              last_price: Optional[float] = None) -> Optional[Future]:
+        """Check if any alert conditions are met; returns the queued alert's Future"""
+        # Price drop alert against the price recorded before this run
         if last_price and data.get('price'):
-            price_change = ((last_price.price - data['price']) / last_price.price) * 100
+            price_change = ((last_price - data['price']) / last_price) * 100
             if price_change > 10:  # More than 10% drop
-                self.alert_service.create_alert(
-                    db,
+                return self.alert_service.queue_alert(
                     alert_type='price_drop',
                     message=f"Price drop alert! {product.name} dropped by {price_change:.1f}%",
                     product_id=product.id
-                )
\ No newline at end of file
+                )
+        return None
\ No newline at end of file
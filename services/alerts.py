@@ -1,7 +1,9 @@
 import os
 from datetime import datetime
+from concurrent.futures import Future
 from sqlalchemy.orm import Session
 from db import Alert, Product, Price
+from services.write_buffer import write_buffer
 import requests
 import json
 import logging
@@ -25,6 +27,16 @@ class AlertService:
         db.commit()
         return alert
     
+    def queue_alert(self, alert_type: str, message: str, product_id: int = None) -> Future:
+        """Queue an alert on the shared write buffer instead of committing it on its own"""
+        return write_buffer.submit(Alert, {
+            'type': alert_type,
+            'message': message,
+            'product_id': product_id,
+            'created_at': datetime.utcnow(),
+            'sent': False
+        })
+    
     def check_and_send_alerts(self, db: Session):
         """Check for unsent alerts and send them"""
         unsent_alerts = db.query(Alert).filter(Alert.sent == False).all()
@@ -0,0 +1,253 @@
+import os
+import glob
+import logging
+import threading
+from datetime import datetime
+from typing import List, Optional
+import duckdb
+import pandas as pd
+from config import config
+
+logger = logging.getLogger(__name__)
+
+PRICE_COLUMNS = "id, product_id, price, discount_price, discount_percentage, currency, in_stock, scraped_at"
+REVIEW_COLUMNS = "id, product_id, rating, title, content, sentiment, sentiment_score, review_date, scraped_at"
+EXTENSIONS = ('sqlite',)
+
+
+def install_extensions():
+    """Download the DuckDB extensions the engine loads; run at build/deploy time, not per request"""
+    con = duckdb.connect(database=':memory:')
+    try:
+        for extension in EXTENSIONS:
+            con.install_extension(extension)
+    finally:
+        con.close()
+
+
+class AnalyticsEngine:
+    """Columnar query layer over the SQLite tables and the Parquet archive"""
+
+    def __init__(self, database_url: str = None, archive_dir: str = None):
+        database_url = database_url or config.DATABASE_URL
+        if not database_url.startswith("sqlite:///"):
+            raise ValueError(f"Analytics engine only supports SQLite databases, got: {database_url}")
+
+        self.sqlite_path = database_url[len("sqlite:///"):]
+        self.archive_dir = archive_dir or config.ARCHIVE_DIR
+        self.con = duckdb.connect(database=':memory:')
+        try:
+            for extension in EXTENSIONS:
+                self.con.load_extension(extension)
+        except duckdb.Error as e:
+            self.con.close()
+            raise RuntimeError(
+                "DuckDB sqlite extension is not installed; run `python -m services.analytics --install-extensions`"
+            ) from e
+        self.con.execute(f"ATTACH '{self.sqlite_path}' AS hot (TYPE SQLITE, READ_ONLY)")
+        self._views_lock = threading.Lock()
+        self._archived = set()  # tables whose view already reads the Parquet archive
+        self._views_created = False
+        self._refresh_views()
+
+    def _refresh_views(self):
+        """Expose hot + archived history as prices_all / reviews_all
+
+        Checked before every query: the engine lives for the whole process, and the
+        retention job may write a table's first archive files long after startup.
+        Once a view includes the archive it stays as is (the glob matches new files).
+        """
+        if len(self._archived) == 2:
+            return
+        with self._views_lock:
+            for table, columns in (('prices', PRICE_COLUMNS), ('reviews', REVIEW_COLUMNS)):
+                if table in self._archived:
+                    continue
+                pattern = os.path.join(self.archive_dir, table, '**', '*.parquet')
+                archived = bool(glob.glob(pattern, recursive=True))
+                if self._views_created and not archived:
+                    continue
+                sql = f"SELECT {columns} FROM hot.{table}"
+                if archived:
+                    sql += (
+                        f" UNION ALL SELECT {columns} FROM read_parquet('{pattern}', hive_partitioning = true)"
+                        f" WHERE id NOT IN (SELECT id FROM hot.{table})"
+                    )
+                    self._archived.add(table)
+                self.con.execute(f"CREATE OR REPLACE VIEW {table}_all AS {sql}")
+            self._views_created = True
+
+    def query(self, sql: str, params: Optional[list] = None) -> pd.DataFrame:
+        """Run a SQL query and return a pandas DataFrame"""
+        self._refresh_views()
+        return self.con.cursor().execute(sql, params or []).df()
+
+    def query_arrow(self, sql: str, params: Optional[list] = None):
+        """Run a SQL query and return a pyarrow Table"""
+        self._refresh_views()
+        return self.con.cursor().execute(sql, params or []).arrow()
+
+    def platform_price_distribution(self) -> pd.DataFrame:
+        """Average, min and max price per platform"""
+        return self.query("""
+            SELECT pr.platform,
+                   avg(p.price) AS avg_price,
+                   min(p.price) AS min_price,
+                   max(p.price) AS max_price,
+                   count(*) AS count,
+                   count(DISTINCT p.product_id) AS products
+            FROM prices_all p
+            JOIN hot.products pr ON pr.id = p.product_id
+            GROUP BY pr.platform
+            ORDER BY pr.platform
+        """)
+
+    def brand_stats(self, brands: Optional[List[str]] = None) -> pd.DataFrame:
+        """Price statistics per brand, plus typical specs from the typed Feature columns"""
+        brand_filter = " WHERE pr.brand IN (SELECT unnest(?))" if brands else ""
+        sql = f"""
+            WITH price_stats AS (
+                SELECT pr.brand,
+                       avg(p.price) AS avg_price,
+                       min(p.price) AS min_price,
+                       max(p.price) AS max_price,
+                       count(DISTINCT p.product_id) AS products
+                FROM prices_all p
+                JOIN hot.products pr ON pr.id = p.product_id
+                {brand_filter}
+                GROUP BY pr.brand
+            ),
+            spec_stats AS (
+                SELECT pr.brand,
+                       avg(f.ram_gb) AS avg_ram_gb,
+                       avg(f.storage_gb) AS avg_storage_gb,
+                       avg(f.cpu_tier) AS avg_cpu_tier,
+                       avg(f.screen_inches) AS avg_screen_inches,
+                       avg(CASE WHEN f.gpu_class IN ('entry', 'mid', 'high') THEN 1.0
+                                WHEN f.gpu_class IS NOT NULL THEN 0.0 END) AS dedicated_gpu_share
+                FROM hot.products pr
+                JOIN hot.features f ON f.product_id = pr.id
+                {brand_filter}
+                GROUP BY pr.brand
+            )
+            SELECT ps.*, ss.avg_ram_gb, ss.avg_storage_gb, ss.avg_cpu_tier,
+                   ss.avg_screen_inches, ss.dedicated_gpu_share
+            FROM price_stats ps
+            LEFT JOIN spec_stats ss ON ss.brand = ps.brand
+            ORDER BY ps.brand
+        """
+        params = [list(brands), list(brands)] if brands else []
+        return self.query(sql, params)
+
+    def sentiment_counts(self) -> pd.DataFrame:
+        """Review count and rating totals per sentiment label"""
+        return self.query("""
+            SELECT sentiment, count(*) AS count, sum(rating) AS rating_sum, count(rating) AS rated
+            FROM reviews_all
+            GROUP BY sentiment
+        """)
+
+    def training_frame(self) -> pd.DataFrame:
+        """Price history joined with product and spec columns for model training"""
+        return self.query("""
+            SELECT p.price, p.scraped_at, p.product_id,
+                   pr.brand, pr.platform, pr.name,
+                   f.ram_gb, f.storage_gb, f.is_ssd, f.cpu_vendor,
+                   f.cpu_tier, f.screen_inches, f.gpu_class
+            FROM prices_all p
+            JOIN hot.products pr ON pr.id = p.product_id
+            LEFT JOIN hot.features f ON f.product_id = p.product_id
+            ORDER BY p.scraped_at, p.id
+        """)
+
+    # ---------------- As-of snapshots over hot + archived prices ----------------
+    @staticmethod
+    def _as_of(alias: str) -> str:
+        """Each product's last price row at or before the bound timestamp"""
+        return f"""
+            {alias} AS (
+                SELECT * FROM prices_all
+                WHERE scraped_at <= ?
+                QUALIFY row_number() OVER (PARTITION BY product_id ORDER BY scraped_at DESC, id DESC) = 1
+            )"""
+
+    @staticmethod
+    def _product_filter(product_ids: Optional[List[int]], platform: Optional[str], params: list) -> str:
+        sql = ""
+        if product_ids is not None:
+            sql += " AND pr.id IN (SELECT unnest(?))"
+            params.append(list(product_ids))
+        if platform:
+            sql += " AND pr.platform = ?"
+            params.append(platform)
+        return sql
+
+    @staticmethod
+    def records(df: pd.DataFrame) -> List[dict]:
+        """Plain dict rows with NaN / NaT as None"""
+        return df.astype(object).where(df.notna(), None).to_dict('records')
+
+    def snapshot(self, at: datetime, product_ids: Optional[List[int]] = None,
+                 platform: Optional[str] = None) -> pd.DataFrame:
+        """Same rows as repository.snapshot_statement, including archived history"""
+        params = [at]
+        sql = f"""
+            WITH {self._as_of('snap')}
+            SELECT pr.id AS product_id, pr.name, pr.brand, pr.platform,
+                   snap.price, snap.discount_price, snap.discount_percentage, snap.in_stock,
+                   snap.scraped_at
+            FROM hot.products pr
+            JOIN snap ON snap.product_id = pr.id
+            WHERE TRUE {self._product_filter(product_ids, platform, params)}
+            ORDER BY pr.id
+        """
+        return self.query(sql, params)
+
+    def snapshot_diff(self, before: datetime, after: datetime, product_ids: Optional[List[int]] = None,
+                      platform: Optional[str] = None) -> pd.DataFrame:
+        """Same rows as repository.snapshot_diff_statement, including archived history"""
+        params = [before, after]
+        sql = f"""
+            WITH {self._as_of('old')}, {self._as_of('new')}
+            SELECT pr.id AS product_id, pr.name, pr.brand, pr.platform,
+                   old.price AS price_before, new.price AS price_after,
+                   old.discount_percentage AS discount_before, new.discount_percentage AS discount_after,
+                   old.in_stock AS in_stock_before, new.in_stock AS in_stock_after
+            FROM hot.products pr
+            LEFT JOIN old ON old.product_id = pr.id
+            LEFT JOIN new ON new.product_id = pr.id
+            WHERE (old.id IS NOT NULL OR new.id IS NOT NULL) {self._product_filter(product_ids, platform, params)}
+            ORDER BY pr.id
+        """
+        return self.query(sql, params)
+
+    def close(self):
+        """Release the DuckDB connection (safe to call more than once)"""
+        if self.con is not None:
+            self.con.close()
+            self.con = None
+
+
+_shared_engine: Optional[AnalyticsEngine] = None
+_shared_lock = threading.Lock()
+
+
+def shared_engine() -> AnalyticsEngine:
+    """Process-wide engine for API and background callers, created on first use"""
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None:
+            _shared_engine = AnalyticsEngine()
+        return _shared_engine
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DuckDB analytics engine")
+    parser.add_argument('--install-extensions', action='store_true', help="Download the DuckDB extensions")
+    args = parser.parse_args()
+
+    if args.install_extensions:
+        install_extensions()
+        print(f"✅ Installed DuckDB extensions: {', '.join(EXTENSIONS)}")
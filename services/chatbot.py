@@ -1,9 +1,15 @@
 from groq import Groq
 import os
-from typing import Dict, List
+import re
+from typing import Dict, List, Optional
+import numpy as np
 import pandas as pd
 from sqlalchemy.orm import Session
-from db import SessionLocal, Product, Price, Review
+from db import SessionLocal, Product, Price
+from repository import products_by_id
+from services.hot_cache import get_latest_state
+from services.sentiment_aggregates import overall_summary
+from services.review_topics import top_topics
 
 class CompetitorChatbot:
     def __init__(self):
@@ -88,12 +94,21 @@ class CompetitorChatbot:
             'price', 'cost', 'cheapest', 'expensive', 'discount',
             'trend', 'compare', 'versus', 'vs', 'between',
             'sentiment', 'review', 'rating', 'best', 'worst',
-            'deal', 'offer', 'promotion', 'stats', 'data'
+            'deal', 'offer', 'promotion', 'stats', 'data', 'budget', 'under'
         ]
         
         message_lower = message.lower()
         return any(keyword in message_lower for keyword in data_keywords)
     
+    def _extract_budget(self, message: str) -> Optional[float]:
+        """Budget amount from phrases like 'under 60,000' or 'budget of 50k'"""
+        match = re.search(r'(?:under|below|within|budget(?: of)?|less than)\s*(?:₹|rs\.?|inr)?\s*([\d,]+)\s*(k)?',
+                          message.lower())
+        if not match:
+            return None
+        amount = float(match.group(1).replace(',', '') or 0)
+        return amount * 1000 if match.group(2) else amount or None
+    
     def _fetch_relevant_data(self, message: str) -> str:
         """Fetch data relevant to the user's query"""
         db = SessionLocal()
@@ -101,32 +116,49 @@ class CompetitorChatbot:
             data_points = []
             
             # Price-related queries
-            if any(word in message.lower() for word in ['price', 'cost', 'cheapest', 'expensive']):
-                # Get latest prices
-                latest_prices = db.query(Price, Product).join(Product).order_by(
-                    Price.scraped_at.desc()
-                ).limit(20).all()
+            if any(word in message.lower() for word in ['price', 'cost', 'cheapest', 'expensive', 'budget', 'under']):
+                latest_state = get_latest_state(db)
+                budget = self._extract_budget(message)
+                if budget:
+                    # Budget questions filter current prices in the hot cache
+                    ids = latest_state.cheapest(20, max_price=budget)
+                    price_summary = f"Laptops currently under ₹{budget:,.0f}:\n"
+                else:
+                    ids = latest_state.filter()
+                    ids = ids[np.argsort(-latest_state.scraped_at[ids], kind='stable')[:20]]
+                    price_summary = "Latest laptop prices:\n"
                 
-                price_summary = "Latest laptop prices:\n"
-                for price, product in latest_prices:
-                    price_summary += f"- {product.name}: ₹{price.price:,.0f}"
-                    if price.discount_price:
-                        price_summary += f" (Discounted: ₹{price.discount_price:,.0f})"
+                rows = latest_state.rows(ids)
+                products = products_by_id(db, [row['product_id'] for row in rows])
+                for row in rows:
+                    product = products.get(row['product_id'])
+                    if product is None:
+                        # Deleted since the cache last saw it
+                        continue
+                    price_summary += f"- {product.name}: ₹{row['price']:,.0f}"
+                    if row['discount_price']:
+                        price_summary += f" (Discounted: ₹{row['discount_price']:,.0f})"
                     price_summary += f" on {product.platform}\n"
                 
                 data_points.append(price_summary)
             
             # Sentiment-related queries
             if any(word in message.lower() for word in ['sentiment', 'review', 'rating', 'customer']):
-                # Get sentiment summary
-                reviews = db.query(Review).limit(50).all()
-                if reviews:
-                    positive = sum(1 for r in reviews if r.sentiment == 'positive')
-                    negative = sum(1 for r in reviews if r.sentiment == 'negative')
-                    avg_rating = sum(r.rating for r in reviews) / len(reviews)
+                # Get sentiment summary from the aggregates
+                summary = overall_summary(db)
+                if summary:
+                    distribution = summary['sentiment_distribution']
+                    positive = distribution['very_positive'] + distribution['positive']
+                    negative = distribution['very_negative'] + distribution['negative']
                     
-                    sentiment_summary = f"Sentiment Analysis: {positive} positive, {negative} negative reviews. Average rating: {avg_rating:.1f}/5"
+                    sentiment_summary = f"Sentiment Analysis: {positive} positive, {negative} negative of {summary['total_reviews']} reviews. Average rating: {summary['average_rating']:.1f}/5"
                     data_points.append(sentiment_summary)
+                
+                topics = top_topics(db, limit=5)
+                if topics:
+                    data_points.append("Most discussed review topics: " + "; ".join(
+                        f"{topic['terms']} ({topic['reviews']} reviews)" for topic in topics
+                    ))
             
             return "\n".join(data_points)
         
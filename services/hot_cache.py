@@ -0,0 +1,214 @@
+import time
+import logging
+import threading
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from db import Price
+from config import config
+from repository import latest_prices
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch_seconds(values) -> np.ndarray:
+    # Timestamps are stored as naive UTC
+    return np.array([int(v.replace(tzinfo=timezone.utc).timestamp()) if v else 0 for v in values], dtype=np.int64)
+
+
+class LatestStateCache:
+    """Latest price, discount and stock per product as NumPy arrays indexed by product id"""
+
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._allocate(capacity)
+        self.last_price_id = 0
+        self.last_refresh = 0.0
+
+    def _allocate(self, capacity: int):
+        self.price = np.full(capacity, np.nan, dtype=np.float32)
+        self.discount_price = np.full(capacity, np.nan, dtype=np.float32)
+        self.discount_pct = np.zeros(capacity, dtype=np.float32)
+        self.in_stock = np.zeros(capacity, dtype=bool)
+        self.scraped_at = np.zeros(capacity, dtype=np.int64)
+        self.present = np.zeros(capacity, dtype=bool)
+
+    def _grow(self, max_id: int):
+        capacity = len(self.present)
+        if max_id < capacity:
+            return
+        new_capacity = max(capacity * 2, max_id + 1)
+        for name in ('price', 'discount_price', 'discount_pct', 'in_stock', 'scraped_at', 'present'):
+            old = getattr(self, name)
+            fill = np.nan if old.dtype == np.float32 and name != 'discount_pct' else 0
+            grown = np.full(new_capacity, fill, dtype=old.dtype)
+            grown[:capacity] = old
+            setattr(self, name, grown)
+
+    # ---------------- Updates ----------------
+    def apply(self, product_ids, prices, discount_prices, discount_pcts, in_stock, scraped_at):
+        """Upsert a batch of observations; the newest observation per product wins"""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if product_ids.size == 0:
+            return
+        scraped_at = np.asarray(scraped_at, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float32)
+        discount_prices = np.asarray(discount_prices, dtype=np.float32)
+        discount_pcts = np.nan_to_num(np.asarray(discount_pcts, dtype=np.float32))
+        in_stock = np.asarray(in_stock, dtype=bool)
+
+        # Keep only the last observation per product (stable sort keeps insert order on ties)
+        order = np.argsort(scraped_at, kind='stable')
+        reversed_ids = product_ids[order][::-1]
+        _, first = np.unique(reversed_ids, return_index=True)
+        keep = order[len(order) - 1 - first]
+
+        with self._lock:
+            self._grow(int(product_ids.max()))
+            ids = product_ids[keep]
+            newer = ~self.present[ids] | (scraped_at[keep] >= self.scraped_at[ids])
+            ids, keep = ids[newer], keep[newer]
+            self.price[ids] = prices[keep]
+            self.discount_price[ids] = discount_prices[keep]
+            self.discount_pct[ids] = discount_pcts[keep]
+            self.in_stock[ids] = in_stock[keep]
+            self.scraped_at[ids] = scraped_at[keep]
+            self.present[ids] = True
+
+    def evict(self, product_ids):
+        """Forget products that were deleted; their rows no longer exist to refresh from"""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        with self._lock:
+            ids = product_ids[(product_ids >= 0) & (product_ids < len(self.present))]
+            self.present[ids] = False
+            self.price[ids] = np.nan
+            self.discount_price[ids] = np.nan
+            self.discount_pct[ids] = 0
+            self.in_stock[ids] = False
+            self.scraped_at[ids] = 0
+
+    def _apply_rows(self, rows):
+        if not rows:
+            return
+        self.apply(
+            [r.product_id for r in rows],
+            [r.price if r.price is not None else np.nan for r in rows],
+            [r.discount_price if r.discount_price is not None else np.nan for r in rows],
+            [r.discount_percentage or 0 for r in rows],
+            [r.in_stock if r.in_stock is not None else True for r in rows],
+            _epoch_seconds([r.scraped_at for r in rows])
+        )
+
+    def refresh(self, db: Session, batch_size: int = 10000) -> int:
+        """Pull price rows inserted since the last refresh; the first call loads latest rows only"""
+        with self._refresh_lock:
+            return self._refresh(db, batch_size)
+
+    def _refresh(self, db: Session, batch_size: int) -> int:
+        applied = 0
+        if self.last_price_id == 0:
+            max_id = db.query(func.max(Price.id)).scalar() or 0
+            rows = list(latest_prices(db).values())
+            self._apply_rows(rows)
+            applied = len(rows)
+            self.last_price_id = max_id
+
+        columns = (Price.id, Price.product_id, Price.price, Price.discount_price,
+                   Price.discount_percentage, Price.in_stock, Price.scraped_at)
+        while True:
+            rows = db.query(*columns).filter(
+                Price.id > self.last_price_id
+            ).order_by(Price.id).limit(batch_size).all()
+            if not rows:
+                break
+            self._apply_rows(rows)
+            applied += len(rows)
+            self.last_price_id = rows[-1].id
+
+        self.last_refresh = time.monotonic()
+        if applied:
+            logger.debug(f"Latest-state cache applied {applied} price rows")
+        return applied
+
+    # ---------------- Reads ----------------
+    def get(self, product_id: int) -> Optional[Dict]:
+        """Current state of one product, or None if it has no price yet"""
+        if product_id >= len(self.present) or not self.present[product_id]:
+            return None
+        return self.rows([product_id])[0]
+
+    def rows(self, product_ids) -> List[Dict]:
+        """Plain dicts for a set of product ids (typically the output of filter/top_discounts)"""
+        result = []
+        for product_id in np.asarray(product_ids, dtype=np.int64):
+            discount_price = float(self.discount_price[product_id])
+            result.append({
+                'product_id': int(product_id),
+                'price': float(self.price[product_id]),
+                'discount_price': None if np.isnan(discount_price) else discount_price,
+                'discount_percentage': float(self.discount_pct[product_id]),
+                'in_stock': bool(self.in_stock[product_id]),
+                'scraped_at': datetime.fromtimestamp(int(self.scraped_at[product_id]), timezone.utc).replace(tzinfo=None)
+            })
+        return result
+
+    def mask(self, max_price: Optional[float] = None, min_price: Optional[float] = None,
+             min_discount: Optional[float] = None, in_stock: Optional[bool] = None) -> np.ndarray:
+        """Boolean mask over product ids; NaN prices never match price bounds"""
+        mask = self.present.copy()
+        if max_price is not None:
+            mask &= self.price <= max_price
+        if min_price is not None:
+            mask &= self.price >= min_price
+        if min_discount is not None:
+            mask &= self.discount_pct > min_discount
+        if in_stock is not None:
+            mask &= self.in_stock == in_stock
+        return mask
+
+    def filter(self, **conditions) -> np.ndarray:
+        """Product ids matching the conditions accepted by mask()"""
+        return np.flatnonzero(self.mask(**conditions))
+
+    def top_discounts(self, limit: int = 5, min_discount: float = 0.0) -> np.ndarray:
+        """Product ids with the deepest current discounts, best first"""
+        ids = self.filter(min_discount=min_discount)
+        if ids.size > limit:
+            ids = ids[np.argpartition(-self.discount_pct[ids], limit - 1)[:limit]]
+        return ids[np.argsort(-self.discount_pct[ids], kind='stable')]
+
+    def cheapest(self, limit: int = 5, max_price: Optional[float] = None) -> np.ndarray:
+        """Product ids with the lowest current price, cheapest first"""
+        ids = self.filter(max_price=max_price) if max_price is not None else self.filter()
+        ids = ids[~np.isnan(self.price[ids])]
+        if ids.size > limit:
+            ids = ids[np.argpartition(self.price[ids], limit - 1)[:limit]]
+        return ids[np.argsort(self.price[ids], kind='stable')]
+
+    def memory_report(self) -> Dict:
+        """Array footprint overall and per tracked product"""
+        arrays = (self.price, self.discount_price, self.discount_pct, self.in_stock, self.scraped_at, self.present)
+        total = sum(a.nbytes for a in arrays)
+        populated = int(self.present.sum())
+        return {
+            'capacity': len(self.present),
+            'products': populated,
+            'bytes_total': total,
+            'bytes_per_slot': sum(a.itemsize for a in arrays),
+            'bytes_per_product': round(total / populated, 1) if populated else None
+        }
+
+
+latest_state = LatestStateCache()
+
+
+def get_latest_state(db: Session, max_age_seconds: Optional[float] = None) -> LatestStateCache:
+    """Process-wide cache, refreshed from new price rows when older than max_age_seconds"""
+    if max_age_seconds is None:
+        max_age_seconds = config.HOT_CACHE_MAX_AGE_SECONDS
+    if latest_state.last_price_id == 0 or time.monotonic() - latest_state.last_refresh >= max_age_seconds:
+        latest_state.refresh(db)
+    return latest_state
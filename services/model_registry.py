@@ -0,0 +1,108 @@
+import os
+import time
+import logging
+import resource
+import threading
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def resident_memory_mb() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / 1e6, 1)
+    except (OSError, ValueError):
+        # Peak RSS (KB on Linux, bytes on macOS) where /proc is unavailable
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 1)
+
+
+def process_uptime_seconds() -> Optional[float]:
+    """Seconds since this process was started by the OS, None where /proc is unavailable"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the parenthesised command name; starttime is field 22 overall
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return round(uptime - start_ticks / os.sysconf('SC_CLK_TCK'), 2)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ModelRegistry:
+    """Process-wide models, built on first use and shared by every service"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable] = {}
+        self._instances: Dict[str, object] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._loads: Dict[str, Dict] = {}
+        self.created_at = time.perf_counter()
+        self.baseline_rss_mb = resident_memory_mb()
+
+    def register(self, name: str, factory: Callable):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def get(self, name: str):
+        """The shared instance, building it (once, even under concurrent callers) if needed"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._locks[name]:
+            if name not in self._instances:
+                rss_before = resident_memory_mb()
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._loads[name] = {
+                    'load_seconds': round(time.perf_counter() - started, 2),
+                    'rss_before_mb': rss_before,
+                    'rss_after_mb': resident_memory_mb(),
+                    'thread': threading.current_thread().name
+                }
+                logger.info(f"Loaded model '{name}' in {self._loads[name]['load_seconds']}s")
+        return self._instances[name]
+
+    def warmup(self, names: Optional[List[str]] = None) -> threading.Thread:
+        """Load models on a background thread so the first request doesn't pay for it"""
+        def run():
+            for name in names or list(self._factories):
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logger.error(f"Warmup of model '{name}' failed: {str(e)}")
+
+        thread = threading.Thread(target=run, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def report(self) -> Dict:
+        return {
+            'baseline_rss_mb': self.baseline_rss_mb,
+            'current_rss_mb': resident_memory_mb(),
+            'models': {
+                name: {'loaded': self.is_loaded(name), **self._loads.get(name, {})}
+                for name in self._factories
+            }
+        }
+
+
+def _sentiment_analyzer():
+    from services.sentiment import SentimentAnalyzer
+    return SentimentAnalyzer()
+
+
+def _price_predictor():
+    from services.predictor import PricePredictor
+    return PricePredictor()
+
+
+registry = ModelRegistry()
+registry.register('sentiment', _sentiment_analyzer)
+registry.register('price_predictor', _price_predictor)
@@ -6,13 +6,23 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import mean_absolute_error, r2_score
 from datetime import datetime, timedelta
 import joblib
+import json
 import os
 from typing import Dict, List, Tuple, Optional
 from db import SessionLocal, Product, Price, Feature
 from sqlalchemy import func
+from services.analytics import shared_engine
+from repository import products_by_id, features_for
+from services.price_series import load_series
 import warnings
 warnings.filterwarnings('ignore')
 
+# Bump whenever prepare_features changes meaning, so models saved by an older
+# version are retrained instead of being fed shifted inputs.
+# 2: typed spec columns (total storage across drives, cpu tier, screen, gpu class)
+FEATURE_VERSION = 2
+GPU_CLASS_LEVELS = {'integrated': 0, 'entry': 1, 'mid': 2, 'high': 3}
+
 class PricePredictor:
     def __init__(self):
         self.model = None
@@ -22,6 +32,7 @@ class PricePredictor:
         self.model_path = 'models/price_predictor.pkl'
         self.scaler_path = 'models/price_scaler.pkl'
         self.encoders_path = 'models/label_encoders.pkl'
+        self.version_path = 'models/price_features.json'
         
         # Create models directory if not exists
         os.makedirs('models', exist_ok=True)
@@ -60,26 +71,45 @@ class PricePredictor:
         if 'platform' in data.columns:
             features['platform_encoded'] = self._encode_categorical(data['platform'], 'platform')
         
-        # Specifications-based features
-        if 'ram' in data.columns and data['ram'].notna().any():
-            features['ram_gb'] = data['ram'].fillna('8GB').str.extract('(\d+)').astype(float).fillna(8)
+        # Specifications-based features (typed columns filled by the spec normalizer)
+        if 'ram_gb' in data.columns:
+            features['ram_gb'] = pd.to_numeric(data['ram_gb'], errors='coerce').fillna(8)
         else:
             features['ram_gb'] = 8
         
-        if 'storage' in data.columns and data['storage'].notna().any():
-            features['storage_gb'] = data['storage'].fillna('512GB').str.extract('(\d+)').astype(float).fillna(512)
-            features['is_ssd'] = data['storage'].fillna('SSD').str.contains('SSD', case=False).astype(int)
+        if 'storage_gb' in data.columns:
+            features['storage_gb'] = pd.to_numeric(data['storage_gb'], errors='coerce').fillna(512)
         else:
             features['storage_gb'] = 512
+        
+        if 'is_ssd' in data.columns:
+            features['is_ssd'] = data['is_ssd'].fillna(True).astype(int)
+        else:
             features['is_ssd'] = 1
         
-        if 'processor' in data.columns and data['processor'].notna().any():
-            features['is_intel'] = data['processor'].fillna('Intel').str.contains('Intel|i3|i5|i7|i9', case=False).astype(int)
-            features['is_amd'] = data['processor'].fillna('').str.contains('AMD|Ryzen', case=False).astype(int)
+        if 'cpu_vendor' in data.columns:
+            cpu_vendor = data['cpu_vendor'].fillna('intel')
+            features['is_intel'] = (cpu_vendor == 'intel').astype(int)
+            features['is_amd'] = (cpu_vendor == 'amd').astype(int)
         else:
             features['is_intel'] = 1
             features['is_amd'] = 0
         
+        if 'cpu_tier' in data.columns:
+            features['cpu_tier'] = pd.to_numeric(data['cpu_tier'], errors='coerce').fillna(5)
+        else:
+            features['cpu_tier'] = 5
+        
+        if 'screen_inches' in data.columns:
+            features['screen_inches'] = pd.to_numeric(data['screen_inches'], errors='coerce').fillna(15.6)
+        else:
+            features['screen_inches'] = 15.6
+        
+        if 'gpu_class' in data.columns:
+            features['gpu_level'] = data['gpu_class'].map(GPU_CLASS_LEVELS).fillna(0)
+        else:
+            features['gpu_level'] = 0
+        
         # Price history features - only if we have historical data
         if 'price' in data.columns and 'product_id' in data.columns and len(data) > 1:
             # Sort by date for proper shift operations
@@ -124,47 +154,13 @@ class PricePredictor:
         if self.is_trained and not force_retrain:
             return {"status": "Model already trained", "metrics": {}}
         
-        db = SessionLocal()
         try:
-            # Fixed query with explicit joins
-            # First, get all price data with product info
-            price_product_data = db.query(
-                Price.price,
-                Price.scraped_at,
-                Price.product_id,
-                Product.brand,
-                Product.platform,
-                Product.name
-            ).select_from(Price).join(
-                Product, Price.product_id == Product.id
-            ).all()
-            
-            if len(price_product_data) < 100:
-                return {"status": "Insufficient data for training", "data_points": len(price_product_data)}
+            # Price history (hot database + Parquet archive) joined with product
+            # and spec columns in one vectorized query
+            df = shared_engine().training_frame()
             
-            # Convert to DataFrame
-            df = pd.DataFrame([{
-                'price': row.price,
-                'scraped_at': row.scraped_at,
-                'product_id': row.product_id,
-                'brand': row.brand,
-                'platform': row.platform,
-                'name': row.name
-            } for row in price_product_data])
-            
-            # Get feature data separately to avoid join issues
-            features_data = db.query(Feature).all()
-            features_df = pd.DataFrame([{
-                'product_id': f.product_id,
-                'ram': f.ram,
-                'storage': f.storage,
-                'processor': f.processor,
-                'graphics': f.graphics
-            } for f in features_data])
-            
-            # Merge features if available
-            if not features_df.empty:
-                df = df.merge(features_df, on='product_id', how='left')
+            if len(df) < 100:
+                return {"status": "Insufficient data for training", "data_points": len(df)}
             
             # Prepare features
             X = self.prepare_features(df)
@@ -222,8 +218,6 @@ class PricePredictor:
             
         except Exception as e:
             return {"status": "Training failed", "error": str(e)}
-        finally:
-            db.close()
     
     def predict_price(self, product_id: int, days_ahead: int = 7) -> Dict:
         """Predict future prices for a product"""
@@ -240,110 +234,116 @@ class PricePredictor:
             if not product:
                 return {"error": "Product not found"}
             
-            # Get recent prices
-            recent_prices = db.query(Price).filter(
-                Price.product_id == product_id
-            ).order_by(Price.scraped_at.desc()).limit(30).all()
-            
-            if not recent_prices:
-                return {"error": "No price history available"}
+            # Get recent prices from the compact series in one read
+            recent_prices = load_series(db, [product_id])[product_id]['price'][::-1][:30]
             
             # Get product features
             features = db.query(Feature).filter(Feature.product_id == product_id).first()
             
-            predictions = []
-            current_price = recent_prices[0].price
+            return self._predict_from_history(product, recent_prices, features, days_ahead)
             
-            # Calculate historical statistics for better predictions
-            historical_prices = [p.price for p in recent_prices]
-            price_mean = np.mean(historical_prices)
-            price_std = np.std(historical_prices)
+        except Exception as e:
+            return {"error": f"Prediction failed: {str(e)}"}
+        finally:
+            db.close()
+    
+    def _predict_from_history(self, product: Product, recent_prices: np.ndarray,
+                              features: Optional[Feature], days_ahead: int) -> Dict:
+        """Forecast from already-loaded data; recent_prices is newest first"""
+        if len(recent_prices) == 0:
+            return {"error": "No price history available"}
+        
+        predictions = []
+        current_price = float(recent_prices[0])
+        
+        # Calculate historical statistics for better predictions
+        historical_prices = recent_prices
+        price_mean = np.mean(historical_prices)
+        price_std = np.std(historical_prices)
+        
+        # Predict for each future day
+        for day in range(1, days_ahead + 1):
+            future_date = datetime.now() + timedelta(days=day)
             
-            # Predict for each future day
-            for day in range(1, days_ahead + 1):
-                future_date = datetime.now() + timedelta(days=day)
-                
-                # Create prediction data
-                pred_data = pd.DataFrame([{
-                    'product_id': product_id,
-                    'brand': product.brand,
-                    'platform': product.platform,
-                    'name': product.name,
-                    'price': current_price,  # Use current price as reference
-                    'scraped_at': future_date,
-                    'ram': features.ram if features else None,
-                    'storage': features.storage if features else None,
-                    'processor': features.processor if features else None,
-                    'graphics': features.graphics if features else None
-                }])
-                
-                # Prepare features
-                try:
-                    X_pred = self.prepare_features(pred_data)
-                    X_pred_scaled = self.scaler.transform(X_pred)
-                    
-                    # Make prediction
-                    predicted_price = self.model.predict(X_pred_scaled)[0]
-                    
-                    # Ensure predicted price is reasonable
-                    predicted_price = max(predicted_price, price_mean * 0.5)  # Not less than 50% of mean
-                    predicted_price = min(predicted_price, price_mean * 1.5)  # Not more than 150% of mean
-                    
-                except Exception as e:
-                    # Fallback to simple prediction if feature preparation fails
-                    # Use historical trend
-                    trend = (historical_prices[0] - historical_prices[-1]) / len(historical_prices)
-                    random_factor = np.random.normal(1.0, 0.02)  # 2% random variation
-                    predicted_price = current_price + (trend * day) * random_factor
+            # Create prediction data
+            pred_data = pd.DataFrame([{
+                'product_id': product.id,
+                'brand': product.brand,
+                'platform': product.platform,
+                'name': product.name,
+                'price': current_price,  # Use current price as reference
+                'scraped_at': future_date,
+                'ram_gb': features.ram_gb if features else None,
+                'storage_gb': features.storage_gb if features else None,
+                'is_ssd': features.is_ssd if features else None,
+                'cpu_vendor': features.cpu_vendor if features else None,
+                'cpu_tier': features.cpu_tier if features else None,
+                'screen_inches': features.screen_inches if features else None,
+                'gpu_class': features.gpu_class if features else None
+            }])
+            
+            # Prepare features
+            try:
+                X_pred = self.prepare_features(pred_data)
+                X_pred_scaled = self.scaler.transform(X_pred)
                 
-                # Calculate confidence interval based on historical volatility
-                confidence_factor = 1 + (day * 0.02)  # Increase uncertainty over time
+                # Make prediction
+                predicted_price = self.model.predict(X_pred_scaled)[0]
                 
-                predictions.append({
-                    'date': future_date.strftime('%Y-%m-%d'),
-                    'predicted_price': float(predicted_price),
-                    'lower_bound': float(predicted_price - (price_std * confidence_factor)),
-                    'upper_bound': float(predicted_price + (price_std * confidence_factor)),
-                    'confidence': max(0.95 - (day * 0.05), 0.5)
-                })
+                # Ensure predicted price is reasonable
+                predicted_price = max(predicted_price, price_mean * 0.5)  # Not less than 50% of mean
+                predicted_price = min(predicted_price, price_mean * 1.5)  # Not more than 150% of mean
                 
-                # Update current price for next prediction
-                current_price = predicted_price
-            
-            # Calculate insights
-            week_ahead_price = predictions[-1]['predicted_price']
-            price_change = week_ahead_price - recent_prices[0].price
-            price_change_pct = (price_change / recent_prices[0].price) * 100
+            except Exception as e:
+                # Fallback to simple prediction if feature preparation fails
+                # Use historical trend
+                trend = (historical_prices[0] - historical_prices[-1]) / len(historical_prices)
+                random_factor = np.random.normal(1.0, 0.02)  # 2% random variation
+                predicted_price = current_price + (trend * day) * random_factor
             
-            # Determine recommendation
-            if price_change_pct < -5:
-                recommendation = "WAIT"
-                reason = f"Price expected to drop by {abs(price_change_pct):.1f}%"
-            elif price_change_pct > 5:
-                recommendation = "BUY"
-                reason = f"Price expected to increase by {price_change_pct:.1f}%"
-            else:
-                recommendation = "HOLD"
-                reason = "Price expected to remain stable"
+            # Calculate confidence interval based on historical volatility
+            confidence_factor = 1 + (day * 0.02)  # Increase uncertainty over time
             
-            return {
-                "product": product.name,
-                "current_price": float(recent_prices[0].price),
-                "predictions": predictions,
-                "summary": {
-                    "week_ahead_price": float(week_ahead_price),
-                    "expected_change": float(price_change),
-                    "expected_change_pct": float(price_change_pct),
-                    "recommendation": recommendation,
-                    "reason": reason
-                },
-                "model_confidence": 0.85
-            }
+            predictions.append({
+                'date': future_date.strftime('%Y-%m-%d'),
+                'predicted_price': float(predicted_price),
+                'lower_bound': float(predicted_price - (price_std * confidence_factor)),
+                'upper_bound': float(predicted_price + (price_std * confidence_factor)),
+                'confidence': max(0.95 - (day * 0.05), 0.5)
+            })
             
-        except Exception as e:
-            return {"error": f"Prediction failed: {str(e)}"}
-        finally:
-            db.close()
+            # Update current price for next prediction
+            current_price = predicted_price
+        
+        # Calculate insights
+        week_ahead_price = predictions[-1]['predicted_price']
+        price_change = week_ahead_price - recent_prices[0]
+        price_change_pct = (price_change / recent_prices[0]) * 100
+        
+        # Determine recommendation
+        if price_change_pct < -5:
+            recommendation = "WAIT"
+            reason = f"Price expected to drop by {abs(price_change_pct):.1f}%"
+        elif price_change_pct > 5:
+            recommendation = "BUY"
+            reason = f"Price expected to increase by {price_change_pct:.1f}%"
+        else:
+            recommendation = "HOLD"
+            reason = "Price expected to remain stable"
+        
+        return {
+            "product": product.name,
+            "current_price": float(recent_prices[0]),
+            "predictions": predictions,
+            "summary": {
+                "week_ahead_price": float(week_ahead_price),
+                "expected_change": float(price_change),
+                "expected_change_pct": float(price_change_pct),
+                "recommendation": recommendation,
+                "reason": reason
+            },
+            "model_confidence": 0.85
+        }
     
     def predict_best_time_to_buy(self, product_id: int, target_days: int = 30) -> Dict:
         """Predict the best time to buy within a given timeframe"""
@@ -381,10 +381,33 @@ class PricePredictor:
     
     def batch_predict(self, product_ids: List[int], days_ahead: int = 7) -> Dict[int, Dict]:
         """Predict prices for multiple products"""
-        results = {}
+        if not self.is_trained:
+            train_result = self.train()
+            if train_result["status"] != "Training successful":
+                return {product_id: {"error": "Model not trained", "details": train_result}
+                        for product_id in product_ids}
         
+        db = SessionLocal()
+        try:
+            # Set-based reads for the whole batch instead of several queries per product
+            products = products_by_id(db, product_ids)
+            series = load_series(db, product_ids)
+            features = features_for(db, product_ids)
+        finally:
+            db.close()
+        
+        results = {}
         for product_id in product_ids:
-            results[product_id] = self.predict_price(product_id, days_ahead)
+            product = products.get(product_id)
+            if not product:
+                results[product_id] = {"error": "Product not found"}
+                continue
+            try:
+                results[product_id] = self._predict_from_history(
+                    product, series[product_id]['price'][::-1][:30], features.get(product_id), days_ahead
+                )
+            except Exception as e:
+                results[product_id] = {"error": f"Prediction failed: {str(e)}"}
         
         return results
     
@@ -394,11 +417,25 @@ class PricePredictor:
             joblib.dump(self.model, self.model_path)
             joblib.dump(self.scaler, self.scaler_path)
             joblib.dump(self.label_encoders, self.encoders_path)
+            with open(self.version_path, 'w') as f:
+                json.dump({'feature_version': FEATURE_VERSION}, f)
+    
+    def saved_feature_version(self) -> int:
+        """Feature version the saved model was trained with (1 for models predating the marker)"""
+        if not os.path.exists(self.version_path):
+            return 1
+        with open(self.version_path) as f:
+            return json.load(f).get('feature_version', 1)
     
     def load_model(self):
         """Load saved model and preprocessors"""
         try:
-            if os.path.exists(self.model_path):
+            if os.path.exists(self.model_path) and self.saved_feature_version() != FEATURE_VERSION:
+                # Trained on the old feature set; predict_price retrains on first use
+                print(f"Saved price model uses feature version {self.saved_feature_version()}, "
+                      f"expected {FEATURE_VERSION}; it will be retrained")
+                self.is_trained = False
+            elif os.path.exists(self.model_path):
                 self.model = joblib.load(self.model_path)
                 self.scaler = joblib.load(self.scaler_path)
                 self.label_encoders = joblib.load(self.encoders_path)
@@ -0,0 +1,277 @@
+import os
+import json
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from db import SessionLocal, Price
+from config import config
+from services.retention import load_price_history, PRICE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('close', 'min_discount', 'in_stock')
+DAY_CHUNK = 64  # grow the day axis in chunks so daily updates rarely reallocate
+
+
+class PriceCube:
+    """Dense float32 product x day matrices (close price, min discount, in-stock) on memory-mapped .npy files
+
+    Row i is product id i, column j is start_date + j days. Missing cells are NaN.
+    Columns past meta['last_day'] are pre-allocated for future days and never read.
+    Readers get views into the mapped files; only the scheduler process writes.
+    """
+
+    def __init__(self, cube_dir: str = None):
+        self.cube_dir = cube_dir or config.CUBE_DIR
+        self.meta: Optional[Dict] = None
+        self.arrays: Dict[str, np.memmap] = {}
+        self._meta_mtime = None
+        self._mode = None
+
+    # ---------------- Files ----------------
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cube_dir, f"{name}.npy")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.cube_dir, 'meta.json')
+
+    def _save_meta(self):
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._meta_path)
+        self._meta_mtime = os.path.getmtime(self._meta_path)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._meta_path)
+
+    def open(self, mode: str = 'r') -> bool:
+        """Map the cube files; returns False if the cube has not been built yet"""
+        if not self.exists():
+            return False
+        with open(self._meta_path) as f:
+            self.meta = json.load(f)
+        self._meta_mtime = os.path.getmtime(self._meta_path)
+        self._mode = mode
+        self.arrays = {name: np.load(self._path(name), mmap_mode=mode) for name in FIELDS}
+        return True
+
+    def _ensure_open(self):
+        """(Re)map when the writer has reallocated the files since we last looked"""
+        if not self.exists():
+            raise FileNotFoundError(f"Price cube not built in {self.cube_dir}; run `python -m services.price_cube --rebuild`")
+        if self.meta is None or os.path.getmtime(self._meta_path) != self._meta_mtime:
+            self.open(self._mode or 'r')
+
+    def _allocate(self, products: int, days: int, start: date, keep_existing: bool):
+        """Create (or grow) the files; new cells start as NaN"""
+        os.makedirs(self.cube_dir, exist_ok=True)
+        old = self.arrays if keep_existing else {}
+        offset = 0
+        if keep_existing and self.meta:
+            offset = (date.fromisoformat(self.meta['start_date']) - start).days
+
+        for name in FIELDS:
+            tmp_path = self._path(name) + '.tmp'
+            array = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(products, days))
+            array[:] = np.nan
+            if name in old:
+                rows, cols = old[name].shape
+                array[:rows, offset:offset + cols] = old[name]
+            array.flush()
+            del array
+            os.replace(tmp_path, self._path(name))
+
+        self.meta = {
+            'start_date': start.isoformat(),
+            'products': products,
+            'days': days,
+            'last_day': self._last_day() + offset if keep_existing and self.meta else -1,
+            'last_price_id': (self.meta or {}).get('last_price_id', 0) if keep_existing else 0,
+            'updated_at': datetime.utcnow().isoformat()
+        }
+        self._save_meta()
+        self.open('r+')
+
+    # ---------------- Writes ----------------
+    def _apply_frame(self, df: pd.DataFrame):
+        """Fold price rows into the cube: last price of the day, lowest discount, any stock"""
+        if df.empty:
+            return
+        df = df.sort_values(['scraped_at', 'id'])
+        days = pd.to_datetime(df['scraped_at']).dt.normalize()
+        start = pd.Timestamp(self.meta['start_date'])
+        frame = pd.DataFrame({
+            'product_id': df['product_id'].astype(np.int64).values,
+            'day': ((days - start).dt.days).astype(np.int64).values,
+            'price': df['price'].astype(np.float32).values,
+            'discount': df['discount_percentage'].fillna(0).astype(np.float32).values,
+            'in_stock': df['in_stock'].fillna(True).astype(np.float32).values
+        })
+        grouped = frame.groupby(['product_id', 'day'], sort=False).agg(
+            close=('price', 'last'), min_discount=('discount', 'min'), in_stock=('in_stock', 'max')
+        )
+        rows = grouped.index.get_level_values(0).values
+        cols = grouped.index.get_level_values(1).values
+
+        close = self.arrays['close']
+        close[rows, cols] = grouped['close'].values
+        discount = self.arrays['min_discount']
+        discount[rows, cols] = np.fmin(discount[rows, cols], grouped['min_discount'].values)
+        stock = self.arrays['in_stock']
+        stock[rows, cols] = np.fmax(stock[rows, cols], grouped['in_stock'].values)
+        self.meta['last_day'] = max(self._last_day(), int(cols.max()))
+
+    def _flush(self, last_price_id: int):
+        for array in self.arrays.values():
+            array.flush()
+        self.meta['last_price_id'] = int(last_price_id)
+        self.meta['updated_at'] = datetime.utcnow().isoformat()
+        self._save_meta()
+
+    def rebuild(self, db: Session) -> Dict:
+        """Build the cube from the full price history, including the Parquet archive"""
+        history = load_price_history(db)
+        last_price_id = db.query(func.max(Price.id)).scalar() or 0
+        if history.empty:
+            return {'products': 0, 'days': 0}
+
+        start = history['scraped_at'].min().date()
+        days = (history['scraped_at'].max().date() - start).days + 1
+        products = int(history['product_id'].max()) + 1
+        self._allocate(products, days + DAY_CHUNK, start, keep_existing=False)
+        self._apply_frame(history)
+        self._flush(last_price_id)
+
+        logger.info(f"Built price cube: {products} products x {days} days from {len(history)} rows")
+        return {'products': products, 'days': days, 'rows': len(history)}
+
+    def update(self, db: Session) -> Dict:
+        """Fold in price rows inserted since the last build or update"""
+        if not self.exists():
+            return self.rebuild(db)
+        self.open('r+')
+
+        columns = [getattr(Price, c) for c in PRICE_COLUMNS]
+        rows = db.query(*columns).filter(Price.id > self.meta['last_price_id']).order_by(Price.id).all()
+        if not rows:
+            return {'rows': 0}
+        df = pd.DataFrame(rows, columns=PRICE_COLUMNS)
+        df['scraped_at'] = pd.to_datetime(df['scraped_at'])
+
+        start = date.fromisoformat(self.meta['start_date'])
+        first_day = df['scraped_at'].min().date()
+        last_day = df['scraped_at'].max().date()
+        products = max(self.meta['products'], int(df['product_id'].max()) + 1)
+        new_start = min(start, first_day)
+        needed_days = (last_day - new_start).days + 1
+        grow_products = products > self.meta['products']
+        if grow_products or needed_days > self.meta['days'] or new_start < start:
+            self._allocate(
+                max(products, self.meta['products'] * 2) if grow_products else products,
+                max(needed_days + DAY_CHUNK, self.meta['days'] + (start - new_start).days),
+                new_start,
+                keep_existing=True
+            )
+
+        self._apply_frame(df)
+        self._flush(df['id'].max())
+        logger.info(f"Folded {len(df)} price rows into the price cube")
+        return {'rows': len(df)}
+
+    # ---------------- Reads ----------------
+    def _last_day(self) -> int:
+        """Index of the newest day holding data (-1 for an empty cube)"""
+        if 'last_day' not in self.meta:
+            # Cubes built before last_day was tracked: find the last column with any price
+            filled = np.flatnonzero(~np.isnan(self.arrays['close']).all(axis=0))
+            self.meta['last_day'] = int(filled[-1]) if filled.size else -1
+        return self.meta['last_day']
+
+    @property
+    def start_date(self) -> date:
+        self._ensure_open()
+        return date.fromisoformat(self.meta['start_date'])
+
+    def day_index(self, day) -> int:
+        """Column index for a date (clamped to the days holding data)"""
+        if isinstance(day, datetime):
+            day = day.date()
+        index = (day - self.start_date).days
+        return min(max(index, 0), max(self._last_day(), 0))
+
+    def _day_range(self, start=None, end=None):
+        self._ensure_open()
+        first = self.day_index(start) if start else 0
+        last = self.day_index(end) + 1 if end else self._last_day() + 1
+        return first, max(last, first)
+
+    def dates(self, start=None, end=None) -> pd.DatetimeIndex:
+        first, last = self._day_range(start, end)
+        return pd.date_range(self.start_date + timedelta(days=first), periods=last - first, freq='D')
+
+    def slice(self, field: str = 'close', product_ids: Optional[List[int]] = None,
+              start=None, end=None) -> np.ndarray:
+        """Product x day block; a view into the mapped file unless product_ids selects rows"""
+        self._ensure_open()
+        array = self.arrays[field]
+        first, last = self._day_range(start, end)
+        block = array[:, first:last]
+        if product_ids is None:
+            return block
+
+        # Fancy indexing copies, but only the requested rows; products added since
+        # the last update have no row yet and come back as NaN
+        ids = np.asarray(product_ids, dtype=np.int64)
+        known = ids < block.shape[0]
+        if known.all():
+            return block[ids]
+        rows = np.full((len(ids), block.shape[1]), np.nan, dtype=np.float32)
+        rows[known] = block[ids[known]]
+        return rows
+
+    def frame(self, field: str = 'close', product_ids: Optional[List[int]] = None,
+              start=None, end=None) -> pd.DataFrame:
+        """Dates x products DataFrame for charting"""
+        block = self.slice(field, product_ids, start, end)
+        ids = product_ids if product_ids is not None else range(block.shape[0])
+        return pd.DataFrame(block.T, index=self.dates(start, end)[:block.shape[1]], columns=list(ids))
+
+    def correlation(self, product_ids: List[int], start=None, end=None, min_overlap: int = 5) -> pd.DataFrame:
+        """Pairwise correlation of daily close-price returns, using days both products were seen"""
+        returns = self.frame('close', product_ids, start, end).ffill().pct_change()
+        return returns.corr(min_periods=min_overlap)
+
+    def memory_report(self) -> Dict:
+        self._ensure_open()
+        return {
+            'products': self.meta['products'],
+            'days': self.meta['days'],
+            'days_filled': self._last_day() + 1,
+            'start_date': self.meta['start_date'],
+            'bytes_on_disk': sum(a.nbytes for a in self.arrays.values()),
+            'last_price_id': self.meta['last_price_id']
+        }
+
+
+price_cube = PriceCube()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build or update the product x day price cube")
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild from the full history")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = price_cube.rebuild(db) if args.rebuild else price_cube.update(db)
+        print(f"✅ Price cube updated: {result}")
+    finally:
+        db.close()
@@ -1,9 +1,12 @@
 import schedule
 import time
 from datetime import datetime
-from db import SessionLocal, Product, Price, Alert
-from services.predictor import PricePredictor
+from db import SessionLocal, Product, Price
+from config import config
+from services.model_registry import registry
 from services.alerts import AlertService
+from services.hot_cache import get_latest_state
+from services.write_buffer import write_buffer
 from scrapers.amazon_scraper import AmazonScraper
 from scrapers.flipkart_scraper import FlipkartScraper
 import logging
@@ -12,18 +15,23 @@ logger = logging.getLogger(__name__)
 
 class PriceMonitor:
     def __init__(self):
-        self.predictor = PricePredictor()
         self.alert_service = AlertService()
         self.scrapers = {
             'amazon': AmazonScraper(),
             'flipkart': FlipkartScraper()
         }
     
+    @property
+    def predictor(self):
+        return registry.get('price_predictor')
+    
     def monitor_prices(self):
         """Check current prices and create alerts based on predictions"""
         db = SessionLocal()
         try:
             products = db.query(Product).all()
+            # Last recorded price for every product, from the hot cache
+            latest_state = get_latest_state(db, max_age_seconds=0)
             
             for product in products:
                 try:
@@ -36,34 +44,30 @@ class PriceMonitor:
                             current_price = product_data['price']
                             
                             # Get last recorded price
-                            last_price = db.query(Price).filter(
-                                Price.product_id == product.id
-                            ).order_by(Price.scraped_at.desc()).first()
+                            last_price = latest_state.get(product.id)
                             
-                            # Record new price
-                            new_price = Price(
-                                product_id=product.id,
-                                price=current_price,
-                                discount_price=product_data.get('discount_price'),
-                                discount_percentage=product_data.get('discount_percentage', 0),
-                                scraped_at=datetime.utcnow()
-                            )
-                            db.add(new_price)
+                            # Record new price through the shared group-commit buffer
+                            write_buffer.submit(Price, {
+                                'product_id': product.id,
+                                'price': current_price,
+                                'discount_price': product_data.get('discount_price'),
+                                'discount_percentage': product_data.get('discount_percentage', 0),
+                                'currency': 'INR',
+                                'in_stock': product_data.get('in_stock', True),
+                                'scraped_at': datetime.utcnow()
+                            })
                             
                             # Check for significant price changes
                             if last_price:
-                                price_change_pct = ((current_price - last_price.price) / last_price.price) * 100
+                                price_change_pct = ((current_price - last_price['price']) / last_price['price']) * 100
                                 
                                 # Create alerts for significant drops
                                 if price_change_pct < -5:
-                                    alert = Alert(
-                                        type='price_drop',
+                                    self.alert_service.queue_alert(
+                                        alert_type='price_drop',
                                         message=f"🎉 Price Drop Alert! {product.name} dropped by {abs(price_change_pct):.1f}% to ₹{current_price:,.0f}",
-                                        product_id=product.id,
-                                        created_at=datetime.utcnow(),
-                                        sent=False
+                                        product_id=product.id
                                     )
-                                    db.add(alert)
                             
                             # Get ML predictions
                             if self.predictor.is_trained:
@@ -72,20 +76,19 @@ class PriceMonitor:
                                 if 'summary' in prediction:
                                     # Alert if price expected to rise significantly
                                     if prediction['summary']['expected_change_pct'] > 10:
-                                        alert = Alert(
-                                            type='price_prediction',
+                                        self.alert_service.queue_alert(
+                                            alert_type='price_prediction',
                                             message=f"⚡ Buy Now! {product.name} expected to rise by {prediction['summary']['expected_change_pct']:.1f}% in next 7 days",
-                                            product_id=product.id,
-                                            created_at=datetime.utcnow(),
-                                            sent=False
+                                            product_id=product.id
                                         )
-                                        db.add(alert)
                 
                 except Exception as e:
                     logger.error(f"Error monitoring {product.name}: {str(e)}")
                     continue
             
-            db.commit()
+            if not write_buffer.flush(timeout=config.WRITE_BUFFER_FLUSH_TIMEOUT_SECONDS):
+                logger.error(f"Write buffer did not flush within {config.WRITE_BUFFER_FLUSH_TIMEOUT_SECONDS}s")
+            latest_state.refresh(db)
             
             # Retrain model periodically with new data
             self.predictor.train()
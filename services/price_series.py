@@ -0,0 +1,281 @@
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from db import SessionLocal, Price, PriceSeries
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+STREAMS = 3  # timestamps (s), price (paise), discount price (paise, 0 = none)
+
+
+# ---------------- Codec ----------------
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def _varint_encode(values: np.ndarray) -> bytes:
+    out = bytearray()
+    for value in values.tolist():
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def _varint_decode(data: np.ndarray) -> np.ndarray:
+    """Vectorized LEB128 decode of a uint8 buffer"""
+    if data.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = ((np.arange(data.size) - starts[group]) * 7).astype(np.uint64)
+    parts = (data & 0x7F).astype(np.uint64) << shifts
+    return np.add.reduceat(parts, starts)
+
+
+def encode_series(timestamps: np.ndarray, prices: np.ndarray, discount_prices: np.ndarray) -> bytes:
+    """Pack epoch seconds and rupee prices (NaN discount = none) into a delta/varint blob"""
+    price_paise = np.rint(np.asarray(prices, dtype=np.float64) * 100).astype(np.int64)
+    discount = np.asarray(discount_prices, dtype=np.float64)
+    discount_paise = np.where(np.isnan(discount), 0, np.rint(discount * 100)).astype(np.int64)
+
+    values = [np.array([len(price_paise)], dtype=np.uint64)]
+    for stream in (np.asarray(timestamps, dtype=np.int64), price_paise, discount_paise):
+        values.append(_zigzag(np.diff(stream, prepend=0)))
+    return bytes([FORMAT_VERSION]) + _varint_encode(np.concatenate(values))
+
+
+def decode_series(payload: bytes) -> Dict[str, np.ndarray]:
+    """Inverse of encode_series: datetime64[s] timestamps and float prices"""
+    data = np.frombuffer(payload, dtype=np.uint8)
+    if data.size == 0 or data[0] != FORMAT_VERSION:
+        raise ValueError("Unsupported price series format")
+    values = _varint_decode(data[1:])
+    count = int(values[0])
+    streams = np.cumsum(_unzigzag(values[1:1 + STREAMS * count]).reshape(STREAMS, count), axis=1)
+    discount = streams[2].astype(np.float64) / 100
+    discount[streams[2] == 0] = np.nan
+    return {
+        'scraped_at': streams[0].astype('datetime64[s]'),
+        'price': streams[1].astype(np.float64) / 100,
+        'discount_price': discount
+    }
+
+
+def _concat(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    if not parts:
+        return {
+            'scraped_at': np.zeros(0, dtype='datetime64[s]'),
+            'price': np.zeros(0),
+            'discount_price': np.zeros(0)
+        }
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+# ---------------- Writes ----------------
+def _month_bounds(month: str):
+    start = datetime.strptime(month, '%Y-%m')
+    end = datetime(start.year + 1, 1, 1) if start.month == 12 else datetime(start.year, start.month + 1, 1)
+    return start, end
+
+
+SYNC_CHUNK = 500  # products per read while syncing
+
+
+def _merge_month(rows: List, existing: Optional[bytes]) -> Optional[Dict]:
+    """Column values for one product-month from its hot rows (oldest first) and current blob
+
+    Rows the retention job has already moved to the archive are kept from the
+    existing blob, since archiving removes a prefix of each month by time.
+    """
+    if not rows:
+        return None
+    hot = {
+        'scraped_at': np.array([r.scraped_at for r in rows], dtype='datetime64[s]'),
+        'price': np.array([r.price for r in rows], dtype=np.float64),
+        'discount_price': np.array([np.nan if r.discount_price is None else r.discount_price for r in rows])
+    }
+    if existing is not None:
+        decoded = decode_series(existing)
+        older = decoded['scraped_at'] < hot['scraped_at'][0]
+        hot = _concat([{k: v[older] for k, v in decoded.items()}, hot])
+
+    return {
+        'payload': encode_series(hot['scraped_at'].astype(np.int64), hot['price'], hot['discount_price']),
+        'points': len(hot['price']),
+        'first_at': hot['scraped_at'][0].item(),
+        'last_at': hot['scraped_at'][-1].item(),
+        'last_price_id': max(r.id for r in rows),
+        'updated_at': datetime.utcnow()
+    }
+
+
+def _upsert_series(db: Session, rows: List[Dict]):
+    """Insert or replace product-month blobs in one statement"""
+    if not rows:
+        return
+    dialect_insert = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+    stmt = dialect_insert(PriceSeries)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['product_id', 'month'],
+            set_={column: stmt.excluded[column] for column in
+                  ('payload', 'points', 'first_at', 'last_at', 'last_price_id', 'updated_at')}
+        ),
+        rows
+    )
+
+
+def compact_month(db: Session, product_id: int, month: str) -> Optional[Dict]:
+    """(Re)encode one product-month from the prices table"""
+    start, end = _month_bounds(month)
+    rows = db.query(Price.id, Price.scraped_at, Price.price, Price.discount_price).filter(
+        Price.product_id == product_id,
+        Price.scraped_at >= start,
+        Price.scraped_at < end,
+        Price.price.isnot(None)
+    ).order_by(Price.scraped_at, Price.id).all()
+    existing = db.query(PriceSeries.payload).filter(
+        PriceSeries.product_id == product_id,
+        PriceSeries.month == month
+    ).scalar()
+
+    values = _merge_month(rows, existing)
+    if values is not None:
+        _upsert_series(db, [{'product_id': product_id, 'month': month, **values}])
+    return values
+
+
+def sync_series(db: Session) -> Dict:
+    """Re-encode every product-month that has price rows newer than the last sync
+
+    Set-based: a fixed number of reads per SYNC_CHUNK touched products and one
+    bulk upsert, instead of two queries per product-month.
+    """
+    watermark = db.query(func.max(PriceSeries.last_price_id)).scalar() or 0
+    touched = db.query(Price.product_id, Price.scraped_at).filter(
+        Price.id > watermark,
+        Price.scraped_at.isnot(None)
+    ).all()
+    keys = {(row.product_id, row.scraped_at.strftime('%Y-%m')) for row in touched}
+    if not keys:
+        return {'months': 0, 'rows': 0}
+
+    months = sorted({month for _, month in keys})
+    since, _ = _month_bounds(months[0])
+    _, until = _month_bounds(months[-1])
+    product_ids = sorted({product_id for product_id, _ in keys})
+
+    upserts = []
+    for start in range(0, len(product_ids), SYNC_CHUNK):
+        chunk = product_ids[start:start + SYNC_CHUNK]
+        # Every hot row of the touched months for these products, grouped in Python
+        month_rows = {}
+        rows = db.query(Price.id, Price.product_id, Price.scraped_at, Price.price, Price.discount_price).filter(
+            Price.product_id.in_(chunk),
+            Price.scraped_at >= since,
+            Price.scraped_at < until,
+            Price.price.isnot(None)
+        ).order_by(Price.product_id, Price.scraped_at, Price.id)
+        for row in rows:
+            key = (row.product_id, row.scraped_at.strftime('%Y-%m'))
+            if key in keys:
+                month_rows.setdefault(key, []).append(row)
+
+        existing = {
+            (series.product_id, series.month): series.payload
+            for series in db.query(PriceSeries.product_id, PriceSeries.month, PriceSeries.payload).filter(
+                PriceSeries.product_id.in_(chunk),
+                PriceSeries.month.in_(months)
+            )
+        }
+        for (product_id, month), month_values in month_rows.items():
+            values = _merge_month(month_values, existing.get((product_id, month)))
+            upserts.append({'product_id': product_id, 'month': month, **values})
+
+    _upsert_series(db, upserts)
+    db.commit()
+
+    logger.info(f"Compacted {len(upserts)} product-months from {len(touched)} new price rows")
+    return {'months': len(upserts), 'rows': len(touched)}
+
+
+# ---------------- Reads ----------------
+def load_series(db: Session, product_ids: List[int], since: Optional[datetime] = None) -> Dict[int, Dict[str, np.ndarray]]:
+    """Per-product arrays (oldest first) from the compact blobs plus any rows not compacted yet"""
+    query = db.query(PriceSeries).filter(PriceSeries.product_id.in_(product_ids))
+    if since is not None:
+        query = query.filter(PriceSeries.month >= since.strftime('%Y-%m'))
+
+    parts = {product_id: [] for product_id in product_ids}
+    watermarks = {product_id: 0 for product_id in product_ids}
+    for series in query.order_by(PriceSeries.product_id, PriceSeries.month):
+        parts[series.product_id].append(decode_series(series.payload))
+        watermarks[series.product_id] = max(watermarks[series.product_id], series.last_price_id)
+
+    # Rows scraped since the last sync (or every row, for products never compacted)
+    tail = db.query(Price.product_id, Price.id, Price.scraped_at, Price.price, Price.discount_price).filter(
+        Price.product_id.in_(product_ids),
+        Price.id > min(watermarks.values(), default=0),
+        Price.price.isnot(None)
+    )
+    if since is not None:
+        tail = tail.filter(Price.scraped_at >= since)
+    tail_rows = {}
+    for row in tail.order_by(Price.scraped_at, Price.id):
+        if row.id > watermarks[row.product_id]:
+            tail_rows.setdefault(row.product_id, []).append(row)
+    for product_id, rows in tail_rows.items():
+        parts[product_id].append({
+            'scraped_at': np.array([r.scraped_at for r in rows], dtype='datetime64[s]'),
+            'price': np.array([r.price for r in rows], dtype=np.float64),
+            'discount_price': np.array([np.nan if r.discount_price is None else r.discount_price for r in rows])
+        })
+
+    result = {}
+    for product_id, product_parts in parts.items():
+        series = _concat(product_parts)
+        if since is not None:
+            keep = series['scraped_at'] >= np.datetime64(since, 's')
+            series = {k: v[keep] for k, v in series.items()}
+        result[product_id] = series
+    return result
+
+
+def series_frame(db: Session, product_ids: List[int], since: Optional[datetime] = None,
+                 limit: Optional[int] = None) -> pd.DataFrame:
+    """Long DataFrame (product_id, scraped_at, price, discount_price); limit keeps the newest N per product"""
+    frames = []
+    for product_id, series in load_series(db, product_ids, since).items():
+        if limit is not None:
+            series = {k: v[-limit:] for k, v in series.items()}
+        frame = pd.DataFrame(series)
+        frame.insert(0, 'product_id', product_id)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=['product_id', 'scraped_at', 'price', 'discount_price'])
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        result = sync_series(db)
+        print(f"✅ Compacted {result['months']} product-months")
+    finally:
+        db.close()
@@ -0,0 +1,222 @@
+import os
+import uuid
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from db import SessionLocal, Product, Price, Review
+from config import config
+from services.review_dedup import remember_archived_fingerprints
+
+logger = logging.getLogger(__name__)
+
+PRICE_COLUMNS = ['id', 'product_id', 'price', 'discount_price', 'discount_percentage',
+                 'currency', 'in_stock', 'scraped_at']
+REVIEW_COLUMNS = ['id', 'product_id', 'rating', 'title', 'content', 'sentiment',
+                  'sentiment_score', 'review_date', 'scraped_at']
+PARTITION_COLUMNS = ['month', 'platform']
+
+# Explicit Arrow schemas: inferring per batch turns an all-None column into type
+# null, and partitions written that way conflict when the dataset is read back
+_PARTITION_FIELDS = [('month', pa.string()), ('platform', pa.string())]
+PRICE_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('product_id', pa.int64()),
+    ('price', pa.float64()),
+    ('discount_price', pa.float64()),
+    ('discount_percentage', pa.float64()),
+    ('currency', pa.string()),
+    ('in_stock', pa.bool_()),
+    ('scraped_at', pa.timestamp('us')),
+] + _PARTITION_FIELDS)
+REVIEW_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('product_id', pa.int64()),
+    ('rating', pa.float64()),
+    ('title', pa.string()),
+    ('content', pa.string()),
+    ('sentiment', pa.string()),
+    ('sentiment_score', pa.float64()),
+    ('review_date', pa.timestamp('us')),
+    ('scraped_at', pa.timestamp('us')),
+] + _PARTITION_FIELDS)
+
+
+class RetentionService:
+    """Moves cold price and review rows out of SQLite into a Parquet archive"""
+
+    def __init__(self, archive_dir: str = None, retention_days: int = None):
+        self.archive_dir = archive_dir or config.ARCHIVE_DIR
+        self.retention_days = retention_days if retention_days is not None else config.RETENTION_DAYS
+        self.prices_path = os.path.join(self.archive_dir, 'prices')
+        self.reviews_path = os.path.join(self.archive_dir, 'reviews')
+
+    def archive_cold_data(self, db: Session, batch_size: int = 50000) -> Dict:
+        """Archive price and review rows older than the retention horizon"""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+
+        archived_prices = self._archive_table(
+            db, Price, PRICE_COLUMNS, PRICE_SCHEMA, self.prices_path, cutoff, batch_size
+        )
+        archived_reviews = self._archive_table(
+            db, Review, REVIEW_COLUMNS, REVIEW_SCHEMA, self.reviews_path, cutoff, batch_size
+        )
+
+        logger.info(
+            f"Archived {archived_prices} prices and {archived_reviews} reviews older than {cutoff:%Y-%m-%d}"
+        )
+        return {
+            'cutoff': cutoff,
+            'prices_archived': archived_prices,
+            'reviews_archived': archived_reviews
+        }
+
+    def _archive_table(self, db: Session, model, columns: List[str], schema: pa.Schema,
+                       path: str, cutoff: datetime, batch_size: int) -> int:
+        """Copy one batch at a time to Parquet, then delete it from the hot table"""
+        total = 0
+        filters = [model.scraped_at < cutoff]
+        if model is Price:
+            # Each product's current price stays hot however old it is; latest_prices
+            # and the latest-state cache read it from the database
+            filters.append(Price.id.notin_(_latest_price_ids()))
+        while True:
+            rows = db.query(
+                *[getattr(model, c) for c in columns],
+                Product.platform
+            ).join(Product, model.product_id == Product.id).filter(
+                *filters
+            ).order_by(model.id).limit(batch_size).all()
+
+            if not rows:
+                break
+
+            df = pd.DataFrame(rows, columns=columns + ['platform'])
+            df['platform'] = df['platform'].fillna('unknown')
+            df['month'] = pd.to_datetime(df['scraped_at']).dt.strftime('%Y-%m')
+
+            # Write first; a crash before the delete only leaves duplicates,
+            # which readers drop by id.
+            pq.write_to_dataset(
+                pa.Table.from_pandas(df, schema=schema, preserve_index=False),
+                root_path=path,
+                partition_cols=PARTITION_COLUMNS,
+                schema=schema,
+                basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet"
+            )
+
+            ids = df['id'].tolist()
+            if model is Review:
+                # Same transaction as the delete, so dedup never loses sight of a review
+                fingerprints = db.query(Review.product_id, Review.fingerprint).filter(Review.id.in_(ids)).all()
+                remember_archived_fingerprints(db, [row._asdict() for row in fingerprints])
+            db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            total += len(ids)
+
+        return total
+
+
+def _latest_price_ids():
+    """Id of each product's latest price, ranked the way repository.latest_prices ranks them"""
+    ranked = select(
+        Price.id.label('id'),
+        func.row_number().over(
+            partition_by=Price.product_id,
+            order_by=(Price.scraped_at.desc(), Price.id.desc())
+        ).label('rn')
+    ).subquery()
+    return select(ranked.c.id).where(ranked.c.rn == 1)
+
+
+def _read_archive(path: str, columns: List[str], schema: pa.Schema,
+                  product_ids: Optional[List[int]] = None,
+                  since: Optional[datetime] = None) -> pd.DataFrame:
+    """Read the cold archive, pruning on product and month where possible"""
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=columns)
+
+    filters = []
+    if product_ids is not None:
+        filters.append(('product_id', 'in', list(product_ids)))
+    if since is not None:
+        filters.append(('month', '>=', since.strftime('%Y-%m')))
+
+    table = pq.read_table(path, columns=columns, filters=filters or None, schema=schema)
+    df = table.to_pandas()
+    if since is not None and not df.empty:
+        df = df[pd.to_datetime(df['scraped_at']) >= since]
+    return df
+
+
+def _union(hot: pd.DataFrame, cold: pd.DataFrame) -> pd.DataFrame:
+    """Combine hot and cold rows, preferring the hot copy of any duplicate id"""
+    if cold.empty:
+        df = hot
+    elif hot.empty:
+        df = cold
+    else:
+        df = pd.concat([hot, cold], ignore_index=True)
+    df = df.drop_duplicates(subset='id', keep='first')
+    df['scraped_at'] = pd.to_datetime(df['scraped_at'])
+    return df.sort_values(['product_id', 'scraped_at']).reset_index(drop=True)
+
+
+def load_price_history(db: Session, product_ids: Optional[List[int]] = None,
+                       since: Optional[datetime] = None) -> pd.DataFrame:
+    """Price history from SQLite and the Parquet archive as one DataFrame"""
+    query = db.query(*[getattr(Price, c) for c in PRICE_COLUMNS])
+    if product_ids is not None:
+        query = query.filter(Price.product_id.in_(product_ids))
+    if since is not None:
+        query = query.filter(Price.scraped_at >= since)
+
+    hot = pd.DataFrame(query.all(), columns=PRICE_COLUMNS)
+    cold = _read_archive(
+        os.path.join(config.ARCHIVE_DIR, 'prices'), PRICE_COLUMNS, PRICE_SCHEMA, product_ids, since
+    )
+    return _union(hot, cold)
+
+
+def load_archived_reviews(columns: Optional[List[str]] = None,
+                          product_ids: Optional[List[int]] = None) -> pd.DataFrame:
+    """Archived reviews only"""
+    return _read_archive(
+        os.path.join(config.ARCHIVE_DIR, 'reviews'), columns or REVIEW_COLUMNS, REVIEW_SCHEMA, product_ids
+    )
+
+
+def load_review_history(db: Session, product_ids: Optional[List[int]] = None,
+                        since: Optional[datetime] = None) -> pd.DataFrame:
+    """Review history from SQLite and the Parquet archive as one DataFrame"""
+    query = db.query(*[getattr(Review, c) for c in REVIEW_COLUMNS])
+    if product_ids is not None:
+        query = query.filter(Review.product_id.in_(product_ids))
+    if since is not None:
+        query = query.filter(Review.scraped_at >= since)
+
+    hot = pd.DataFrame(query.all(), columns=REVIEW_COLUMNS)
+    cold = _read_archive(
+        os.path.join(config.ARCHIVE_DIR, 'reviews'), REVIEW_COLUMNS, REVIEW_SCHEMA, product_ids, since
+    )
+    return _union(hot, cold)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archive cold price and review history to Parquet")
+    parser.add_argument("--days", type=int, default=None, help="Retention horizon in days")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        result = RetentionService(retention_days=args.days).archive_cold_data(db)
+        print(f"✅ Archived {result['prices_archived']} prices and {result['reviews_archived']} reviews")
+    finally:
+        db.close()
@@ -0,0 +1,151 @@
+import re
+import hashlib
+import logging
+from typing import Dict, List, Set, Tuple
+from datetime import datetime
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from db import SessionLocal, Review, ArchivedReviewFingerprint
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_CHUNK = 500  # fingerprints per lookup, well under SQLite's bound-parameter limit
+
+
+def normalize_review_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = (text or '').lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def review_fingerprint(title: str, content: str) -> str:
+    """Stable content fingerprint for a review"""
+    normalized = normalize_review_text(title) + '\n' + normalize_review_text(content)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def existing_fingerprints(db: Session, pairs: Set[Tuple[int, str]]) -> Set[Tuple[int, str]]:
+    """Subset of (product_id, fingerprint) pairs already stored, hot or archived
+
+    One statement per FINGERPRINT_CHUNK fingerprints, whatever the number of products.
+    """
+    fingerprints = sorted({fingerprint for _, fingerprint in pairs})
+    product_ids = sorted({product_id for product_id, _ in pairs})
+    found = set()
+    for start in range(0, len(fingerprints), FINGERPRINT_CHUNK):
+        chunk = fingerprints[start:start + FINGERPRINT_CHUNK]
+        hot = select(Review.product_id, Review.fingerprint).where(
+            Review.product_id.in_(product_ids),
+            Review.fingerprint.in_(chunk)
+        )
+        archived = select(ArchivedReviewFingerprint.product_id, ArchivedReviewFingerprint.fingerprint).where(
+            ArchivedReviewFingerprint.product_id.in_(product_ids),
+            ArchivedReviewFingerprint.fingerprint.in_(chunk)
+        )
+        found.update((row.product_id, row.fingerprint) for row in db.execute(union_all(hot, archived)))
+    return found & pairs
+
+
+def split_new_reviews(db: Session, reviews_by_product: Dict[int, List[Dict]]) -> Dict:
+    """Fingerprint a whole cycle's scraped reviews and separate unseen ones from duplicates"""
+    fresh = {}
+    scraped = 0
+    for product_id, reviews in reviews_by_product.items():
+        scraped += len(reviews)
+        for review_data in reviews:
+            fingerprint = review_fingerprint(review_data.get('title'), review_data.get('content'))
+            fresh.setdefault((product_id, fingerprint), review_data)
+
+    stored = existing_fingerprints(db, set(fresh)) if fresh else set()
+    new_reviews = {}
+    for (product_id, fingerprint), review_data in fresh.items():
+        if (product_id, fingerprint) not in stored:
+            new_reviews.setdefault(product_id, []).append({**review_data, 'fingerprint': fingerprint})
+    return {
+        'new': new_reviews,
+        'duplicates': scraped - sum(len(reviews) for reviews in new_reviews.values())
+    }
+
+
+def remember_archived_fingerprints(db: Session, rows: List[Dict]) -> int:
+    """Keep (product_id, fingerprint) of reviews leaving the hot table; the caller commits"""
+    rows = [
+        {'product_id': row['product_id'], 'fingerprint': row['fingerprint'], 'archived_at': datetime.utcnow()}
+        for row in rows if row.get('fingerprint')
+    ]
+    if not rows:
+        return 0
+    dialect_insert = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+    db.execute(
+        dialect_insert(ArchivedReviewFingerprint).on_conflict_do_nothing(
+            index_elements=['product_id', 'fingerprint']
+        ),
+        rows
+    )
+    return len(rows)
+
+
+def backfill_archived_fingerprints(db: Session) -> int:
+    """Fingerprint reviews archived before fingerprints were kept, from their archived text"""
+    from services.retention import load_archived_reviews
+
+    archived = load_archived_reviews(columns=['product_id', 'title', 'content'])
+    rows = [
+        {'product_id': int(row.product_id), 'fingerprint': review_fingerprint(row.title, row.content)}
+        for row in archived.itertuples(index=False)
+    ]
+    remember_archived_fingerprints(db, rows)
+    db.commit()
+    logger.info(f"Recorded fingerprints of {len(rows)} archived reviews")
+    return len(rows)
+
+
+def backfill_fingerprints(db: Session, batch_size: int = 1000) -> Dict:
+    """Fingerprint existing reviews, deleting later copies of the same review"""
+    seen = {
+        (row.product_id, row.fingerprint)
+        for row in db.query(Review.product_id, Review.fingerprint).filter(Review.fingerprint.isnot(None))
+    }
+    fingerprinted = 0
+    removed = 0
+
+    while True:
+        batch = db.query(Review).filter(Review.fingerprint.is_(None)).order_by(Review.id).limit(batch_size).all()
+        if not batch:
+            break
+        for review in batch:
+            fingerprint = review_fingerprint(review.title, review.content)
+            key = (review.product_id, fingerprint)
+            if key in seen:
+                db.delete(review)
+                removed += 1
+            else:
+                review.fingerprint = fingerprint
+                seen.add(key)
+                fingerprinted += 1
+        db.commit()
+
+    logger.info(f"Fingerprinted {fingerprinted} reviews, removed {removed} duplicates")
+    return {'fingerprinted': fingerprinted, 'duplicates_removed': removed}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backfill review fingerprints")
+    parser.add_argument('--archive', action='store_true', help="Also record fingerprints of already archived reviews")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        result = backfill_fingerprints(db)
+        print(f"✅ Fingerprinted {result['fingerprinted']} reviews, removed {result['duplicates_removed']} duplicates")
+        if args.archive:
+            count = backfill_archived_fingerprints(db)
+            print(f"✅ Recorded fingerprints of {count} archived reviews")
+    finally:
+        db.close()
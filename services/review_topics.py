@@ -0,0 +1,250 @@
+import os
+import logging
+import threading
+import joblib
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer, ENGLISH_STOP_WORDS
+from sklearn.utils import murmurhash3_32
+from contextlib import contextmanager
+from sqlalchemy import update, func, text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from db import SessionLocal, Review, ReviewTopic, ProductTopic
+from config import config
+from services.sentiment import POLARITY
+
+logger = logging.getLogger(__name__)
+
+# Words every laptop review uses; they would otherwise lead every topic
+DOMAIN_STOP_WORDS = {'laptop', 'product', 'good', 'great', 'nice', 'best', 'buy', 'bought', 'using',
+                     'use', 'used', 'just', 'really', 'like', 'amazon', 'flipkart', 'thanks', 'value', 'money'}
+
+# pg_try_advisory_lock key for update runs; SQLite deployments run one API process
+ADVISORY_LOCK_KEY = 0x746f7069  # 'topi'
+_run_lock = threading.Lock()
+
+
+class ReviewTopicModel:
+    """Hashed bag-of-words plus mini-batch k-means, trained one batch of new reviews at a time
+
+    Hashing needs no vocabulary pass, so new reviews can be folded in without
+    refitting; a reverse map from hash bucket to the first term seen in it is
+    kept only to label topics. Which reviews have been folded in is tracked by
+    reviews.topic in the database, not here.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.TOPIC_MODEL_PATH
+        self.n_topics = config.TOPIC_COUNT
+        self.vectorizer = HashingVectorizer(
+            n_features=config.TOPIC_HASH_FEATURES,
+            stop_words=list(ENGLISH_STOP_WORDS | DOMAIN_STOP_WORDS),
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm='l2'
+        )
+        self.kmeans: Optional[MiniBatchKMeans] = None
+        self.terms: Dict[int, str] = {}
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            state = joblib.load(self.path)
+            self.kmeans = state['kmeans']
+            self.terms = state['terms']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        joblib.dump({'kmeans': self.kmeans, 'terms': self.terms}, tmp_path)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def ready(self) -> bool:
+        return self.kmeans is not None
+
+    def _remember_terms(self, texts: List[str]):
+        analyzer = self.vectorizer.build_analyzer()
+        n_features = self.vectorizer.n_features
+        for text in texts:
+            for term in set(analyzer(text)):
+                self.terms.setdefault(abs(murmurhash3_32(term, seed=0)) % n_features, term)
+
+    def partial_fit_predict(self, texts: List[str]) -> np.ndarray:
+        """Update the centroids with a batch and return each text's topic"""
+        matrix = self.vectorizer.transform(texts)
+        self._remember_terms(texts)
+        if self.kmeans is None:
+            self.kmeans = MiniBatchKMeans(n_clusters=self.n_topics, random_state=42, n_init=1)
+        self.kmeans.partial_fit(matrix)
+        return self.kmeans.predict(matrix)
+
+    def top_terms(self, topic: int, limit: int = 8) -> List[str]:
+        center = self.kmeans.cluster_centers_[topic]
+        strongest = np.argpartition(-center, limit)[:limit]
+        strongest = strongest[np.argsort(-center[strongest])]
+        return [self.terms[i] for i in strongest if center[i] > 0 and i in self.terms]
+
+
+def _upsert_counts(db: Session, rows: List[Dict]):
+    dialect_insert = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+    stmt = dialect_insert(ProductTopic)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['product_id', 'topic'],
+        set_={
+            **{c: getattr(ProductTopic, c) + getattr(stmt.excluded, c) for c in ('reviews', 'positive', 'negative')},
+            'updated_at': stmt.excluded.updated_at
+        }
+    )
+    db.execute(stmt, rows)
+
+
+def folded_watermark(db: Session) -> int:
+    """Id of the newest review already assigned a topic
+
+    Topics are written in the same transaction as the per-product counts, so this
+    can't drift from them the way a watermark saved next to the model could.
+    """
+    return db.query(func.max(Review.id)).filter(Review.topic.isnot(None)).scalar() or 0
+
+
+@contextmanager
+def _exclusive_run(db: Session):
+    """Yield whether this caller may update topics; concurrent runs would fold reviews twice"""
+    if db.bind.dialect.name == 'postgresql':
+        # Session-level lock on a connection of its own: the session hands its
+        # connection back to the pool at every batch commit
+        with db.bind.connect() as conn:
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': ADVISORY_LOCK_KEY}).scalar()
+            conn.commit()
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': ADVISORY_LOCK_KEY})
+                    conn.commit()
+    else:
+        acquired = _run_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _run_lock.release()
+
+
+def update_topics(db: Session, model: Optional[ReviewTopicModel] = None, batch_size: Optional[int] = None,
+                  max_batches: Optional[int] = None) -> Dict:
+    """Fold reviews stored since the last run into the topic model and the per-product counts"""
+    with _exclusive_run(db) as acquired:
+        if not acquired:
+            logger.info("Topic update already running elsewhere; skipped")
+            return {'reviews': 0, 'last_review_id': None, 'skipped': True}
+        # Loaded under the lock so a model saved by the previous run is picked up
+        model = model or ReviewTopicModel()
+        return _fold_new_reviews(db, model, batch_size or config.TOPIC_BATCH_SIZE, max_batches)
+
+
+def _fold_new_reviews(db: Session, model: ReviewTopicModel, batch_size: int, max_batches: Optional[int]) -> Dict:
+    # Stop at the first review still waiting for sentiment so its split is counted correctly
+    ceiling = db.query(func.min(Review.id)).filter(
+        Review.sentiment_status.in_(['pending', 'processing'])
+    ).scalar()
+    last_review_id = folded_watermark(db)
+
+    processed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        query = db.query(Review.id, Review.product_id, Review.content, Review.sentiment).filter(
+            Review.id > last_review_id,
+            Review.content.isnot(None)
+        )
+        if ceiling is not None:
+            query = query.filter(Review.id < ceiling)
+        rows = query.order_by(Review.id).limit(batch_size).all()
+        if not rows or (not model.ready and len(rows) < model.n_topics):
+            break
+
+        topics = model.partial_fit_predict([row.content for row in rows])
+        now = datetime.utcnow()
+        counts = {}
+        for row, topic in zip(rows, topics):
+            key = (row.product_id, int(topic))
+            totals = counts.setdefault(key, {'product_id': key[0], 'topic': key[1], 'reviews': 0,
+                                             'positive': 0, 'negative': 0, 'updated_at': now})
+            totals['reviews'] += 1
+            polarity = POLARITY.get(row.sentiment, 0)
+            totals['positive'] += polarity > 0
+            totals['negative'] += polarity < 0
+
+        # Topics (the watermark) and counts commit together; the model file trails by at
+        # most one batch of centroid updates if the process dies in between
+        db.execute(update(Review), [{'id': row.id, 'topic': int(topic)} for row, topic in zip(rows, topics)])
+        _upsert_counts(db, list(counts.values()))
+        db.commit()
+        model.save()
+        last_review_id = rows[-1].id
+        processed += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+
+    if model.ready and processed:
+        _refresh_topic_terms(db, model)
+    logger.info(f"Topic model folded in {processed} reviews")
+    return {'reviews': processed, 'last_review_id': last_review_id}
+
+
+def _refresh_topic_terms(db: Session, model: ReviewTopicModel):
+    sizes = dict(db.query(ProductTopic.topic, func.sum(ProductTopic.reviews)).group_by(ProductTopic.topic).all())
+    now = datetime.utcnow()
+    dialect_insert = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+    stmt = dialect_insert(ReviewTopic)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['id'],
+        set_={c: getattr(stmt.excluded, c) for c in ('top_terms', 'reviews', 'updated_at')}
+    )
+    db.execute(stmt, [{
+        'id': topic,
+        'top_terms': ', '.join(model.top_terms(topic)),
+        'reviews': int(sizes.get(topic) or 0),
+        'updated_at': now
+    } for topic in range(model.n_topics)])
+    db.commit()
+
+
+# ---------------- Reads ----------------
+def product_topics(db: Session, product_id: int, limit: int = 5) -> List[Dict]:
+    """A product's largest topics with their share of its reviews and sentiment split"""
+    rows = db.query(ProductTopic, ReviewTopic.top_terms).outerjoin(
+        ReviewTopic, ReviewTopic.id == ProductTopic.topic
+    ).filter(ProductTopic.product_id == product_id).order_by(ProductTopic.reviews.desc()).all()
+    total = sum(row.ProductTopic.reviews for row in rows)
+    return [{
+        'topic': row.ProductTopic.topic,
+        'terms': row.top_terms or '',
+        'reviews': row.ProductTopic.reviews,
+        'share': row.ProductTopic.reviews / total if total else 0,
+        'negative_share': row.ProductTopic.negative / row.ProductTopic.reviews if row.ProductTopic.reviews else 0
+    } for row in rows[:limit]]
+
+
+def top_topics(db: Session, limit: int = 5) -> List[Dict]:
+    """Catalog-wide topics by review count"""
+    rows = db.query(ReviewTopic).filter(ReviewTopic.reviews > 0).order_by(ReviewTopic.reviews.desc()).limit(limit)
+    return [{'topic': row.id, 'terms': row.top_terms, 'reviews': row.reviews} for row in rows]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        result = update_topics(db)
+        print(f"✅ Topic model updated with {result['reviews']} reviews")
+        for topic in top_topics(db, limit=config.TOPIC_COUNT):
+            print(f"  #{topic['topic']} ({topic['reviews']} reviews): {topic['terms']}")
+    finally:
+        db.close()
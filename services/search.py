@@ -0,0 +1,106 @@
+import re
+import logging
+from typing import Dict, List, Optional
+from sqlalchemy import text, select, table, literal_column
+from sqlalchemy.orm import Session
+from db import Product
+from repository import encode_cursor, decode_cursor
+
+logger = logging.getLogger(__name__)
+
+
+def build_match_query(search: str, prefix: bool = True) -> Optional[str]:
+    """Turn free text into an FTS5 MATCH expression; the last term matches as a prefix"""
+    terms = re.findall(r'\w+', search or '', re.UNICODE)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_products(db: Session, search: str, limit: int = 20,
+                    highlight_open: str = '**', highlight_close: str = '**') -> List[Dict]:
+    """Ranked product matches on name, brand and model"""
+    match = build_match_query(search)
+    if not match:
+        return []
+
+    rows = db.execute(text("""
+        SELECT rowid AS id,
+               rank AS score,
+               highlight(products_fts, 0, :open, :close) AS name_highlight
+        FROM products_fts
+        WHERE products_fts MATCH :match
+        ORDER BY rank
+        LIMIT :limit
+    """), {'match': match, 'limit': limit, 'open': highlight_open, 'close': highlight_close}).all()
+
+    return [dict(row._mapping) for row in rows]
+
+
+def product_match_ids(search: str):
+    """Subquery of every product id matching the search, for filtering other sort orders"""
+    match = build_match_query(search)
+    if not match:
+        return select(Product.id).where(False)
+    return select(literal_column('rowid')).select_from(table('products_fts')).where(
+        text("products_fts MATCH :match").bindparams(match=match)
+    )
+
+
+def paginate_product_search(db: Session, search: str, cursor: Optional[str] = None, limit: int = 20,
+                            platform: Optional[str] = None) -> Dict:
+    """One page of matching products in relevance order, seeking on (rank, id)"""
+    match = build_match_query(search)
+    if not match:
+        return {'items': [], 'next_cursor': None}
+
+    sql = """
+        SELECT p.id AS id, products_fts.rank AS score
+        FROM products_fts
+        JOIN products p ON p.id = products_fts.rowid
+        WHERE products_fts MATCH :match
+    """
+    params = {'match': match, 'limit': limit + 1}
+    if platform:
+        sql += " AND p.platform = :platform"
+        params['platform'] = platform
+    if cursor:
+        params['last_score'], params['last_id'] = decode_cursor(cursor)
+        sql += (" AND (products_fts.rank > :last_score"
+                " OR (products_fts.rank = :last_score AND p.id > :last_id))")
+    sql += " ORDER BY products_fts.rank, p.id LIMIT :limit"
+
+    ranked = db.execute(text(sql), params).all()
+    # One extra row tells us whether another page exists
+    page = ranked[:limit]
+    products = {p.id: p for p in db.query(Product).filter(Product.id.in_([row.id for row in page]))}
+    next_cursor = encode_cursor(page[-1].score, page[-1].id) if len(ranked) > limit else None
+    return {'items': [products[row.id] for row in page if row.id in products], 'next_cursor': next_cursor}
+
+
+def search_reviews(db: Session, search: str, product_id: Optional[int] = None, limit: int = 20,
+                   highlight_open: str = '**', highlight_close: str = '**') -> List[Dict]:
+    """Ranked review matches on title and content with highlighted snippets"""
+    match = build_match_query(search)
+    if not match:
+        return []
+
+    sql = """
+        SELECT reviews_fts.rowid AS id,
+               reviews_fts.rank AS score,
+               snippet(reviews_fts, 1, :open, :close, '…', 24) AS snippet
+        FROM reviews_fts
+    """
+    params = {'match': match, 'limit': limit, 'open': highlight_open, 'close': highlight_close}
+    if product_id is not None:
+        sql += " JOIN reviews r ON r.id = reviews_fts.rowid WHERE reviews_fts MATCH :match AND r.product_id = :product_id"
+        params['product_id'] = product_id
+    else:
+        sql += " WHERE reviews_fts MATCH :match"
+    sql += " ORDER BY reviews_fts.rank LIMIT :limit"
+
+    rows = db.execute(text(sql), params).all()
+    return [dict(row._mapping) for row in rows]
@@ -1,39 +1,111 @@
-from transformers import pipeline
-import torch
-from typing import Dict, List
+import time
+import logging
+import numpy as np
+from typing import Dict, List, Optional
 import re
+from config import config
+from services.sentiment_cache import sentiment_cache
+from services.sentiment_aggregates import LABELS, summarize
+
+logger = logging.getLogger(__name__)
+
+SENTIMENT_MAP = {
+    '1 star': 'very_negative',
+    '2 stars': 'negative',
+    '3 stars': 'neutral',
+    '4 stars': 'positive',
+    '5 stars': 'very_positive'
+}
+
+POLARITY = {'very_negative': -1, 'negative': -1, 'neutral': 0, 'positive': 1, 'very_positive': 1}
+
+# TextBlob polarity band of each of the model's five labels
+LEXICON_BANDS = {
+    'very_negative': (-1.0, -0.75),
+    'negative': (-0.75, -0.1),
+    'neutral': (-0.1, 0.1),
+    'positive': (0.1, 0.75),
+    'very_positive': (0.75, 1.0)
+}
+
+def lexicon_sentiment(text: str) -> Dict:
+    """TextBlob polarity mapped onto the model's five labels
+
+    score is put on the transformer's scale, the probability of the chosen
+    label: 0.2 (one in five) at the edge of the label's polarity band up to 1
+    at its far end, so lexicon and model scores can share score_sum. The raw
+    polarity is kept for the cascade threshold.
+    """
+    from textblob import TextBlob
+    polarity = TextBlob(text).sentiment.polarity
+    if polarity >= 0.75:
+        label, rating = 'very_positive', 5
+    elif polarity > 0.1:
+        label, rating = 'positive', 4
+    elif polarity <= -0.75:
+        label, rating = 'very_negative', 1
+    elif polarity < -0.1:
+        label, rating = 'negative', 2
+    else:
+        label, rating = 'neutral', 3
+    low, high = LEXICON_BANDS[label]
+    if rating == 5:
+        depth = (polarity - low) / (high - low)
+    elif rating == 1:
+        depth = (high - polarity) / (high - low)
+    else:
+        # Inner bands border another label on both sides
+        depth = min(polarity - low, high - polarity) / ((high - low) / 2)
+    score = 0.2 + 0.8 * min(max(depth, 0.0), 1.0)
+    return {'sentiment': label, 'score': score, 'rating': rating, 'polarity': polarity}
 
 class SentimentAnalyzer:
-    def __init__(self):
-        # Use a pre-trained sentiment analysis model
-        self.analyzer = pipeline(
-            "sentiment-analysis",
-            model="nlptown/bert-base-multilingual-uncased-sentiment",
-            device=0 if torch.cuda.is_available() else -1
-        )
+    def __init__(self, batch_size: Optional[int] = None, max_tokens: Optional[int] = None,
+                 backend: Optional[str] = None, threads: Optional[int] = None,
+                 cascade: Optional[bool] = None):
+        self.backend = backend or config.SENTIMENT_BACKEND
+        # Cascade: the lexicon settles confident reviews, only the rest reach the transformer
+        self.cascade = config.SENTIMENT_CASCADE if cascade is None else cascade
+        self.cascade_threshold = config.SENTIMENT_CASCADE_THRESHOLD
+        self.cascade_reviews = 0
+        self.cascade_escalated = 0
+        if self.backend == 'onnx':
+            # int8 ONNX Runtime copy of the same model; never loads the PyTorch weights once exported
+            from services.sentiment_onnx import OnnxSentimentModel
+            self.analyzer = None
+            self.model = OnnxSentimentModel(threads=threads)
+            self.tokenizer = self.model.tokenizer
+            self.id2label = self.model.id2label
+        else:
+            import torch
+            from transformers import pipeline
+            # Use a pre-trained sentiment analysis model
+            self.analyzer = pipeline(
+                "sentiment-analysis",
+                model=config.SENTIMENT_MODEL,
+                device=0 if torch.cuda.is_available() else -1
+            )
+            self.tokenizer = self.analyzer.tokenizer
+            self.model = self.analyzer.model
+            self.model.eval()
+            self.id2label = self.model.config.id2label
+        self.batch_size = batch_size or config.SENTIMENT_BATCH_SIZE
+        self.max_tokens = max_tokens or config.SENTIMENT_MAX_TOKENS
         
-    def analyze_review(self, review_text: str) -> Dict:
+    @property
+    def model_id(self) -> str:
+        """Cache key for this model, backend and truncation length"""
+        backend = 'onnx-int8' if self.backend == 'onnx' else 'torch'
+        return f"{config.SENTIMENT_MODEL}:{backend}:{self.max_tokens}"
+    
+    def analyze_review(self, review_text: str, use_cache: bool = True) -> Dict:
         """Analyze sentiment of a single review"""
-        # Clean text
-        cleaned_text = self._clean_text(review_text)
-        
-        # Get sentiment
-        result = self.analyzer(cleaned_text[:512])[0]  # BERT max length
-        
-        # Convert star rating to sentiment
-        label = result['label']
-        score = result['score']
-        
-        sentiment_map = {
-            '1 star': 'very_negative',
-            '2 stars': 'negative',
-            '3 stars': 'neutral',
-            '4 stars': 'positive',
-            '5 stars': 'very_positive'
-        }
-        
+        return self.analyze_batch([review_text], use_cache=use_cache)[0]
+    
+    def _to_result(self, label: str, score: float) -> Dict:
+        """Convert star rating to sentiment"""
         return {
-            'sentiment': sentiment_map.get(label, 'neutral'),
+            'sentiment': SENTIMENT_MAP.get(label, 'neutral'),
             'score': score,
             'rating': int(label.split()[0])
         }
@@ -41,47 +113,218 @@ class SentimentAnalyzer:
     def _clean_text(self, text: str) -> str:
         """Clean review text"""
         # Remove URLs
-        text = re.sub(r'http\S+', '', text)
+        text = re.sub(r'http\S+', '', text or '')
         # Remove special characters
         text = re.sub(r'[^a-zA-Z0-9\s\.]', '', text)
         # Remove extra whitespace
         text = ' '.join(text.split())
         return text
     
-    def analyze_batch(self, reviews: List[str]) -> List[Dict]:
-        """Analyze multiple reviews"""
-        results = []
-        for review in reviews:
+    def _logits(self, texts: List[str]) -> np.ndarray:
+        if self.backend == 'onnx':
+            encoded = self.tokenizer(
+                texts, truncation=True, max_length=self.max_tokens, padding=True, return_tensors='np'
+            )
+            return self.model.logits(encoded)
+        import torch
+        encoded = self.tokenizer(
+            texts, truncation=True, max_length=self.max_tokens, padding=True, return_tensors='pt'
+        ).to(self.model.device)
+        with torch.inference_mode():
+            return self.model(**encoded).logits.float().cpu().numpy()
+    
+    def _score(self, texts: List[str]) -> List[Dict]:
+        """Run one padded forward pass over already-cleaned texts"""
+        logits = self._logits(texts)
+        probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        probs /= probs.sum(axis=-1, keepdims=True)
+        labels = probs.argmax(axis=-1)
+        return [
+            self._to_result(self.id2label[int(label)], float(probs[i, label]))
+            for i, label in enumerate(labels)
+        ]
+    
+    def analyze_batch(self, reviews: List[str], batch_size: Optional[int] = None,
+                      use_cache: bool = True, ratings: Optional[List[Optional[float]]] = None) -> List[Dict]:
+        """Analyze multiple reviews, scoring only texts the sentiment cache has not seen
+
+        Star ratings, when given, let cascade mode escalate reviews whose text
+        disagrees with their rating.
+        """
+        if not reviews:
+            return []
+        texts = [self._clean_text(review) for review in reviews]
+        if self.cascade:
+            return self._analyze_cascade(texts, ratings, batch_size, use_cache)
+        if not use_cache:
+            return self._score_bucketed(texts, batch_size)
+        results = sentiment_cache.get_or_compute(
+            self.model_id, texts, lambda missing: self._score_bucketed(missing, batch_size)
+        )
+        return [dict(result) for result in results]
+    
+    def _needs_transformer(self, quick: Dict, rating: Optional[float]) -> bool:
+        if abs(quick['polarity']) < self.cascade_threshold:
+            return True
+        if rating is None:
+            return False
+        stars = 1 if rating >= 4 else -1 if rating <= 2 else 0
+        return stars != POLARITY[quick['sentiment']]
+    
+    def _analyze_cascade(self, texts: List[str], ratings: Optional[List[Optional[float]]],
+                         batch_size: Optional[int], use_cache: bool) -> List[Dict]:
+        # Transformer results already cached are better than the lexicon and free
+        results = sentiment_cache.lookup(self.model_id, texts) if use_cache else [None] * len(texts)
+        results = [dict(result) if result is not None else None for result in results]
+        
+        escalate = []
+        for i, text in enumerate(texts):
+            if results[i] is not None:
+                continue
+            quick = lexicon_sentiment(text)
+            if self._needs_transformer(quick, ratings[i] if ratings else None):
+                escalate.append(i)
+            else:
+                results[i] = quick
+        
+        if escalate:
+            unique = list(dict.fromkeys(texts[i] for i in escalate))
+            scored = self._score_bucketed(unique, batch_size)
+            if use_cache:
+                sentiment_cache.store(self.model_id, unique, scored)
+            by_text = dict(zip(unique, scored))
+            for i in escalate:
+                results[i] = dict(by_text[texts[i]])
+        
+        self.cascade_reviews += len(texts)
+        self.cascade_escalated += len(escalate)
+        return results
+    
+    def cascade_report(self, reviews: List[str], ratings: Optional[List[Optional[float]]] = None) -> Dict:
+        """Escalation rate, agreement with transformer-only labels and speedup over it"""
+        cascade = self.cascade
+        escalated_before = self.cascade_escalated
+        try:
+            self.cascade = False
+            started = time.perf_counter()
+            reference = self.analyze_batch(reviews, use_cache=False)
+            transformer_seconds = time.perf_counter() - started
+            
+            self.cascade = True
+            started = time.perf_counter()
+            cascaded = self.analyze_batch(reviews, use_cache=False, ratings=ratings)
+            cascade_seconds = time.perf_counter() - started
+        finally:
+            self.cascade = cascade
+        
+        escalated = self.cascade_escalated - escalated_before
+        same_label = sum(r['sentiment'] == c['sentiment'] for r, c in zip(reference, cascaded))
+        same_polarity = sum(
+            POLARITY[r['sentiment']] == POLARITY[c['sentiment']] for r, c in zip(reference, cascaded)
+        )
+        return {
+            'reviews': len(reviews),
+            'threshold': self.cascade_threshold,
+            'escalation_rate': round(escalated / len(reviews), 4) if reviews else None,
+            'label_agreement': round(same_label / len(reviews), 4) if reviews else None,
+            'polarity_agreement': round(same_polarity / len(reviews), 4) if reviews else None,
+            'transformer_seconds': round(transformer_seconds, 2),
+            'cascade_seconds': round(cascade_seconds, 2),
+            'speedup': round(transformer_seconds / cascade_seconds, 2) if cascade_seconds else None
+        }
+    
+    def cascade_stats(self) -> Dict:
+        """Share of reviews the cascade has sent to the transformer so far"""
+        return {
+            'reviews': self.cascade_reviews,
+            'escalated': self.cascade_escalated,
+            'escalation_rate': round(self.cascade_escalated / self.cascade_reviews, 4) if self.cascade_reviews else None
+        }
+    
+    def _score_bucketed(self, texts: List[str], batch_size: Optional[int] = None) -> List[Dict]:
+        """Score cleaned texts in padded batches of similar token length"""
+        batch_size = batch_size or self.batch_size
+        
+        # Sort by token length so each batch pads to its own longest review, not the global one;
+        # if measuring fails, score in the given order and let each batch fail on its own
+        try:
+            lengths = [len(ids) for ids in self.tokenizer(
+                texts, truncation=True, max_length=self.max_tokens
+            )['input_ids']]
+            order = np.argsort(lengths, kind='stable')
+        except Exception as e:
+            logger.warning(f"Could not measure {len(texts)} texts for length bucketing, scoring unsorted: {str(e)}")
+            order = np.arange(len(texts))
+        
+        results: List[Optional[Dict]] = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
             try:
-                result = self.analyze_review(review)
-                results.append(result)
+                scored = self._score([texts[i] for i in bucket])
             except Exception as e:
-                results.append({
-                    'sentiment': 'neutral',
-                    'score': 0.5,
-                    'error': str(e)
-                })
+                logger.error(f"Sentiment batch of {len(bucket)} failed: {str(e)}")
+                scored = [{'sentiment': 'neutral', 'score': 0.5, 'error': str(e)}] * len(bucket)
+            for index, result in zip(bucket, scored):
+                results[index] = dict(result)
         return results
     
+    def benchmark(self, reviews: List[str], batch_size: Optional[int] = None) -> Dict:
+        """Reviews/sec of the old one-at-a-time pipeline path against analyze_batch"""
+        started = time.perf_counter()
+        for review in reviews:
+            if self.analyzer is not None:
+                self.analyzer(self._clean_text(review)[:512])
+            else:
+                self.analyze_review(review, use_cache=False)
+        single = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        self._score_bucketed([self._clean_text(review) for review in reviews], batch_size)
+        batched = time.perf_counter() - started
+        return {
+            'reviews': len(reviews),
+            'device': 'cpu (onnx)' if self.backend == 'onnx' else str(self.model.device),
+            'batch_size': batch_size or self.batch_size,
+            'single_reviews_per_sec': round(len(reviews) / single, 1) if single else None,
+            'batched_reviews_per_sec': round(len(reviews) / batched, 1) if batched else None,
+            'speedup': round(single / batched, 2) if batched else None
+        }
+    
     def get_sentiment_summary(self, reviews: List[Dict]) -> Dict:
-        """Get summary statistics of sentiments"""
+        """Get summary statistics of sentiments in one pass (stored reviews: services.sentiment_aggregates)"""
         if not reviews:
             return {}
         
-        sentiments = [r.get('sentiment', 'neutral') for r in reviews]
-        ratings = [r.get('rating', 3) for r in reviews]
-        
-        sentiment_counts = {
-            'very_positive': sentiments.count('very_positive'),
-            'positive': sentiments.count('positive'),
-            'neutral': sentiments.count('neutral'),
-            'negative': sentiments.count('negative'),
-            'very_negative': sentiments.count('very_negative')
-        }
-        
-        return {
-            'average_rating': sum(ratings) / len(ratings),
-            'sentiment_distribution': sentiment_counts,
-            'total_reviews': len(reviews),
-            'positive_percentage': (sentiment_counts['very_positive'] + sentiment_counts['positive']) / len(reviews) * 100
-        }
\ No newline at end of file
+        totals = {label: 0 for label in LABELS}
+        totals.update(reviews=0, rating_sum=0, rated=0, score_sum=0)
+        for r in reviews:
+            label = r.get('sentiment', 'neutral')
+            if label in totals:
+                totals[label] += 1
+            totals['reviews'] += 1
+            totals['rating_sum'] += r.get('rating', 3)
+            totals['rated'] += 1
+            totals['score_sum'] += r.get('score') or 0
+        return summarize(totals)
+
+if __name__ == "__main__":
+    import argparse
+    from db import SessionLocal, Review
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Benchmark sentiment scoring on stored reviews")
+    parser.add_argument('--cascade', action='store_true', help="compare cascade mode with the transformer alone")
+    parser.add_argument('--reviews', type=int, default=256)
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        rows = db.query(Review.content, Review.rating).filter(Review.content.isnot(None)).limit(args.reviews).all()
+    finally:
+        db.close()
+    if not rows:
+        print("No stored reviews to benchmark")
+    elif args.cascade:
+        report = SentimentAnalyzer().cascade_report([r.content for r in rows], [r.rating for r in rows])
+        print(f"✅ Cascade: {report}")
+    else:
+        print(f"✅ Sentiment throughput: {SentimentAnalyzer().benchmark([r.content for r in rows])}")
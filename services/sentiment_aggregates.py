@@ -0,0 +1,200 @@
+import logging
+import pandas as pd
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from db import SessionLocal, Product, Review, SentimentDaily
+from services.retention import load_archived_reviews
+
+logger = logging.getLogger(__name__)
+
+LABELS = ['very_positive', 'positive', 'neutral', 'negative', 'very_negative']
+COUNTERS = LABELS + ['reviews', 'rating_sum', 'rated', 'score_sum']
+
+
+def _empty(product_id: int, day: date) -> Dict:
+    return {'product_id': product_id, 'day': day, **{c: 0 for c in COUNTERS}}
+
+
+def _add(totals: Dict, sentiment: str, score: Optional[float], rating: Optional[float]):
+    if sentiment in LABELS:
+        totals[sentiment] += 1
+    totals['reviews'] += 1
+    totals['score_sum'] += score or 0
+    if rating is not None:
+        totals['rating_sum'] += rating
+        totals['rated'] += 1
+
+
+def _upsert(db: Session, rows: List[Dict]):
+    """Add counter deltas to existing (product, day) rows, creating missing ones"""
+    dialect_insert = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+    stmt = dialect_insert(SentimentDaily)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['product_id', 'day'],
+        set_={
+            **{c: getattr(SentimentDaily, c) + getattr(stmt.excluded, c) for c in COUNTERS},
+            'updated_at': stmt.excluded.updated_at
+        }
+    )
+    db.execute(stmt, rows)
+
+
+def apply_scored(db: Session, scored: List[Dict]) -> int:
+    """Fold freshly scored reviews into the daily totals (caller commits)
+
+    Each dict needs product_id, scraped_at, sentiment, score and rating.
+    """
+    totals = {}
+    for review in scored:
+        day = (review['scraped_at'] or datetime.utcnow()).date()
+        key = (review['product_id'], day)
+        if key not in totals:
+            totals[key] = _empty(*key)
+        _add(totals[key], review['sentiment'], review.get('score'), review.get('rating'))
+    if totals:
+        now = datetime.utcnow()
+        _upsert(db, [{**row, 'updated_at': now} for row in totals.values()])
+    return len(totals)
+
+
+def _day(value) -> date:
+    # date() comes back as text from SQLite and as a date from PostgreSQL
+    if value is None:
+        return date.today()
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _hot_totals(db: Session) -> Dict:
+    """Counters per (product, day) for scored reviews in the database, grouped in SQL"""
+    day = func.date(Review.scraped_at)
+    rows = db.query(
+        Review.product_id, day.label('day'),
+        *[func.sum(case((Review.sentiment == label, 1), else_=0)).label(label) for label in LABELS],
+        func.count(Review.id).label('reviews'),
+        func.coalesce(func.sum(Review.rating), 0).label('rating_sum'),
+        func.count(Review.rating).label('rated'),
+        func.coalesce(func.sum(Review.sentiment_score), 0).label('score_sum')
+    ).filter(Review.sentiment.isnot(None)).group_by(Review.product_id, day).all()
+
+    totals = {}
+    for row in rows:
+        key = (row.product_id, _day(row.day))
+        current = totals.setdefault(key, _empty(*key))
+        for c in COUNTERS:
+            current[c] += getattr(row, c) or 0
+    return totals
+
+
+def _add_archived(db: Session, totals: Dict) -> int:
+    """Add scored archived reviews to totals; only the counter columns are read from Parquet"""
+    cold = load_archived_reviews(['id', 'product_id', 'rating', 'sentiment', 'sentiment_score', 'scraped_at'])
+    cold = cold[cold['sentiment'].notna()]
+    if cold.empty:
+        return 0
+    # An archive batch interrupted before its delete leaves rows in both places
+    hot_ids = {row.id for row in db.query(Review.id).filter(
+        Review.id >= int(cold['id'].min()), Review.id <= int(cold['id'].max())
+    )}
+    cold = cold[~cold['id'].isin(hot_ids)]
+
+    days = pd.to_datetime(cold['scraped_at'])
+    frame = pd.DataFrame({
+        'product_id': cold['product_id'].astype('int64'),
+        'day': days.dt.date.where(days.notna(), date.today()),
+        'reviews': 1,
+        'rating_sum': cold['rating'].fillna(0),
+        'rated': cold['rating'].notna().astype('int64'),
+        'score_sum': cold['sentiment_score'].fillna(0),
+        **{label: (cold['sentiment'] == label).astype('int64') for label in LABELS}
+    })
+    for (product_id, day), sums in frame.groupby(['product_id', 'day'])[COUNTERS].sum().iterrows():
+        current = totals.setdefault((int(product_id), day), _empty(int(product_id), day))
+        for c in COUNTERS:
+            current[c] += sums[c].item()
+    return len(frame)
+
+
+def rebuild(db: Session) -> Dict:
+    """Recompute every row from the full review history, including the Parquet archive"""
+    totals = _hot_totals(db)
+    _add_archived(db, totals)
+    db.query(SentimentDaily).delete()
+    if totals:
+        now = datetime.utcnow()
+        db.bulk_insert_mappings(SentimentDaily, [{**row, 'updated_at': now} for row in totals.values()])
+    db.commit()
+
+    reviews = int(sum(row['reviews'] for row in totals.values()))
+    logger.info(f"Rebuilt {len(totals)} sentiment aggregate rows from {reviews} reviews")
+    return {'rows': len(totals), 'reviews': reviews}
+
+
+def ensure_built(db: Session) -> Optional[Dict]:
+    """Rebuild once if the table is empty (a database from before it existed, or seeded directly)"""
+    if db.query(SentimentDaily.id).first() is not None:
+        return None
+    return rebuild(db)
+
+
+# ---------------- Reads ----------------
+def summarize(totals: Dict) -> Dict:
+    """Summary in the shape of SentimentAnalyzer.get_sentiment_summary"""
+    reviews = totals.get('reviews') or 0
+    if not reviews:
+        return {}
+    distribution = {label: int(totals.get(label) or 0) for label in LABELS}
+    return {
+        'average_rating': totals['rating_sum'] / totals['rated'] if totals.get('rated') else 0,
+        'average_score': totals['score_sum'] / reviews,
+        'sentiment_distribution': distribution,
+        'total_reviews': int(reviews),
+        'positive_percentage': (distribution['very_positive'] + distribution['positive']) / reviews * 100,
+        'negative_percentage': (distribution['very_negative'] + distribution['negative']) / reviews * 100
+    }
+
+
+def _sums(since: Optional[date]):
+    columns = [func.coalesce(func.sum(getattr(SentimentDaily, c)), 0).label(c) for c in COUNTERS]
+    return columns, ([SentimentDaily.day >= since] if since is not None else [])
+
+
+def overall_summary(db: Session, since: Optional[date] = None) -> Dict:
+    """Totals across every product"""
+    columns, filters = _sums(since)
+    row = db.query(*columns).filter(*filters).one()
+    return summarize(dict(row._mapping))
+
+
+def product_summaries(db: Session, product_ids: Optional[List[int]] = None,
+                      since: Optional[date] = None) -> Dict[int, Dict]:
+    """Summary per product from its daily rows"""
+    columns, filters = _sums(since)
+    query = db.query(SentimentDaily.product_id, *columns).filter(*filters)
+    if product_ids is not None:
+        query = query.filter(SentimentDaily.product_id.in_(product_ids))
+    rows = query.group_by(SentimentDaily.product_id).all()
+    return {row.product_id: summarize(dict(row._mapping)) for row in rows}
+
+
+def top_rated_products(db: Session, limit: int = 5) -> List:
+    """(name, avg_rating, review_count) of the best-rated products"""
+    avg_rating = (func.sum(SentimentDaily.rating_sum) / func.sum(SentimentDaily.rated)).label('avg_rating')
+    return db.query(
+        Product.name, avg_rating, func.sum(SentimentDaily.reviews).label('review_count')
+    ).join(SentimentDaily, SentimentDaily.product_id == Product.id).group_by(Product.id).having(
+        func.sum(SentimentDaily.rated) > 0
+    ).order_by(avg_rating.desc()).limit(limit).all()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        result = rebuild(db)
+        print(f"✅ Sentiment aggregates rebuilt: {result['rows']} rows from {result['reviews']} reviews")
+    finally:
+        db.close()
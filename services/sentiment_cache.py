@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from db import SessionLocal, SentimentCacheEntry
+from config import config
+from services.write_buffer import write_buffer
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_CHUNK = 500  # hashes per IN (...) lookup
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class SentimentCache:
+    """(model id, cleaned-text hash) -> sentiment, an in-memory LRU in front of the sentiment_cache table
+
+    Callers pass text already cleaned the way their model sees it, so
+    whitespace or URL noise does not split cache entries.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, session_factory=SessionLocal):
+        self.capacity = capacity or config.SENTIMENT_CACHE_SIZE
+        self.session_factory = session_factory
+        self._lru: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, result: Dict):
+        self._lru[key] = result
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def lookup(self, model_id: str, texts: List[str]) -> List[Optional[Dict]]:
+        """Cached results in input order, None where the text has not been scored by this model"""
+        hashes = [text_hash(text) for text in texts]
+        results: List[Optional[Dict]] = [None] * len(texts)
+        with self._lock:
+            for i, digest in enumerate(hashes):
+                cached = self._lru.get((model_id, digest))
+                if cached is not None:
+                    self._lru.move_to_end((model_id, digest))
+                    results[i] = cached
+        memory_hits = sum(r is not None for r in results)
+
+        missing = list({hashes[i] for i, r in enumerate(results) if r is None})
+        found = {}
+        if missing:
+            db = self.session_factory()
+            try:
+                for start in range(0, len(missing), LOOKUP_CHUNK):
+                    rows = db.query(SentimentCacheEntry).filter(
+                        SentimentCacheEntry.model_id == model_id,
+                        SentimentCacheEntry.text_hash.in_(missing[start:start + LOOKUP_CHUNK])
+                    ).all()
+                    for row in rows:
+                        found[row.text_hash] = {'sentiment': row.label, 'score': row.score, 'rating': row.rating}
+            except Exception as e:
+                logger.error(f"Sentiment cache lookup failed: {str(e)}")
+            finally:
+                db.close()
+
+        with self._lock:
+            for i, digest in enumerate(hashes):
+                if results[i] is None and digest in found:
+                    results[i] = found[digest]
+                    self._remember((model_id, digest), found[digest])
+            db_hits = sum(r is not None for r in results) - memory_hits
+            self.memory_hits += memory_hits
+            self.db_hits += db_hits
+            self.misses += len(texts) - memory_hits - db_hits
+        return results
+
+    def store(self, model_id: str, texts: List[str], results: List[Dict]):
+        """Remember fresh results; failed scorings (with an 'error' key) are not cached"""
+        rows = []
+        with self._lock:
+            for text, result in zip(texts, results):
+                if result is None or 'error' in result:
+                    continue
+                digest = text_hash(text)
+                self._remember((model_id, digest), result)
+                rows.append({
+                    'model_id': model_id,
+                    'text_hash': digest,
+                    'label': result['sentiment'],
+                    'score': result.get('score'),
+                    'rating': result.get('rating')
+                })
+        # Persisted write-behind; the insert ignores entries another process stored first
+        write_buffer.submit_many(SentimentCacheEntry, rows)
+
+    def get_or_compute(self, model_id: str, texts: List[str],
+                       compute: Callable[[List[str]], List[Dict]]) -> List[Dict]:
+        """Cached results, scoring each distinct uncached text once with compute()"""
+        results = self.lookup(model_id, texts)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            scored = compute(unique)
+            self.store(model_id, unique, scored)
+            by_text = dict(zip(unique, scored))
+            for i in missing:
+                results[i] = by_text[texts[i]]
+        return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                'lookups': lookups,
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else None,
+                'lru_entries': len(self._lru),
+                'lru_capacity': self.capacity
+            }
+
+
+sentiment_cache = SentimentCache()
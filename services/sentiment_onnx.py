@@ -0,0 +1,140 @@
+"""
+Quantized ONNX Runtime backend for the review sentiment model (CPU-only nodes)
+"""
+
+import os
+import time
+import logging
+import argparse
+import numpy as np
+from typing import Dict, List, Optional
+import onnxruntime as ort
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from transformers import AutoConfig, AutoTokenizer
+from config import config
+
+logger = logging.getLogger(__name__)
+
+INPUT_NAMES = ['input_ids', 'attention_mask', 'token_type_ids']  # BERT forward() order
+
+
+def export_quantized(model_name: str = None, model_dir: str = None) -> str:
+    """Export the HF model to ONNX once and write a dynamically int8-quantized copy"""
+    model_name = model_name or config.SENTIMENT_MODEL
+    model_dir = model_dir or config.ONNX_MODEL_DIR
+    quantized_path = os.path.join(model_dir, 'model.int8.onnx')
+    if os.path.exists(quantized_path):
+        return quantized_path
+
+    # Only the exporter needs torch and the full model
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, return_dict=False).eval()
+    sample = tokenizer(["export sample"], return_tensors='pt')
+
+    fp32_path = os.path.join(model_dir, 'model.onnx')
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in INPUT_NAMES}
+    dynamic_axes['logits'] = {0: 'batch'}
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[name] for name in INPUT_NAMES), fp32_path,
+            input_names=INPUT_NAMES, output_names=['logits'],
+            dynamic_axes=dynamic_axes, opset_version=14
+        )
+    quantize_dynamic(fp32_path, quantized_path, weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(model_dir)
+    model.config.save_pretrained(model_dir)
+
+    logger.info(
+        f"Exported {model_name}: {os.path.getsize(fp32_path) / 1e6:.0f}MB fp32 -> "
+        f"{os.path.getsize(quantized_path) / 1e6:.0f}MB int8"
+    )
+    return quantized_path
+
+
+class OnnxSentimentModel:
+    """int8 ONNX Runtime session plus the tokenizer and labels it was exported with"""
+
+    def __init__(self, model_dir: str = None, threads: Optional[int] = None):
+        path = export_quantized(model_dir=model_dir)
+        model_dir = os.path.dirname(path)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or config.ONNX_INTRA_OP_THREADS or max(1, (os.cpu_count() or 2) // 2)
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.threads = options.intra_op_num_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.id2label = AutoConfig.from_pretrained(model_dir).id2label
+        self.path = path
+
+    def logits(self, encoded) -> np.ndarray:
+        """Logits for a tokenizer batch encoded with return_tensors='np'"""
+        feeds = {name: np.asarray(encoded[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(['logits'], feeds)[0]
+
+
+# ---------------- Validation ----------------
+def parity_check(reference: List[Dict], candidate: List[Dict]) -> Dict:
+    """Label agreement between two analyze_batch outputs over the same reviews"""
+    ratings = np.array([[r.get('rating', 3), c.get('rating', 3)] for r, c in zip(reference, candidate)])
+    scores = np.array([[r['score'], c['score']] for r, c in zip(reference, candidate)])
+    if ratings.size == 0:
+        return {'reviews': 0}
+    return {
+        'reviews': len(ratings),
+        'label_agreement': round(float(np.mean(ratings[:, 0] == ratings[:, 1])), 4),
+        'within_one_star': round(float(np.mean(np.abs(ratings[:, 0] - ratings[:, 1]) <= 1)), 4),
+        'max_score_delta': round(float(np.max(np.abs(scores[:, 0] - scores[:, 1]))), 4)
+    }
+
+
+def benchmark(analyzer, reviews: List[str], single_samples: int = 50) -> Dict:
+    """Per-review latency and batched throughput of one SentimentAnalyzer"""
+    latencies = []
+    for review in reviews[:single_samples]:
+        started = time.perf_counter()
+        analyzer.analyze_review(review, use_cache=False)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    analyzer.analyze_batch(reviews, use_cache=False)
+    elapsed = time.perf_counter() - started
+    return {
+        'backend': analyzer.backend,
+        'latency_p50_ms': round(float(np.percentile(latencies, 50)), 2) if latencies else None,
+        'latency_p95_ms': round(float(np.percentile(latencies, 95)), 2) if latencies else None,
+        'reviews_per_sec': round(len(reviews) / elapsed, 1) if elapsed else None
+    }
+
+
+if __name__ == "__main__":
+    from db import SessionLocal, Review
+    from services.sentiment import SentimentAnalyzer
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export the int8 ONNX sentiment model and compare it with PyTorch")
+    parser.add_argument('--threads', type=int, nargs='*', default=[], help="intra-op thread counts to try")
+    parser.add_argument('--reviews', type=int, default=256)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        texts = [r.content for r in db.query(Review.content).filter(Review.content.isnot(None)).limit(args.reviews)]
+    finally:
+        db.close()
+    texts = texts or ["Great laptop, battery lasts all day.", "Screen died after a week, very poor."]
+
+    torch_analyzer = SentimentAnalyzer(backend='torch', cascade=False)
+    reference = torch_analyzer.analyze_batch(texts, use_cache=False)
+    print(f"✅ torch: {benchmark(torch_analyzer, texts)}")
+    for threads in args.threads or [None]:
+        onnx_analyzer = SentimentAnalyzer(backend='onnx', threads=threads, cascade=False)
+        print(f"✅ onnx ({onnx_analyzer.model.threads} threads): {benchmark(onnx_analyzer, texts)}")
+        print(f"   parity: {parity_check(reference, onnx_analyzer.analyze_batch(texts, use_cache=False))}")
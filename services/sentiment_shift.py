@@ -0,0 +1,145 @@
+import math
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from db import SentimentShiftState
+from config import config
+from repository import products_by_id
+from services.alerts import AlertService
+from services.sentiment import POLARITY
+
+logger = logging.getLogger(__name__)
+
+
+def _ewm_update(mean: Optional[float], var: Optional[float], x: float, alpha: float) -> Tuple[float, float]:
+    """One step of an exponentially weighted mean and variance"""
+    if mean is None:
+        return x, 0.0
+    diff = x - mean
+    increment = alpha * diff
+    return mean + increment, (1 - alpha) * ((var or 0.0) + diff * increment)
+
+
+class SentimentShiftDetector:
+    """Flags products whose recent sentiment drifts away from their own baseline
+
+    Each product keeps a fast and a slow exponentially weighted mean of its
+    positive share and signed score (plus the slow variance), a handful of
+    floats regardless of how many reviews it has. A shift is reported when the
+    fast mean sits SENTIMENT_SHIFT_Z standard errors from the baseline and the
+    move is large enough to matter; the baseline then restarts from the new level.
+    """
+
+    def __init__(self, alert_service: Optional[AlertService] = None):
+        self.alert_service = alert_service or AlertService()
+        self.fast_alpha = 2 / (config.SENTIMENT_SHIFT_FAST_WINDOW + 1)
+        self.slow_alpha = 2 / (config.SENTIMENT_SHIFT_SLOW_WINDOW + 1)
+        # Variance of a fast EWMA of independent observations, relative to theirs
+        self.fast_var_factor = self.fast_alpha / (2 - self.fast_alpha)
+
+    def _shifted(self, fast: float, slow: float, var: float, min_delta: float) -> bool:
+        delta = abs(fast - slow)
+        if delta < min_delta:
+            return False
+        standard_error = math.sqrt(var * self.fast_var_factor)
+        return standard_error == 0 or delta / standard_error >= config.SENTIMENT_SHIFT_Z
+
+    def _observe_one(self, state: SentimentShiftState, positive: float, score: float):
+        state.observations = (state.observations or 0) + 1
+        # Plain running means until a window has filled, so the first reviews don't dominate
+        fast_alpha = max(self.fast_alpha, 1 / state.observations)
+        slow_alpha = max(self.slow_alpha, 1 / state.observations)
+        state.fast_positive, _ = _ewm_update(state.fast_positive, None, positive, fast_alpha)
+        state.fast_score, _ = _ewm_update(state.fast_score, None, score, fast_alpha)
+        state.slow_positive, state.slow_positive_var = _ewm_update(
+            state.slow_positive, state.slow_positive_var, positive, slow_alpha
+        )
+        state.slow_score, state.slow_score_var = _ewm_update(
+            state.slow_score, state.slow_score_var, score, slow_alpha
+        )
+
+    def _check(self, state: SentimentShiftState, now: datetime) -> Optional[Dict]:
+        if state.observations < config.SENTIMENT_SHIFT_MIN_REVIEWS:
+            return None
+        if state.last_alert_at and now - state.last_alert_at < timedelta(hours=config.SENTIMENT_SHIFT_COOLDOWN_HOURS):
+            return None
+        positive_shift = self._shifted(state.fast_positive, state.slow_positive, state.slow_positive_var,
+                                       config.SENTIMENT_SHIFT_MIN_POSITIVE_DELTA)
+        score_shift = self._shifted(state.fast_score, state.slow_score, state.slow_score_var,
+                                    config.SENTIMENT_SHIFT_MIN_SCORE_DELTA)
+        if not (positive_shift or score_shift):
+            return None
+
+        shift = {
+            'product_id': state.product_id,
+            'positive_before': state.slow_positive,
+            'positive_after': state.fast_positive,
+            'score_before': state.slow_score,
+            'score_after': state.fast_score
+        }
+        # Re-baseline at the new level so a lasting change is reported once; the baseline
+        # re-learns quickly and stays quiet until SENTIMENT_SHIFT_MIN_REVIEWS again
+        state.slow_positive, state.slow_score = state.fast_positive, state.fast_score
+        state.observations = config.SENTIMENT_SHIFT_FAST_WINDOW
+        state.last_alert_at = now
+        return shift
+
+    def _lock_states(self, db: Session, product_ids: List[int], now: datetime) -> Dict[int, SentimentShiftState]:
+        """Each product's state row, created if missing and locked until the caller commits
+
+        Missing rows are inserted with ON CONFLICT DO NOTHING, so two workers seeing a
+        product for the first time don't trip the unique product_id constraint; rows
+        are then locked in product order so concurrent batches update them in turn.
+        """
+        dialect_insert = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+        db.execute(
+            dialect_insert(SentimentShiftState).on_conflict_do_nothing(index_elements=['product_id']),
+            [{'product_id': pid, 'observations': 0, 'updated_at': now} for pid in product_ids]
+        )
+        return {state.product_id: state for state in db.query(SentimentShiftState).filter(
+            SentimentShiftState.product_id.in_(product_ids)
+        ).order_by(SentimentShiftState.product_id).with_for_update().populate_existing()}
+
+    def observe(self, db: Session, scored: List[Dict]) -> List[Dict]:
+        """Fold newly scored reviews (product_id, sentiment, score) into the per-product statistics
+
+        Updates are made on the caller's session and committed with it. Shifts
+        found are returned with their alert message; hand them to queue_alerts()
+        once the commit has succeeded.
+        """
+        if not scored:
+            return []
+        product_ids = sorted({review['product_id'] for review in scored})
+        now = datetime.utcnow()
+        states = self._lock_states(db, product_ids, now)
+        for review in scored:
+            state = states[review['product_id']]
+            polarity = POLARITY.get(review['sentiment'], 0)
+            self._observe_one(state, float(polarity > 0), polarity * (review.get('score') or 0))
+            state.updated_at = now
+
+        shifts = [shift for shift in (self._check(states[pid], now) for pid in product_ids) if shift]
+        if shifts:
+            products = products_by_id(db, [shift['product_id'] for shift in shifts])
+            for shift in shifts:
+                product = products.get(shift['product_id'])
+                name = product.name if product else f"Product {shift['product_id']}"
+                direction = "improved" if shift['score_after'] > shift['score_before'] else "dropped"
+                shift['message'] = (
+                    f"Customer sentiment {direction} for {name}: positive share "
+                    f"{shift['positive_before']:.0%} -> {shift['positive_after']:.0%}, mean score "
+                    f"{shift['score_before']:+.2f} -> {shift['score_after']:+.2f} over recent reviews"
+                )
+        return shifts
+
+    def queue_alerts(self, shifts: List[Dict]):
+        """Queue sentiment_change alerts for shifts whose state changes are committed"""
+        for shift in shifts:
+            self.alert_service.queue_alert(
+                alert_type='sentiment_change', message=shift['message'], product_id=shift['product_id']
+            )
+        if shifts:
+            logger.info(f"Queued {len(shifts)} sentiment_change alerts")
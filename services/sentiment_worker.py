@@ -0,0 +1,245 @@
+import os
+import time
+import uuid
+import socket
+import logging
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from sqlalchemy import select, update, and_, or_, func, case
+from sqlalchemy.orm import Session
+from db import SessionLocal, Review
+from config import config
+from services.model_registry import registry
+from services.sentiment_aggregates import apply_scored
+from services.sentiment_shift import SentimentShiftDetector
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class SentimentWorker:
+    """Claims pending reviews in large batches, scores them and writes the results back in bulk
+
+    Claims are row updates, so any number of workers in any number of processes
+    can drain the same queue; a claim not finished within
+    SENTIMENT_CLAIM_TIMEOUT_SECONDS is picked up again by another worker.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, session_factory=SessionLocal):
+        self.batch_size = batch_size or config.SENTIMENT_WORKER_BATCH_SIZE
+        self.session_factory = session_factory
+        self.shift_detector = SentimentShiftDetector()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.scored = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def claim(self, db: Session) -> List:
+        """Mark up to batch_size pending (or abandoned) reviews as ours and return them"""
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=config.SENTIMENT_CLAIM_TIMEOUT_SECONDS)
+        token = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        candidates = select(Review.id).where(or_(
+            Review.sentiment_status == PENDING,
+            and_(Review.sentiment_status == PROCESSING, Review.sentiment_claimed_at < stale)
+        )).order_by(Review.id).limit(self.batch_size).with_for_update(skip_locked=True)
+
+        db.execute(
+            update(Review).where(Review.id.in_(candidates)).values(
+                sentiment_status=PROCESSING,
+                sentiment_worker=token,
+                sentiment_claimed_at=now,
+                sentiment_attempts=func.coalesce(Review.sentiment_attempts, 0) + 1
+            ).execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return db.query(Review.id, Review.product_id, Review.content, Review.rating, Review.scraped_at,
+                        Review.sentiment_attempts, Review.sentiment_worker).filter(
+            Review.sentiment_worker == token,
+            Review.sentiment_status == PROCESSING
+        ).all()
+
+    def _still_claimed(self, rows: List):
+        """Rows of this batch no other worker has taken over since the claim"""
+        return and_(
+            Review.id.in_([row.id for row in rows]),
+            Review.sentiment_worker == rows[0].sentiment_worker,
+            Review.sentiment_status == PROCESSING
+        )
+
+    def write_back(self, db: Session, rows: List, updates: List[Dict]) -> Set[int]:
+        """Store results for the rows this claim still holds; returns the ids actually updated
+
+        A claim that outlived SENTIMENT_CLAIM_TIMEOUT_SECONDS may have been re-claimed
+        (and scored) by another worker, so its rows are left alone and must not be
+        counted again. One UPDATE ... RETURNING for the whole batch.
+        """
+        def column(key):
+            return case({u['id']: u[key] for u in updates}, value=Review.id)
+
+        result = db.execute(
+            update(Review).where(self._still_claimed(rows)).values(
+                sentiment=column('sentiment'),
+                sentiment_score=column('sentiment_score'),
+                sentiment_status=column('sentiment_status')
+            ).returning(Review.id).execution_options(synchronize_session=False)
+        )
+        return {row.id for row in result}
+
+    def release(self, db: Session, rows: List) -> int:
+        """Hand a batch that could not be scored back to the queue, or fail rows out of attempts"""
+        result = db.execute(
+            update(Review).where(self._still_claimed(rows)).values(
+                sentiment_status=case(
+                    (Review.sentiment_attempts >= config.SENTIMENT_MAX_ATTEMPTS, FAILED), else_=PENDING
+                )
+            ).execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount
+
+    def process_batch(self) -> int:
+        """Claim, score and store one batch; returns the number of reviews claimed"""
+        db = self.session_factory()
+        try:
+            rows = self.claim(db)
+            if not rows:
+                return 0
+            try:
+                self._score_batch(db, rows)
+            except Exception:
+                db.rollback()
+                try:
+                    released = self.release(db, rows)
+                    logger.warning(f"Released {released} claimed reviews after a failed batch")
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Could not release claimed reviews: {str(e)}")
+                raise
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _score_batch(self, db: Session, rows: List):
+        started = time.perf_counter()
+        results = registry.get('sentiment').analyze_batch(
+            [row.content or '' for row in rows], ratings=[row.rating for row in rows]
+        )
+        elapsed = time.perf_counter() - started
+
+        updates = []
+        scored = {}
+        for row, result in zip(rows, results):
+            if 'error' in result:
+                # Retry later unless this review keeps failing
+                status = FAILED if (row.sentiment_attempts or 0) >= config.SENTIMENT_MAX_ATTEMPTS else PENDING
+                updates.append({'id': row.id, 'sentiment': None, 'sentiment_score': None,
+                                'sentiment_status': status})
+            else:
+                updates.append({'id': row.id, 'sentiment': result['sentiment'],
+                                'sentiment_score': result['score'], 'sentiment_status': DONE})
+                scored[row.id] = {'product_id': row.product_id, 'scraped_at': row.scraped_at,
+                                  'sentiment': result['sentiment'], 'score': result['score'],
+                                  'rating': row.rating}
+        # Aggregates and shift statistics only see rows whose guarded update went through,
+        # committed together with it
+        written = self.write_back(db, rows, updates)
+        stored = [review for review_id, review in scored.items() if review_id in written]
+        apply_scored(db, stored)
+        shifts = self.shift_detector.observe(db, stored)
+        db.commit()
+        # Only alert on state that was actually saved
+        self.shift_detector.queue_alerts(shifts)
+
+        if len(written) < len(rows):
+            logger.warning(f"{len(rows) - len(written)} reviews were re-claimed by another worker; skipped")
+        self.scored += len(stored)
+        self.failed += len(written) - len(stored)
+        self.busy_seconds += elapsed
+        logger.info(f"Scored {len(rows)} reviews in {elapsed:.2f}s ({len(rows) / max(elapsed, 1e-6):.1f} reviews/sec)")
+
+    def drain(self, max_batches: Optional[int] = None) -> int:
+        """Process batches until the queue is empty (or max_batches is reached)"""
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            claimed = self.process_batch()
+            if not claimed:
+                break
+            total += claimed
+            batches += 1
+        return total
+
+    def run(self, stop_event: Optional[threading.Event] = None, idle_seconds: float = 5.0):
+        """Work until stopped, sleeping while the queue is empty"""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                if not self.process_batch():
+                    stop_event.wait(idle_seconds)
+            except Exception as e:
+                logger.error(f"Sentiment worker batch failed: {str(e)}")
+                stop_event.wait(idle_seconds)
+
+    def stats(self) -> Dict:
+        stats = {
+            'worker_id': self.worker_id,
+            'scored': self.scored,
+            'failed': self.failed,
+            'reviews_per_sec': round(self.scored / self.busy_seconds, 1) if self.busy_seconds else None
+        }
+        if registry.is_loaded('sentiment') and registry.get('sentiment').cascade:
+            stats['cascade'] = registry.get('sentiment').cascade_stats()
+        return stats
+
+
+def queue_depth(db: Session) -> Dict:
+    """Reviews per sentiment state plus the age of the oldest one still waiting"""
+    counts = dict(db.query(Review.sentiment_status, func.count(Review.id)).filter(
+        Review.sentiment_status.in_([PENDING, PROCESSING, FAILED])
+    ).group_by(Review.sentiment_status).all())
+    oldest = db.query(func.min(Review.scraped_at)).filter(Review.sentiment_status == PENDING).scalar()
+    return {
+        'pending': counts.get(PENDING, 0),
+        'processing': counts.get(PROCESSING, 0),
+        'failed': counts.get(FAILED, 0),
+        'oldest_pending_age_seconds': round((datetime.utcnow() - oldest).total_seconds()) if oldest else None
+    }
+
+
+def _worker_process(batch_size: int):
+    logging.basicConfig(level=logging.INFO)
+    SentimentWorker(batch_size).run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Score pending reviews out of band")
+    parser.add_argument('--processes', type=int, default=1, help="worker processes, each with its own model")
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--drain', action='store_true', help="exit once the queue is empty")
+    args = parser.parse_args()
+
+    if args.drain:
+        worker = SentimentWorker(args.batch_size)
+        worker.drain()
+        print(f"✅ Queue drained: {worker.stats()}")
+    else:
+        processes = [
+            multiprocessing.Process(target=_worker_process, args=(args.batch_size,), name=f"sentiment-worker-{i}")
+            for i in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
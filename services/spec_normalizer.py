@@ -0,0 +1,182 @@
+import re
+import logging
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from db import SessionLocal, Feature
+
+logger = logging.getLogger(__name__)
+
+SIZE_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(TB|GB)', re.IGNORECASE)
+SCREEN_PATTERN = re.compile(r'(\d{2}(?:\.\d{1,2})?)\s*(?:"|”|-?\s*inch|in\b|cm)', re.IGNORECASE)
+INTEL_TIER_PATTERN = re.compile(r'\bi([3579])\b|core\s+(?:ultra\s+)?([3579])\b', re.IGNORECASE)
+RYZEN_TIER_PATTERN = re.compile(r'ryzen\s+([3579])\b', re.IGNORECASE)
+APPLE_CHIP_PATTERN = re.compile(r'\bM[1-4]\b(\s+(pro|max|ultra))?', re.IGNORECASE)
+NVIDIA_PATTERN = re.compile(r'(RTX|GTX)\s*(?:A)?(\d{3,4})', re.IGNORECASE)
+RADEON_RX_PATTERN = re.compile(r'\bRX\s*(\d{4})', re.IGNORECASE)
+
+
+def _to_gb(value: float, unit: str) -> float:
+    return value * 1024 if unit.upper() == 'TB' else value
+
+
+def parse_ram_gb(ram: Optional[str]) -> Optional[float]:
+    """'16 GB DDR5 RAM' -> 16.0"""
+    if not ram:
+        return None
+    match = SIZE_PATTERN.search(ram)
+    if match:
+        return _to_gb(float(match.group(1)), match.group(2))
+    match = re.search(r'(\d+)', ram)
+    return float(match.group(1)) if match else None
+
+
+def parse_storage(storage: Optional[str]) -> Dict:
+    """'512GB SSD + 1TB HDD' -> total capacity in GB and whether any SSD is fitted"""
+    if not storage:
+        return {'storage_gb': None, 'is_ssd': None}
+
+    sizes = [_to_gb(float(v), u) for v, u in SIZE_PATTERN.findall(storage)]
+    if not sizes:
+        match = re.search(r'(\d+)', storage)
+        sizes = [float(match.group(1))] if match else []
+
+    if re.search(r'SSD|NVMe|PCIe|eMMC|flash', storage, re.IGNORECASE):
+        is_ssd = True
+    elif re.search(r'HDD|hard\s*disk', storage, re.IGNORECASE):
+        is_ssd = False
+    else:
+        is_ssd = None
+
+    return {'storage_gb': sum(sizes) if sizes else None, 'is_ssd': is_ssd}
+
+
+def parse_processor(processor: Optional[str]) -> Dict:
+    """'Intel Core i5-1235U' -> vendor 'intel', tier 5"""
+    if not processor:
+        return {'cpu_vendor': None, 'cpu_tier': None}
+
+    text = processor.lower()
+    vendor = None
+    tier = None
+
+    if re.search(r'intel|core\s*i\d|celeron|pentium|core\s+ultra', text):
+        vendor = 'intel'
+        match = INTEL_TIER_PATTERN.search(processor)
+        if match:
+            tier = int(match.group(1) or match.group(2))
+        elif re.search(r'celeron|pentium', text):
+            tier = 1
+    elif re.search(r'amd|ryzen|athlon', text):
+        vendor = 'amd'
+        match = RYZEN_TIER_PATTERN.search(processor)
+        if match:
+            tier = int(match.group(1))
+        elif 'athlon' in text:
+            tier = 1
+    elif re.search(r'apple|\bm[1-4]\b', text):
+        vendor = 'apple'
+        match = APPLE_CHIP_PATTERN.search(processor)
+        if match:
+            # Base M-series chips sit with i7 / Ryzen 7, Pro/Max/Ultra at the top
+            tier = 9 if match.group(2) else 7
+    elif 'snapdragon' in text or 'qualcomm' in text:
+        vendor = 'qualcomm'
+
+    return {'cpu_vendor': vendor, 'cpu_tier': tier}
+
+
+def parse_screen_inches(display: Optional[str]) -> Optional[float]:
+    """'15.6 inch FHD' -> 15.6 (centimetre sizes are converted)"""
+    if not display:
+        return None
+    match = SCREEN_PATTERN.search(display)
+    if not match:
+        return None
+    value = float(match.group(1))
+    if 'cm' in match.group(0).lower():
+        value = round(value / 2.54, 1)
+    return value
+
+
+def parse_gpu_class(graphics: Optional[str]) -> Optional[str]:
+    """'NVIDIA RTX 3060' -> 'mid'; integrated chips -> 'integrated'"""
+    if not graphics:
+        return None
+
+    match = NVIDIA_PATTERN.search(graphics)
+    if match:
+        family, model = match.group(1).upper(), int(match.group(2))
+        if family == 'GTX':
+            return 'entry'
+        level = model % 100  # 3050 -> 50, 4070 -> 70
+        if level >= 80:
+            return 'high'
+        if level >= 60:
+            return 'mid'
+        return 'entry'
+
+    match = RADEON_RX_PATTERN.search(graphics)
+    if match:
+        level = int(match.group(1)) % 1000 // 100  # 6600M -> 6
+        if level >= 8:
+            return 'high'
+        if level >= 6:
+            return 'mid'
+        return 'entry'
+
+    if re.search(r'\bMX\s*\d+|Arc\s*A\d', graphics, re.IGNORECASE):
+        return 'entry'
+
+    return 'integrated'
+
+
+def normalize_specs(features: Dict) -> Dict:
+    """Parse raw spec strings into the typed Feature columns"""
+    normalized = {
+        'ram_gb': parse_ram_gb(features.get('ram')),
+        'screen_inches': parse_screen_inches(features.get('display')),
+        'gpu_class': parse_gpu_class(features.get('graphics'))
+    }
+    normalized.update(parse_storage(features.get('storage')))
+    normalized.update(parse_processor(features.get('processor')))
+    return normalized
+
+
+def apply_normalized_specs(feature: Feature):
+    """Fill a Feature row's typed columns from its raw strings"""
+    raw = {
+        'processor': feature.processor,
+        'ram': feature.ram,
+        'storage': feature.storage,
+        'display': feature.display,
+        'graphics': feature.graphics
+    }
+    for key, value in normalize_specs(raw).items():
+        setattr(feature, key, value)
+
+
+def backfill_features(db: Session, batch_size: int = 500) -> int:
+    """Populate typed spec columns for existing Feature rows"""
+    updated = 0
+    last_id = 0
+    while True:
+        batch = db.query(Feature).filter(Feature.id > last_id).order_by(Feature.id).limit(batch_size).all()
+        if not batch:
+            break
+        for feature in batch:
+            apply_normalized_specs(feature)
+        db.commit()
+        updated += len(batch)
+        last_id = batch[-1].id
+    logger.info(f"Backfilled typed specs for {updated} feature rows")
+    return updated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        count = backfill_features(db)
+        print(f"✅ Backfilled typed specs for {count} products")
+    finally:
+        db.close()
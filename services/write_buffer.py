@@ -0,0 +1,234 @@
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, wait
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from db import SessionLocal, Price, Review, Alert, SentimentCacheEntry
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Unique keys that make a buffered insert idempotent
+CONFLICT_TARGETS = {
+    Review: ['product_id', 'fingerprint'],
+    SentimentCacheEntry: ['model_id', 'text_hash'],
+}
+
+
+class _Entry:
+    __slots__ = ('model', 'rows', 'future', 'enqueued_at')
+
+    def __init__(self, model, rows: List[Dict]):
+        self.model = model
+        self.rows = rows
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class WriteBuffer:
+    """Write-behind buffer that group-commits price, review, alert and sentiment cache rows from any thread
+
+    submit() returns a Future that resolves to the number of rows inserted once
+    the transaction containing them has committed (rows skipped by a conflict
+    target are not counted), or raises if it failed.
+    """
+
+    MODELS = (Price, Review, Alert, SentimentCacheEntry)
+
+    def __init__(self, max_batch: Optional[int] = None, max_delay_ms: Optional[float] = None,
+                 session_factory=SessionLocal):
+        self.max_batch = max_batch or config.WRITE_BUFFER_MAX_BATCH
+        self.max_delay = (max_delay_ms or config.WRITE_BUFFER_MAX_DELAY_MS) / 1000
+        self.session_factory = session_factory
+        self._cond = threading.Condition()
+        self._pending: List[_Entry] = []
+        self._pending_rows = 0
+        self._inflight: List[_Entry] = []
+        self._flush_requested = False
+        self._closed = False
+        self._thread = None
+
+        self._flush_ms = deque(maxlen=1000)
+        self._ack_ms = deque(maxlen=5000)
+        self._flushes = 0
+        self._rows_written = 0
+        self._failures = 0
+
+    # ---------------- Producers ----------------
+    def submit(self, model, values: Dict) -> Future:
+        """Queue one row"""
+        return self.submit_many(model, [values])
+
+    def submit_many(self, model, rows: List[Dict]) -> Future:
+        """Queue rows that must commit together"""
+        if model not in self.MODELS:
+            raise ValueError(f"Write buffer does not accept {model.__name__} rows")
+        entry = _Entry(model, rows)
+        if not rows:
+            entry.future.set_result(0)
+            return entry.future
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write buffer is closed")
+            self._ensure_started()
+            self._pending.append(entry)
+            self._pending_rows += len(rows)
+            self._cond.notify()
+        return entry.future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Commit everything queued so far; True once it is durable, False if timeout expired first"""
+        with self._cond:
+            futures = [entry.future for entry in self._inflight + self._pending]
+            if not futures:
+                return True
+            # A writer that died since the last submit would otherwise never pick these up
+            self._ensure_started()
+            self._flush_requested = True
+            self._cond.notify()
+        done, not_done = wait(futures, timeout=timeout)
+        return not not_done
+
+    def close(self, timeout: float = 10):
+        """Flush remaining rows and stop the writer thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    # ---------------- Writer ----------------
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='write-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Group commit: wait for a full batch, the oldest row's deadline or an explicit flush
+                deadline = self._pending[0].enqueued_at + self.max_delay
+                while (self._pending_rows < self.max_batch and not self._flush_requested
+                       and not self._closed):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending
+                self._inflight = batch
+                self._pending = []
+                self._pending_rows = 0
+                self._flush_requested = False
+            self._write(batch)
+
+    def _statement(self, db, model):
+        conflict = CONFLICT_TARGETS.get(model)
+        if conflict is None:
+            return insert(model)
+        dialect_insert = postgresql_insert if db.bind.dialect.name == 'postgresql' else sqlite_insert
+        # RETURNING only yields the rows actually inserted, so skipped duplicates can be told apart
+        return dialect_insert(model).on_conflict_do_nothing(index_elements=conflict).returning(
+            *[model.__table__.c[column] for column in conflict]
+        )
+
+    def _commit(self, entries: List[_Entry]) -> List[int]:
+        """Write entries in one transaction; returns the rows inserted per entry"""
+        # executemany needs uniform keys, so group by model and column set
+        groups = {}
+        for entry in entries:
+            for row in entry.rows:
+                groups.setdefault((entry.model, tuple(sorted(row))), []).append(row)
+
+        inserted = {}
+        db = self.session_factory()
+        try:
+            for (model, _), rows in groups.items():
+                result = db.execute(self._statement(db, model), rows)
+                if model in CONFLICT_TARGETS:
+                    inserted.setdefault(model, set()).update(tuple(key) for key in result)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        counts = []
+        for entry in entries:
+            conflict = CONFLICT_TARGETS.get(entry.model)
+            if conflict is None:
+                counts.append(len(entry.rows))
+                continue
+            # A key inserted once is credited to the first entry that carried it
+            keys = inserted.get(entry.model, set())
+            count = 0
+            for row in entry.rows:
+                key = tuple(row[column] for column in conflict)
+                if key in keys:
+                    keys.discard(key)
+                    count += 1
+            counts.append(count)
+        return counts
+
+    def _write(self, batch: List[_Entry]):
+        started = time.monotonic()
+        try:
+            committed = list(zip(batch, self._commit(batch)))
+        except Exception as e:
+            # Retry entries one by one so a single bad row doesn't sink the group
+            logger.error(f"Group commit of {len(batch)} entries failed, retrying individually: {str(e)}")
+            committed = []
+            for entry in batch:
+                try:
+                    committed.append((entry, self._commit([entry])[0]))
+                except Exception as entry_error:
+                    self._failures += 1
+                    entry.future.set_exception(entry_error)
+
+        finished = time.monotonic()
+        rows = sum(count for _, count in committed)
+        with self._cond:
+            self._flushes += 1
+            self._rows_written += rows
+            self._flush_ms.append((finished - started) * 1000)
+            self._ack_ms.extend((finished - entry.enqueued_at) * 1000 for entry, _ in committed)
+            self._inflight = []
+        for entry, count in committed:
+            entry.future.set_result(count)
+
+    # ---------------- Metrics ----------------
+    def stats(self) -> Dict:
+        with self._cond:
+            flush_ms = np.array(self._flush_ms)
+            ack_ms = np.array(self._ack_ms)
+            stats = {
+                'pending_rows': self._pending_rows,
+                'flushes': self._flushes,
+                'rows_written': self._rows_written,
+                'failed_entries': self._failures,
+                'avg_rows_per_flush': round(self._rows_written / self._flushes, 1) if self._flushes else 0
+            }
+        for name, values in (('flush_ms', flush_ms), ('ack_ms', ack_ms)):
+            if values.size:
+                stats[name] = {
+                    'p50': round(float(np.percentile(values, 50)), 2),
+                    'p95': round(float(np.percentile(values, 95)), 2),
+                    'max': round(float(values.max()), 2)
+                }
+        return stats
+
+
+write_buffer = WriteBuffer()
+atexit.register(write_buffer.close)
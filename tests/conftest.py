@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep db's import-time setup away from the checked-in data/tracker.db
+os.environ["DATABASE_URL"] = "sqlite://"
+
+from db import Base  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Session on a fresh in-memory SQLite database with every table created"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
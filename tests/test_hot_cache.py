@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from db import Price
+from services.hot_cache import LatestStateCache
+
+START = datetime(2024, 1, 1)
+
+
+def _price(db, product_id, price, hours, discount_percentage=0):
+    db.add(Price(product_id=product_id, price=price, discount_percentage=discount_percentage,
+                 scraped_at=START + timedelta(hours=hours)))
+    db.commit()
+
+
+def test_first_refresh_loads_latest_then_follows_new_rows(db):
+    _price(db, 1, 50000, 0)
+    _price(db, 1, 48000, 1, discount_percentage=4)
+    _price(db, 2, 70000, 0)
+    cache = LatestStateCache(capacity=4)
+
+    assert cache.refresh(db) == 2
+    assert cache.get(1)['price'] == 48000
+    assert cache.refresh(db) == 0
+
+    _price(db, 2, 65000, 2, discount_percentage=7)
+    assert cache.refresh(db) == 1
+    assert cache.get(2)['price'] == 65000
+    assert cache.top_discounts(1).tolist() == [2]
+    # A late row for an older scrape doesn't replace the newer state
+    _price(db, 1, 99999, -5)
+    cache.refresh(db)
+    assert cache.get(1)['price'] == 48000
+
+
+def test_grows_for_large_product_ids(db):
+    cache = LatestStateCache(capacity=2)
+    _price(db, 1, 40000, 0)
+    _price(db, 9, 60000, 0)
+    cache.refresh(db)
+
+    assert cache.memory_report()['capacity'] >= 10
+    assert cache.get(9)['price'] == 60000
+    assert cache.get(1)['price'] == 40000
+    assert cache.get(500) is None
+    assert cache.cheapest(5).tolist() == [1, 9]
+
+
+def test_evicted_products_disappear_from_reads(db):
+    cache = LatestStateCache(capacity=4)
+    _price(db, 1, 40000, 0, discount_percentage=10)
+    _price(db, 2, 60000, 0, discount_percentage=5)
+    cache.refresh(db)
+
+    cache.evict([1, 1000])
+
+    assert cache.get(1) is None
+    assert cache.filter().tolist() == [2]
+    assert cache.top_discounts(5).tolist() == [2]
+    assert cache.cheapest(5, max_price=50000).tolist() == []
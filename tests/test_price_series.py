@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from db import Price, PriceSeries
+from services.price_series import encode_series, decode_series, sync_series, load_series
+
+
+def test_codec_round_trip():
+    timestamps = np.array([1700000000, 1700003600, 1700003600, 1700090000, 1699990000], dtype=np.int64)
+    prices = np.array([54999.0, 54999.0, 52499.5, 129999.99, 0.01])
+    discounts = np.array([np.nan, 49999.0, np.nan, 119999.0, np.nan])
+
+    decoded = decode_series(encode_series(timestamps, prices, discounts))
+
+    assert decoded['scraped_at'].astype(np.int64).tolist() == timestamps.tolist()
+    np.testing.assert_allclose(decoded['price'], prices)
+    np.testing.assert_array_equal(np.isnan(decoded['discount_price']), np.isnan(discounts))
+    np.testing.assert_allclose(decoded['discount_price'][~np.isnan(discounts)], discounts[~np.isnan(discounts)])
+
+
+def test_codec_round_trip_empty():
+    decoded = decode_series(encode_series(np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)))
+    assert all(len(values) == 0 for values in decoded.values())
+
+
+def test_decode_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        decode_series(b'\x7f\x00')
+
+
+def test_sync_series_is_incremental(db):
+    start = datetime(2024, 1, 30)
+    for day in range(4):
+        db.add(Price(product_id=1, price=50000 - day, scraped_at=start + timedelta(days=day)))
+    db.commit()
+
+    assert sync_series(db) == {'months': 2, 'rows': 4}
+    assert db.query(PriceSeries).count() == 2
+
+    db.add(Price(product_id=1, price=48000, discount_price=47000, scraped_at=datetime(2024, 2, 5)))
+    db.commit()
+    assert sync_series(db) == {'months': 1, 'rows': 1}
+
+    series = load_series(db, [1])[1]
+    assert series['price'].tolist() == [50000, 49999, 49998, 49997, 48000]
+    assert np.isnan(series['discount_price'][:4]).all()
+    assert series['discount_price'][4] == 47000
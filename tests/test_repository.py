@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+import pytest
+from db import Product, Review
+from repository import paginate_products, paginate_reviews
+
+RATINGS = [5, None, 3, None, 4, 3, None, 1]
+
+
+def _page_through(fetch, limit):
+    seen = []
+    cursor = None
+    while True:
+        page = fetch(cursor, limit)
+        seen.extend(page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return seen
+
+
+@pytest.fixture
+def reviews(db):
+    product = Product(name="Laptop", platform="amazon", url="https://example.com/laptop")
+    db.add(product)
+    db.flush()
+    scraped_at = datetime(2024, 1, 1)
+    for index, rating in enumerate(RATINGS):
+        db.add(Review(
+            product_id=product.id, rating=rating, title=f"review {index}", content="text",
+            fingerprint=f"{index:040d}", scraped_at=scraped_at + timedelta(hours=index)
+        ))
+    db.commit()
+    return db.query(Review).all()
+
+
+@pytest.mark.parametrize('sort, descending', [('rating_asc', False), ('rating_desc', True)])
+@pytest.mark.parametrize('limit', [1, 2, 3])
+def test_review_pages_reach_rows_with_null_ratings(db, reviews, sort, descending, limit):
+    rows = _page_through(lambda cursor, size: paginate_reviews(db, cursor=cursor, limit=size, sort=sort), limit)
+    ids = [review.id for review, _ in rows]
+
+    rated = sorted((r for r in reviews if r.rating is not None),
+                   key=lambda r: (r.rating, r.id), reverse=descending)
+    unrated = sorted((r for r in reviews if r.rating is None), key=lambda r: r.id, reverse=descending)
+    assert ids == [r.id for r in rated + unrated]
+
+
+def test_product_pages_reach_rows_with_null_names(db):
+    names = ["b", None, "a", None, "c"]
+    for index, name in enumerate(names):
+        db.add(Product(name=name, platform="flipkart", url=f"https://example.com/{index}"))
+    db.commit()
+
+    rows = _page_through(lambda cursor, size: paginate_products(db, cursor=cursor, limit=size, sort='name'), 2)
+    assert [p.name for p in rows] == ["a", "b", "c", None, None]
+    assert len({p.id for p in rows}) == len(names)
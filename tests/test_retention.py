@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+from db import Product, Price
+from repository import latest_prices
+from services.retention import RetentionService
+
+
+def test_latest_price_is_never_archived(db, tmp_path):
+    stale, active = Product(name="Old", platform="amazon", url="https://example.com/old"), \
+        Product(name="New", platform="flipkart", url="https://example.com/new")
+    db.add_all([stale, active])
+    db.flush()
+    long_ago = datetime.utcnow() - timedelta(days=400)
+    for day in range(3):
+        db.add(Price(product_id=stale.id, price=1000 + day, scraped_at=long_ago + timedelta(days=day)))
+        db.add(Price(product_id=active.id, price=2000 + day, scraped_at=long_ago + timedelta(days=day)))
+    db.add(Price(product_id=active.id, price=1500, scraped_at=datetime.utcnow()))
+    db.commit()
+
+    service = RetentionService(archive_dir=str(tmp_path), retention_days=30)
+    result = service.archive_cold_data(db)
+
+    assert result['prices_archived'] == 5
+    latest = latest_prices(db)
+    assert latest[stale.id].price == 1002
+    assert latest[active.id].price == 1500
+    assert db.query(Price).count() == 2
+    assert service.archive_cold_data(db)['prices_archived'] == 0
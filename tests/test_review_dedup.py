@@ -0,0 +1,47 @@
+from db import Product, Review, ArchivedReviewFingerprint
+from services.review_dedup import (
+    review_fingerprint, split_new_reviews, existing_fingerprints, remember_archived_fingerprints
+)
+
+
+def _product(db, name="Laptop"):
+    product = Product(name=name, platform="amazon", url=f"https://example.com/{name.lower()}")
+    db.add(product)
+    db.flush()
+    return product.id
+
+
+def test_fingerprint_ignores_case_punctuation_and_spacing():
+    assert review_fingerprint('Great  laptop!', 'Fast, quiet.') == review_fingerprint('great laptop', 'fast quiet')
+    assert review_fingerprint('Great laptop', 'Fast') != review_fingerprint('Great', 'laptop Fast')
+
+
+def test_split_skips_hot_archived_and_repeated_reviews(db):
+    product_id = _product(db)
+    hot = {'title': 'Hot', 'content': 'still in the reviews table'}
+    archived = {'title': 'Archived', 'content': 'moved to parquet long ago'}
+    fresh = {'title': 'New', 'content': 'never seen before'}
+    db.add(Review(product_id=product_id, fingerprint=review_fingerprint(hot['title'], hot['content']), **hot))
+    remember_archived_fingerprints(db, [
+        {'product_id': product_id, 'fingerprint': review_fingerprint(archived['title'], archived['content'])}
+    ])
+    db.commit()
+
+    split = split_new_reviews(db, {product_id: [hot, archived, fresh, dict(fresh)]})
+
+    assert [review['title'] for review in split['new'][product_id]] == ['New']
+    assert split['new'][product_id][0]['fingerprint'] == review_fingerprint(fresh['title'], fresh['content'])
+    assert split['duplicates'] == 3
+
+
+def test_archived_fingerprints_are_per_product(db):
+    first, second = _product(db), _product(db, "Tablet")
+    fingerprint = review_fingerprint('Same', 'text')
+    remember_archived_fingerprints(db, [{'product_id': first, 'fingerprint': fingerprint}])
+    # Recording the same review again is a no-op, and rows without a fingerprint are skipped
+    remember_archived_fingerprints(db, [{'product_id': first, 'fingerprint': fingerprint},
+                                        {'product_id': second, 'fingerprint': None}])
+    db.commit()
+
+    assert db.query(ArchivedReviewFingerprint).count() == 1
+    assert existing_fingerprints(db, {(first, fingerprint), (second, fingerprint)}) == {(first, fingerprint)}
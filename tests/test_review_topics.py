@@ -0,0 +1,46 @@
+import pytest
+from config import config
+from db import Product, Review, ProductTopic, ReviewTopic
+from services import review_topics
+from services.review_topics import ReviewTopicModel, update_topics, folded_watermark
+
+TEXTS = ["battery life lasts all day", "screen is bright and sharp", "keyboard feels mushy",
+         "fan noise under load", "fast boot with the ssd", "speakers sound tinny"]
+
+
+@pytest.fixture
+def model_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'topics.pkl')
+    monkeypatch.setattr(config, 'TOPIC_MODEL_PATH', path)
+    monkeypatch.setattr(config, 'TOPIC_COUNT', 3)
+    return path
+
+
+@pytest.fixture
+def reviews(db):
+    product = Product(name="Laptop", platform="amazon", url="https://example.com/laptop")
+    db.add(product)
+    db.flush()
+    for index in range(24):
+        db.add(Review(product_id=product.id, content=TEXTS[index % len(TEXTS)], fingerprint=f"{index:040d}",
+                      sentiment='positive' if index % 2 else 'negative'))
+    db.commit()
+    return product.id
+
+
+def test_watermark_lives_with_the_counts(db, model_path, reviews):
+    assert update_topics(db, batch_size=10, max_batches=2) == {'reviews': 20, 'last_review_id': 20}
+    assert folded_watermark(db) == 20
+    assert sum(row.reviews for row in db.query(ProductTopic)) == 20
+
+    # A fresh model object (e.g. a restarted process) resumes from the database, not the file
+    assert update_topics(db, model=ReviewTopicModel(), batch_size=10)['reviews'] == 4
+    assert update_topics(db, batch_size=10)['reviews'] == 0
+    assert sum(row.reviews for row in db.query(ProductTopic)) == 24
+    assert sum(row.reviews for row in db.query(ReviewTopic)) == 24
+
+
+def test_concurrent_run_is_skipped(db, model_path, reviews):
+    with review_topics._run_lock:
+        assert update_topics(db)['skipped']
+    assert folded_watermark(db) == 0
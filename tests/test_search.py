@@ -0,0 +1,47 @@
+import pytest
+from db import Product, _create_search_index
+from repository import paginate_products
+from services.search import paginate_product_search, product_match_ids, search_products
+
+
+@pytest.fixture
+def catalog(db):
+    _create_search_index(db.get_bind())
+    names = ["Dell Inspiron gaming laptop gaming edition", "HP Pavilion", "Dell Vostro", "Dell G15 gaming",
+             "Lenovo IdeaPad", "Dell XPS", "Asus gaming", "Dell Latitude"]
+    for index, name in enumerate(names):
+        db.add(Product(name=name, brand=name.split()[0], platform="amazon" if index % 2 else "flipkart",
+                       url=f"https://example.com/{index}"))
+    db.commit()
+
+
+def _all_pages(fetch):
+    items, cursor = [], None
+    while True:
+        page = fetch(cursor)
+        items.extend(page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return items
+
+
+def test_search_pages_keep_rank_order(db, catalog):
+    ranked = [match['id'] for match in search_products(db, "dell gaming", limit=100)]
+    paged = _all_pages(lambda cursor: paginate_product_search(db, "dell gaming", cursor=cursor, limit=1))
+    assert [p.id for p in paged] == ranked
+    assert len(ranked) == 2
+
+    dell = _all_pages(lambda cursor: paginate_product_search(db, "dell", cursor=cursor, limit=2))
+    assert len(dell) == 5
+    assert len({p.id for p in dell}) == 5
+
+
+def test_search_respects_platform(db, catalog):
+    items = _all_pages(lambda cursor: paginate_product_search(db, "dell", cursor=cursor, limit=2, platform="amazon"))
+    assert {p.platform for p in items} == {"amazon"}
+
+
+def test_other_sorts_filter_on_every_match(db, catalog):
+    page = paginate_products(db, limit=50, sort='name', product_ids=product_match_ids("gaming"))
+    assert [p.name for p in page['items']] == ["Asus gaming", "Dell G15 gaming", "Dell Inspiron gaming laptop gaming edition"]
+    assert paginate_products(db, product_ids=product_match_ids("!!"))['items'] == []
@@ -0,0 +1,78 @@
+from datetime import datetime
+import pytest
+from config import config
+from db import Product, Review, SentimentDaily
+from services.sentiment_aggregates import COUNTERS, apply_scored, rebuild, ensure_built
+from services.retention import RetentionService
+
+SCORED = [
+    ('very_positive', 0.9, 5, datetime(2024, 1, 1, 9)),
+    ('positive', 0.6, 4, datetime(2024, 1, 1, 17)),
+    ('negative', 0.7, None, datetime(2024, 1, 2, 8)),
+    ('neutral', 0.5, 3, datetime(2024, 1, 2, 12)),
+]
+
+
+@pytest.fixture(autouse=True)
+def no_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'ARCHIVE_DIR', str(tmp_path))
+
+
+@pytest.fixture
+def scored(db):
+    product = Product(name="Laptop", platform="amazon", url="https://example.com/laptop")
+    db.add(product)
+    db.flush()
+    reviews = []
+    for index, (sentiment, score, rating, scraped_at) in enumerate(SCORED):
+        db.add(Review(product_id=product.id, rating=rating, content=f"review {index}", fingerprint=f"{index:040d}",
+                      sentiment=sentiment, sentiment_score=score, scraped_at=scraped_at))
+        reviews.append({'product_id': product.id, 'scraped_at': scraped_at, 'sentiment': sentiment,
+                        'score': score, 'rating': rating})
+    db.commit()
+    return reviews
+
+
+def _totals(db):
+    db.expire_all()
+    return {
+        (row.product_id, row.day): tuple(pytest.approx(getattr(row, c)) for c in COUNTERS)
+        for row in db.query(SentimentDaily)
+    }
+
+
+def test_incremental_totals_match_rebuild(db, scored):
+    apply_scored(db, scored[:1])
+    apply_scored(db, scored[1:])
+    db.commit()
+    incremental = _totals(db)
+
+    assert rebuild(db) == {'rows': 2, 'reviews': 4}
+    assert _totals(db) == incremental
+    assert sum(row.reviews for row in db.query(SentimentDaily)) == 4
+
+
+def test_rebuild_is_idempotent(db, scored):
+    rebuild(db)
+    first = _totals(db)
+    rebuild(db)
+    assert _totals(db) == first
+
+
+def test_ensure_built_only_fills_an_empty_table(db, scored):
+    assert ensure_built(db) == {'rows': 2, 'reviews': 4}
+    assert ensure_built(db) is None
+    assert sum(row.reviews for row in db.query(SentimentDaily)) == 4
+
+
+def test_rebuild_counts_archived_reviews_once(db, scored):
+    rebuild(db)
+    before = _totals(db)
+
+    # Archive everything (the fixture's reviews are from 2024), then rebuild from Parquet + hot rows
+    archived = RetentionService(retention_days=30).archive_cold_data(db)
+    assert archived['reviews_archived'] == len(SCORED)
+    assert db.query(Review).count() == 0
+
+    assert rebuild(db) == {'rows': 2, 'reviews': 4}
+    assert _totals(db) == before
@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+from db import SentimentCacheEntry
+import services.sentiment_cache as sentiment_cache_module
+from services.sentiment_cache import SentimentCache, text_hash
+
+
+class RecordingBuffer:
+    """Stands in for the write buffer and keeps what the cache persists"""
+
+    def __init__(self):
+        self.rows = []
+
+    def submit_many(self, model, rows):
+        self.rows.extend(rows)
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    buffer = RecordingBuffer()
+    monkeypatch.setattr(sentiment_cache_module, 'write_buffer', buffer)
+    return buffer
+
+
+@pytest.fixture
+def cache(db):
+    return SentimentCache(capacity=10, session_factory=sessionmaker(bind=db.get_bind()))
+
+
+def test_lookup_hits_memory_then_table_then_misses(db, cache):
+    db.add(SentimentCacheEntry(model_id='bert', text_hash=text_hash('good'), label='positive', score=0.9, rating=4))
+    db.add(SentimentCacheEntry(model_id='other', text_hash=text_hash('bad'), label='negative', score=0.8))
+    db.commit()
+
+    results = cache.lookup('bert', ['good', 'bad', 'good'])
+
+    assert results[0] == results[2] == {'sentiment': 'positive', 'score': 0.9, 'rating': 4}
+    # Entries are per model
+    assert results[1] is None
+    assert cache.lookup('bert', ['good'])[0]['sentiment'] == 'positive'
+    stats = cache.stats()
+    assert (stats['db_hits'], stats['memory_hits'], stats['misses']) == (2, 1, 1)
+
+
+def test_get_or_compute_scores_each_text_once(cache, buffer):
+    calls = []
+
+    def compute(texts):
+        calls.append(texts)
+        return [{'sentiment': 'neutral', 'score': 0.5} for _ in texts]
+
+    assert len(cache.get_or_compute('bert', ['a', 'b', 'a'], compute)) == 3
+    cache.get_or_compute('bert', ['a', 'b'], compute)
+
+    assert calls == [['a', 'b']]
+    assert sorted(row['text_hash'] for row in buffer.rows) == sorted([text_hash('a'), text_hash('b')])
+
+
+def test_error_results_are_not_cached(cache, buffer):
+    def compute(texts):
+        return [{'sentiment': 'neutral', 'score': 0.0, 'error': 'timeout'} if text == 'flaky'
+                else {'sentiment': 'positive', 'score': 0.9} for text in texts]
+
+    results = cache.get_or_compute('bert', ['flaky', 'fine'], compute)
+
+    assert results[0]['error'] == 'timeout'
+    assert [row['text_hash'] for row in buffer.rows] == [text_hash('fine')]
+    assert cache.lookup('bert', ['flaky', 'fine'])[0] is None
@@ -0,0 +1,81 @@
+import pytest
+from config import config
+from db import Product, SentimentShiftState
+from services.sentiment_shift import SentimentShiftDetector
+
+
+class RecordingAlerts:
+    def __init__(self):
+        self.queued = []
+
+    def queue_alert(self, alert_type, message, product_id=None):
+        self.queued.append((alert_type, product_id, message))
+
+
+@pytest.fixture
+def detector():
+    return SentimentShiftDetector(alert_service=RecordingAlerts())
+
+
+@pytest.fixture
+def product_id(db):
+    product = Product(name="Laptop", platform="amazon", url="https://example.com/laptop")
+    db.add(product)
+    db.commit()
+    return product.id
+
+
+def _reviews(product_id, sentiment, score, count):
+    return [{'product_id': product_id, 'sentiment': sentiment, 'score': score} for _ in range(count)]
+
+
+def _observe(db, detector, reviews):
+    shifts = detector.observe(db, reviews)
+    db.commit()
+    return shifts
+
+
+def test_steady_sentiment_never_alerts(db, detector, product_id):
+    for _ in range(5):
+        assert _observe(db, detector, _reviews(product_id, 'positive', 0.9, 60)) == []
+
+
+def test_no_alert_before_min_reviews(db, detector, product_id):
+    few = config.SENTIMENT_SHIFT_MIN_REVIEWS // 2
+    _observe(db, detector, _reviews(product_id, 'positive', 0.9, few))
+    assert _observe(db, detector, _reviews(product_id, 'negative', 0.9, config.SENTIMENT_SHIFT_MIN_REVIEWS - few - 1)) == []
+
+
+def test_shift_alerts_once_and_only_when_queued(db, detector, product_id):
+    _observe(db, detector, _reviews(product_id, 'positive', 0.9, 100))
+
+    shifts = _observe(db, detector, _reviews(product_id, 'very_negative', 0.9, 40))
+
+    assert [shift['product_id'] for shift in shifts] == [product_id]
+    assert 'dropped for Laptop' in shifts[0]['message']
+    assert detector.alert_service.queued == []
+    detector.queue_alerts(shifts)
+    assert [(kind, pid) for kind, pid, _ in detector.alert_service.queued] == [('sentiment_change', product_id)]
+
+    # Re-baselined at the new level and cooling down: the same drop is not reported again
+    assert _observe(db, detector, _reviews(product_id, 'very_negative', 0.9, 100)) == []
+
+
+def test_small_moves_stay_below_threshold(db, detector, product_id):
+    mixed = _reviews(product_id, 'positive', 0.9, 3) + _reviews(product_id, 'neutral', 0.9, 1)
+    for _ in range(25):
+        _observe(db, detector, mixed)
+    # Positive share drifts from 75% to 70%, under SENTIMENT_SHIFT_MIN_POSITIVE_DELTA
+    slightly_worse = _reviews(product_id, 'positive', 0.9, 7) + _reviews(product_id, 'neutral', 0.9, 3)
+    for _ in range(4):
+        assert _observe(db, detector, slightly_worse) == []
+
+
+def test_state_row_created_once_across_detectors(db, product_id):
+    first, second = SentimentShiftDetector(RecordingAlerts()), SentimentShiftDetector(RecordingAlerts())
+    _observe(db, first, _reviews(product_id, 'positive', 0.9, 5))
+    _observe(db, second, _reviews(product_id, 'positive', 0.9, 5))
+
+    db.expire_all()
+    state = db.query(SentimentShiftState).one()
+    assert state.observations == 10
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.orm import sessionmaker
+from db import Product, Review, SentimentDaily
+from config import config
+from services.model_registry import registry
+from services.sentiment_worker import SentimentWorker, PENDING, PROCESSING, DONE, FAILED
+
+
+class FakeAnalyzer:
+    cascade = False
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    def analyze_batch(self, texts, ratings=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        return [{'sentiment': 'positive', 'score': 0.9} for _ in texts]
+
+
+@pytest.fixture
+def worker(db, monkeypatch):
+    analyzer = FakeAnalyzer()
+    monkeypatch.setattr(registry, 'get', lambda name: analyzer)
+    worker = SentimentWorker(batch_size=10, session_factory=sessionmaker(bind=db.get_bind()))
+    worker.analyzer = analyzer
+    return worker
+
+
+@pytest.fixture
+def pending(db):
+    product = Product(name="Laptop", platform="amazon", url="https://example.com/laptop")
+    db.add(product)
+    db.flush()
+    for index in range(3):
+        db.add(Review(product_id=product.id, rating=4, content=f"review {index}", fingerprint=f"{index:040d}",
+                      scraped_at=datetime(2024, 1, 1), sentiment_status=PENDING))
+    db.commit()
+    return [review.id for review in db.query(Review).order_by(Review.id)]
+
+
+def _statuses(db):
+    db.expire_all()
+    return {review.id: review.sentiment_status for review in db.query(Review)}
+
+
+def test_claim_takes_pending_and_abandoned_rows(db, worker, pending):
+    fresh, stale = pending[1], pending[2]
+    db.query(Review).filter(Review.id == fresh).update({
+        'sentiment_status': PROCESSING, 'sentiment_worker': 'other', 'sentiment_claimed_at': datetime.utcnow()
+    })
+    db.query(Review).filter(Review.id == stale).update({
+        'sentiment_status': PROCESSING, 'sentiment_worker': 'other',
+        'sentiment_claimed_at': datetime.utcnow() - timedelta(seconds=config.SENTIMENT_CLAIM_TIMEOUT_SECONDS + 1)
+    })
+    db.commit()
+
+    rows = worker.claim(db)
+
+    assert [row.id for row in rows] == [pending[0], stale]
+    assert len({row.sentiment_worker for row in rows}) == 1
+    assert all(row.sentiment_attempts == 1 for row in rows)
+
+
+def test_reclaimed_batch_is_written_and_counted_once(db, worker, pending):
+    first = worker.claim(db)
+    db.query(Review).update({'sentiment_claimed_at': datetime(2000, 1, 1)})
+    db.commit()
+
+    # Another worker takes over the abandoned claim and finishes it
+    assert worker.process_batch() == 3
+    # The original worker finally gets there; its stale claim must not write or count
+    assert worker.write_back(db, first, [
+        {'id': row.id, 'sentiment': 'negative', 'sentiment_score': 0.1, 'sentiment_status': DONE} for row in first
+    ]) == set()
+    db.commit()
+
+    db.expire_all()
+    assert {review.sentiment for review in db.query(Review)} == {'positive'}
+    assert db.query(SentimentDaily).one().reviews == 3
+    assert worker.stats()['scored'] == 3
+
+
+def test_failed_batch_is_released_then_failed_out(db, worker, pending):
+    worker.analyzer.fail = True
+
+    for attempt in range(1, config.SENTIMENT_MAX_ATTEMPTS):
+        with pytest.raises(RuntimeError):
+            worker.process_batch()
+        assert set(_statuses(db).values()) == {PENDING}
+
+    with pytest.raises(RuntimeError):
+        worker.process_batch()
+    assert set(_statuses(db).values()) == {FAILED}
+    assert worker.process_batch() == 0
+    assert worker.analyzer.calls == config.SENTIMENT_MAX_ATTEMPTS
@@ -0,0 +1,69 @@
+import pytest
+from db import Product, Feature
+from services.spec_normalizer import (
+    parse_ram_gb, parse_storage, parse_processor, parse_screen_inches, parse_gpu_class, backfill_features
+)
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('16 GB DDR5 RAM', 16.0), ('8GB', 8.0), ('1 TB', 1024.0), ('32', 32.0), ('', None), (None, None)
+])
+def test_parse_ram_gb(raw, expected):
+    assert parse_ram_gb(raw) == expected
+
+
+def test_parse_storage_sums_drives_and_flags_ssd():
+    assert parse_storage('512GB SSD + 1TB HDD') == {'storage_gb': 1536.0, 'is_ssd': True}
+    assert parse_storage('1 TB HDD') == {'storage_gb': 1024.0, 'is_ssd': False}
+    assert parse_storage('256') == {'storage_gb': 256.0, 'is_ssd': None}
+    assert parse_storage(None) == {'storage_gb': None, 'is_ssd': None}
+
+
+@pytest.mark.parametrize('raw, vendor, tier', [
+    ('Intel Core i5-1235U', 'intel', 5),
+    ('Intel Core Ultra 7 155H', 'intel', 7),
+    ('Intel Celeron N4500', 'intel', 1),
+    ('AMD Ryzen 7 7735HS', 'amd', 7),
+    ('AMD Athlon Silver', 'amd', 1),
+    ('Apple M2', 'apple', 7),
+    ('Apple M3 Pro', 'apple', 9),
+    ('Qualcomm Snapdragon X Elite', 'qualcomm', None),
+    (None, None, None)
+])
+def test_parse_processor(raw, vendor, tier):
+    assert parse_processor(raw) == {'cpu_vendor': vendor, 'cpu_tier': tier}
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('15.6 inch FHD', 15.6), ('14" OLED', 14.0), ('39.62 cm (15.6 inch)', 15.6), ('Full HD', None)
+])
+def test_parse_screen_inches(raw, expected):
+    assert parse_screen_inches(raw) == expected
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('NVIDIA GeForce RTX 4080', 'high'), ('NVIDIA RTX 3060', 'mid'), ('RTX 3050 6GB', 'entry'),
+    ('GTX 1650', 'entry'), ('AMD Radeon RX 6600M', 'mid'), ('NVIDIA MX550', 'entry'),
+    ('Intel Iris Xe', 'integrated'), (None, None)
+])
+def test_parse_gpu_class(raw, expected):
+    assert parse_gpu_class(raw) == expected
+
+
+def test_backfill_fills_typed_columns(db):
+    product = Product(name="Laptop", platform="amazon", url="https://example.com/laptop")
+    db.add(product)
+    db.flush()
+    db.add_all([
+        Feature(product_id=product.id, processor='Intel Core i7-13700H', ram='16 GB', storage='1TB SSD',
+                display='15.6 inch', graphics='RTX 4060'),
+        Feature(product_id=product.id, processor='Apple M2', ram='8 GB')
+    ])
+    db.commit()
+
+    assert backfill_features(db, batch_size=1) == 2
+
+    first, second = db.query(Feature).order_by(Feature.id).all()
+    assert (first.ram_gb, first.storage_gb, first.is_ssd, first.cpu_vendor, first.cpu_tier,
+            first.screen_inches, first.gpu_class) == (16.0, 1024.0, True, 'intel', 7, 15.6, 'mid')
+    assert (second.cpu_vendor, second.cpu_tier, second.storage_gb, second.gpu_class) == ('apple', 7, None, None)
@@ -0,0 +1,78 @@
+import threading
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from db import Base, Price, Review
+from services.write_buffer import WriteBuffer
+
+
+@pytest.fixture
+def session_factory():
+    # One shared connection, so the writer thread sees the same in-memory database
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def buffer(session_factory):
+    buffer = WriteBuffer(max_batch=1000, max_delay_ms=10000, session_factory=session_factory)
+    yield buffer
+    buffer.close()
+
+
+def _review(fingerprint):
+    return {'product_id': 1, 'title': 't', 'content': 'c', 'fingerprint': fingerprint}
+
+
+def test_futures_resolve_to_rows_inserted(buffer, session_factory):
+    prices = buffer.submit_many(Price, [{'product_id': 1, 'price': 100.0}, {'product_id': 1, 'price': 99.0}])
+    first = buffer.submit_many(Review, [_review('a'), _review('b')])
+    # 'b' is already in the first entry of the same group commit, 'c' is new
+    second = buffer.submit_many(Review, [_review('b'), _review('c')])
+
+    assert buffer.flush(timeout=5)
+    assert (prices.result(), first.result(), second.result()) == (2, 2, 1)
+    # Duplicates of rows already committed are not counted either
+    again = buffer.submit(Review, _review('a'))
+    assert buffer.flush(timeout=5)
+    assert again.result() == 0
+
+    db = session_factory()
+    assert db.query(Review).count() == 3
+    assert buffer.stats()['rows_written'] == 5
+    db.close()
+
+
+def test_bad_entry_fails_alone(buffer):
+    good = buffer.submit(Price, {'id': 1, 'product_id': 1, 'price': 100.0})
+    # Prices have no conflict target, so a reused primary key fails the insert
+    bad = buffer.submit(Price, {'id': 1, 'product_id': 1, 'price': 99.0})
+
+    assert buffer.flush(timeout=5)
+    assert good.result() == 1
+    with pytest.raises(Exception):
+        bad.result()
+    assert buffer.stats()['failed_entries'] == 1
+
+
+def test_flush_times_out_instead_of_hanging(session_factory):
+    release = threading.Event()
+
+    def slow_session():
+        release.wait(5)
+        return session_factory()
+
+    buffer = WriteBuffer(max_batch=1000, max_delay_ms=10000, session_factory=slow_session)
+    try:
+        future = buffer.submit(Price, {'product_id': 1, 'price': 100.0})
+        assert buffer.flush(timeout=0.05) is False
+        assert not future.done()
+        release.set()
+        assert buffer.flush(timeout=5)
+        assert future.result() == 1
+    finally:
+        release.set()
+        buffer.close()